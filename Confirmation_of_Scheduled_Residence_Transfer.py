@@ -1,562 +1,691 @@
-import streamlit as st
-from datetime import date, timedelta
-import os
-import uuid
-from PIL import Image, ImageDraw, ImageFont
-from pdf2image import convert_from_path, convert_from_bytes
-from io import BytesIO
-import textwrap
-from streamlit_drawable_canvas import st_canvas
-import pandas as pd
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from email.header import Header
-from email.utils import formataddr
-import re
-
-# 경로 설정 (템플릿 PDF)
-PDF_TEMPLATE_PATH = "consent.pdf"
-TRANSFER_FORM_PATH = "transfer.pdf"
-FONT_PATH = "malgun.ttf"
-CONSENT_SAMPLE_PATH = "consent_sample.pdf"
-TRANSFER_SAMPLE_PATH = "transfer_sample.pdf"
-XLSX_FILE_PATH = "school_data.xlsx"
-
-# 환경 변수에서 이메일 설정 정보 읽어오기
-MAIL_FROM = os.getenv("MAIL_FROM")
-MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
-SMTP_SERVER = os.getenv("SMTP_SERVER")
-SMTP_PORT = int(os.getenv("SMTP_PORT"))
-
-# 페이지 설정
-try:
-    favicon_image = Image.open("my_favicon.png")
-    st.set_page_config(
-        page_title="전입예정확인서",
-        page_icon=favicon_image,
-        layout="centered"
-    )
-except FileNotFoundError:
-    st.warning("파비콘 이미지 파일을 찾을 수 없습니다. 기본 아이콘이 사용됩니다.")
-    st.set_page_config(page_title="전입예정확인서", layout="centered")
-
-# 학년을 영어 형식으로 변환하는 함수
-def grade_to_english(grade):
-    number = re.search(r'\d+', grade)
-    if number:
-        return f"{number.group()}gr"
-    return grade
-
-# PDF 파일을 이미지로 변환하는 함수
-def convert_pdf_to_images(pdf_path, dpi=150):
-    try:
-        images = convert_from_path(pdf_path, dpi=dpi)
-        return images
-    except Exception as e:
-        st.error(f"PDF를 이미지로 변환 중 오류 발생: {e}")
-        return None
-
-# 기존 CSS 유지
-st.markdown("""
-    <style>
-    .title {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #4c51bf;
-        text-align: center;
-        padding-bottom: 1rem;
-        margin-bottom: 2rem;
-        background: linear-gradient(to right, #f0f2ff, #ffffff);
-        -webkit-background-clip: text;
-        color: transparent;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-    }
-    .pdf-viewer {
-        width: 100%;
-        height: 500px;
-        border: 1px solid #d1d5db;
-        margin-bottom: 2rem;
-    }
-    .instruction-message {
-        background-color: #f0fdf4;
-        color: #15803d;
-        padding: 0.75rem;
-        margin-bottom: 1rem;
-        border-radius: 0.375rem;
-        border: 1px solid #bbf7d0;
-        font-size: 0.875rem;
-        text-align: center;
-    }
-    </style>
-    <h1 class="title">전입예정확인서</h1>
-""", unsafe_allow_html=True)
-
-# 사용자 안내
-st.markdown('<div class="instruction-message">🍀 진  행 순  서 🍀<br> ①지역 및 학교 → ②개인정보 수집·이용 동의서 → ③전입예정확인서 → ④미리보기 및 제출</div>', unsafe_allow_html=True)
-
-# Streamlit Session State 초기화
-if 'stage' not in st.session_state:
-    st.session_state.stage = 1
-    st.session_state.agree_to_collection = "none"
-    st.session_state.schools_by_region = {}
-    st.session_state.selected_region = ""
-    st.session_state.selected_school = ""
-    st.session_state.student_name = ""
-    st.session_state.move_date = None
-    st.session_state.student_birth_date = None
-    st.session_state.pdf_bytes = None
-    st.session_state.filename = None
-
-# 입력 검증 함수
-def validate_inputs(student_name, parent_name, student_school, student_birth_date, parent_phone, address, next_grade, move_date):
-    if not all([student_name, parent_name, student_school, student_birth_date, parent_phone, address, next_grade, move_date]):
-        return False, "빈칸 확인 후 모든 작성칸을 예시에 따라 작성하세요."
-    return True, ""
-
-# 이메일 발송 함수
-def send_pdf_email(pdf_data, filename, recipient_email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(pattern, recipient_email):
-        st.error(f"유효하지 않은 이메일 주소입니다: {recipient_email}")
-        return False
-
-    parts = filename.split('_')
-    if len(parts) >= 3:
-        grade = parts[2].replace('.pdf', '')
-        english_grade = grade_to_english(grade)
-        email_filename = f"Confirmation.of.Scheduled.Residence.Transfer_{english_grade}.pdf"
-    else:
-        email_filename = "Confirmation.of.Scheduled.Residence.Transfer.pdf"
-
-    msg = MIMEMultipart()
-    msg['From'] = formataddr((str(Header("전입예정확인서 시스템", 'utf-8')), MAIL_FROM))
-    msg['To'] = recipient_email
-    msg['Subject'] = f"전입예정확인서({filename})"
-
-    body = f"안녕하세요.\n\n{filename}가 제출되었습니다.\nPDF 파일을 저장 후 이상이 없는지 확인해 주세요.\n보다 편리한 관리를 위해 파일명 변경을 권장드립니다.\n아울러, 철저한 개인정보 관리 부탁드립니다.\n\n감사합니다."
-    msg.attach(MIMEText(body, 'plain', 'utf-8'))
-
-    part = MIMEBase('application', 'pdf')
-    part.set_payload(pdf_data)
-    encoders.encode_base64(part)
-    part.add_header('Content-Disposition', f'attachment; filename="{email_filename}"', filename=('utf-8', '', email_filename))
-    part.add_header('Content-Type', f'application/pdf; name="{email_filename}"')
-    msg.attach(part)
-
-    try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(MAIL_FROM, MAIL_PASSWORD)
-        server.sendmail(MAIL_FROM, recipient_email, msg.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        st.error(f"이메일 발송 실패: {e}")
-        st.error("이메일 설정을 확인하고 다시 시도해주세요.")
-        return False
-
-# 세션 데이터 초기화 함수
-def clear_session_state():
-    keys_to_keep = []  # 필요한 경우 유지할 키 지정
-    for key in list(st.session_state.keys()):
-        if key not in keys_to_keep:
-            del st.session_state[key]
-
-# 전화번호 포맷팅 함수
-def format_phone_number(phone_input):
-    # 숫자만 추출
-    digits = ''.join(filter(str.isdigit, phone_input))
-    # 11자리 숫자인지 확인
-    if len(digits) != 11 or not digits.startswith('010'):
-        return None, "휴대전화 번호는 010으로 시작하며 숫자로만 작성하세요."
-    # 010-XXXX-XXXX 형식으로 변환
-    formatted = f"{digits[:3]}-{digits[3:7]}-{digits[7:]}"
-    return formatted, None
-
-# 1단계: 지역 및 학교 선택
-if st.session_state.stage == 1:
-    st.subheader("1단계: 지역 및 학교")
-    st.markdown('<div class="instruction-message">전입 예정 지역 및 전학 예정 학교를 선택하세요.</div>', unsafe_allow_html=True)
-
-    try:
-        df = pd.read_excel(XLSX_FILE_PATH)
-        if not all(col in df.columns for col in ['지역', '학교', '이메일']):
-            st.error("XLSX 파일에 '지역', '학교', '이메일' 컬럼이 있어야 합니다. 파일 내용을 확인하고 다시 시도해주세요.")
-            st.stop()
-        st.session_state.schools_by_region = df.groupby('지역')['학교'].apply(list).to_dict()
-        regions = list(st.session_state.schools_by_region.keys())
-    except Exception as e:
-        st.error(f"XLSX 파일을 읽는 중 오류가 발생했습니다: {e}. 파일 경로 및 형식을 확인해주세요. 경로: {XLSX_FILE_PATH}")
-        st.stop()
-
-    st.session_state.selected_region = st.selectbox("전입 예정 지역을 선택하세요.", regions)
-
-    available_schools = st.session_state.schools_by_region.get(st.session_state.selected_region, [])
-    if not available_schools:
-        st.warning("선택한 지역에 학교 정보가 없습니다. 다른 지역을 선택해주세요.")
-        st.session_state.selected_school = ""
-    else:
-        st.session_state.selected_school = st.selectbox("전학 예정 학교를 선택하세요.", available_schools)
-
-    if st.button("✒️다음 단계로"):
-        if st.session_state.selected_region and st.session_state.selected_school:
-            st.session_state.stage = 2
-            st.rerun()
-        else:
-            st.warning("지역과 학교를 모두 선택하세요.")
-
-# 2단계: 개인정보 수집·이용 동의서
-elif st.session_state.stage == 2:
-    st.subheader("2단계: 개인정보 수집·이용 동의서")
-    st.markdown('<div class="instruction-message">개인정보 수집·이용 동의서를 확인 후 진행하세요.</div>', unsafe_allow_html=True)
-
-    consent_images = convert_pdf_to_images(CONSENT_SAMPLE_PATH, dpi=150)
-    if consent_images:
-        with st.expander("📄 개인정보 수집·이용 동의서", expanded=True):
-            for i, image in enumerate(consent_images):
-                st.image(image, use_container_width=True)
-    else:
-        st.error("동의서 샘플 PDF를 불러올 수 없습니다. 파일 경로를 확인해주세요.")
-
-    consent_choice = st.radio(
-        "☞ 위와 같이 개인정보 수집·이용에 동의하십니까?",
-        options=["동의합니다.", "동의하지 않습니다."],
-        index=None,
-        key="consent_radio"
-    )
-    if consent_choice == "동의합니다.":
-        if st.button("✒️다음 단계로"):
-            st.session_state.stage = 3
-            st.rerun()
-    elif consent_choice == "동의하지 않습니다.":
-        st.warning("개인정보 수집·이용에 동의 시에만 다음 단계로 진행할 수 있습니다.")
-
-# 3단계: 전입예정확인서
-elif st.session_state.stage == 3:
-    st.subheader("3단계: 전입예정확인서")
-    st.markdown('<div class="instruction-message">모든 작성칸을 올바르게 작성하세요.</div>', unsafe_allow_html=True)
-
-    transfer_images = convert_pdf_to_images(TRANSFER_SAMPLE_PATH, dpi=150)
-    if transfer_images:
-        with st.expander("📄 전입예정확인서 예시", expanded=True):
-            for i, image in enumerate(transfer_images):
-                st.image(image, use_container_width=True)
-    else:
-        st.error("전입예정확인서 샘플 PDF를 불러올 수 없습니다. 파일 경로를 확인해주세요.")
-
-    col1, col2 = st.columns(2)
-    with col1:
-        student_name = st.text_input(
-            "(학생) 성명",
-            placeholder="예) 한잎새",
-            key="student_name_input"
-        )
-        if student_name and not re.match(r'^[가-힣]+$', student_name):
-            st.error("한글로만 작성하세요.")
-            st.session_state.student_name = ""
-        else:
-            st.session_state.student_name = student_name
-
-    # 작성일자 기준으로 앞뒤 30 년 범위 설정
-        today = date.today()
-        min_date = today - timedelta(days=30*365)  # 30 년 전
-        max_date = today + timedelta(days=30*365)  # 30 년 후
-        st.session_state.student_birth_date = st.date_input(
-            "(학생) 생년월일",
-            value=None,
-            min_value=min_date,
-            max_value=max_date,
-            key="student_birth_date_input"
-        )
-        student_school = st.text_input(
-            "(학생) 현 소속 학교 및 학년",
-            placeholder="예) 00초등학교, 00중학교, 00고등학교 1학년",
-            key="student_school_input"
-        )
-        if student_school:
-            if "학교" not in student_school:
-                st.error("'학교'를 반드시 포함하여 작성하세요.")
-                student_school = ""
-            elif not re.match(r'^[가-힣0-9\s]+$', student_school) or re.match(r'^\d+$', student_school):
-                st.error("한글과 숫자로만 작성하세요.")
-                student_school = ""
-        parent_name = st.text_input(
-            "(법정대리인) 성명",
-            placeholder="예) 한나무",
-            key="parent_name_input"
-        )
-        if parent_name and not re.match(r'^[가-힣]+$', parent_name):
-            st.error("한글로만 작성하세요.")
-            parent_name = ""
-        relationship = st.text_input(
-            "(법정대리인) 학생과의 관계",
-            placeholder="예) 부, 모, 조부, 조모 등",
-            key="relationship_input"
-        )
-        if relationship and not re.match(r'^[가-힣\s]+$', relationship):
-            st.error("한글로만 작성하세요.")
-            relationship = ""
-    with col2:
-        parent_phone_input = st.text_input(
-            "(법정대리인) 휴대전화 번호",
-            placeholder="예) 01056785678 / 숫자로만 작성",
-            key="parent_phone_input"
-        )
-        if parent_phone_input:
-            formatted_parent_phone, error = format_phone_number(parent_phone_input)
-            if error:
-                st.error(error)
-                parent_phone = ""
-            else:
-                parent_phone = formatted_parent_phone
-        else:
-            parent_phone = ""
-        st.session_state.move_date = st.date_input("전입 예정일", value=None)
-        address = st.text_input(
-            "전입 예정 주소",
-            placeholder="예) 행복택지 A-1블록 사랑아파트",
-            key="address_input"
-        )
-        if address and not re.match(r'^[가-힣a-zA-Z1-99\s-]+$', address):
-            st.error("한글, 알파벳, 숫자, 기호로만 작성하세요.")
-            address = ""
-        school_name = st.text_input("전학 예정 학교", value=st.session_state.selected_school, disabled=True)
-        next_grade = st.selectbox(
-            "전학 예정 학년",
-            options=["1학년", "2학년", "3학년", "4학년", "5학년", "6학년"],
-            index=None,
-            placeholder="학년을 선택하세요.",
-            key="next_grade_input"
-        )
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.write("학생 서명")
-        canvas_student = st_canvas(
-            fill_color="rgba(255, 255, 255, 0)",
-            stroke_width=5,
-            background_color="rgba(255, 255, 255, 0)",
-            height=150,
-            width=300,
-            drawing_mode="freedraw",
-            key="student_sign_canvas"
-        )
-    with col2:
-        st.write("법정대리인 서명")
-        canvas_parent = st_canvas(
-            fill_color="rgba(255, 255, 255, 0)",
-            stroke_width=5,
-            background_color="rgba(255, 255, 255, 0)",
-            height=150,
-            width=300,
-            drawing_mode="freedraw",
-            key="parent_sign_canvas"
-        )
-
-    if st.button("✒️다음 단계로"):
-        valid, error = validate_inputs(st.session_state.student_name, parent_name, student_school, st.session_state.student_birth_date, parent_phone, address, next_grade, st.session_state.move_date)
-        if not valid:
-            st.error(error)
-            st.stop()
-        try:
-            # 서명 비율 체크
-            def calculate_signature_coverage(image_data):
-                alpha_channel = image_data[:, :, 3]
-                drawn_pixels = (alpha_channel > 0).sum()
-                total_pixels = image_data.shape[0] * image_data.shape[1]
-                return drawn_pixels / total_pixels
-
-            student_coverage = calculate_signature_coverage(canvas_student.image_data)
-            parent_coverage = calculate_signature_coverage(canvas_parent.image_data)
-
-            if student_coverage < 0.05 or parent_coverage < 0.05:
-                st.warning("학생과 법정대리인 모두 올바르게 서명하세요.")
-                st.stop()
-
-            # 서명을 메모리에서 처리
-            student_sign_buffer = BytesIO()
-            parent_sign_buffer = BytesIO()
-            Image.fromarray(canvas_student.image_data.astype('uint8'), mode='RGBA').save(student_sign_buffer, format='PNG', optimize=True)
-            Image.fromarray(canvas_parent.image_data.astype('uint8'), mode='RGBA').save(parent_sign_buffer, format='PNG', optimize=True)
-
-            pages1 = convert_from_path(PDF_TEMPLATE_PATH, dpi=200)
-            page1 = pages1[0].convert('RGBA')
-            pages2 = convert_from_path(TRANSFER_FORM_PATH, dpi=200)
-            page2 = pages2[0].convert('RGBA')
-            draw1 = ImageDraw.Draw(page1)
-            draw2 = ImageDraw.Draw(page2)
-
-            consent_positions = {
-                "{{date.today}}": [(1100, 1550)],
-                "{{student_name}}": [(825, 1695)],
-                "{{student_sign_path}}": [(1060, 1665)],
-                "{{parent_name}}": [(825, 1835)],
-                "{{parent_sign_path}}": [(1060, 1810)],
-                "{{school_name}}": [(930, 1988)],
-            }
-            transfer_positions = {
-                "{{student_name}}": [(462, 420), (825, 1755)],
-                "{{parent_name}}": [(1110, 420), (825, 1888)],
-                "{{student_school}}": [(462, 625)],
-                "{{relationship}}": [(1110, 520)],
-                "{{student_birth_date}}": [(462, 520)],
-                "{{parent_phone}}": [(1110, 620)],
-                "{{move_date}}": [(462, 835)],
-                "{{address}}": [(1110, 813), (500, 1185)],
-                "{{school_name}}": [(462, 1050), (310, 1255), (925, 2053)],
-                "{{next_grade}}": [(1110, 1050), (840, 1255)],
-                "{{date.today}}": [(1100, 1620)],
-                "{{student_sign_path}}": [(1060, 1730)],
-                "{{parent_sign_path}}": [(1060, 1870)],
-            }
-
-            def get_font(key, idx):
-                if key == "{{address}}" and idx == 0:
-                    return ImageFont.truetype(FONT_PATH, 32)
-                if key == "{{address}}" and idx == 1:
-                    return ImageFont.truetype(FONT_PATH, 40)
-                if key == "{{student_school}}" and idx == 0:
-                    return ImageFont.truetype(FONT_PATH, 32)
-                return ImageFont.truetype(FONT_PATH, 42)
-
-            consent_map = {
-                "{{student_name}}": st.session_state.student_name,
-                "{{parent_name}}": parent_name,
-                "{{date.today}}": date.today().strftime("%Y년 %m월 %d일"),
-                "{{school_name}}": school_name,
-            }
-            transfer_map = {
-                **consent_map,
-                "{{student_school}}": student_school,
-                "{{relationship}}": relationship,
-                "{{student_birth_date}}": st.session_state.student_birth_date.strftime("%Y년 %m월 %d일"),
-                "{{parent_phone}}": parent_phone,
-                "{{move_date}}": st.session_state.move_date.strftime("%Y년 %m월 %d일"),
-                "{{address}}": address,
-                "{{next_grade}}": next_grade,
-            }
-
-            def draw_texts(draw, positions, data_map, is_transfer=False):
-                for key, coords in positions.items():
-                    for idx, (x, y) in enumerate(coords):
-                        text = data_map.get(key, "")
-                        font = get_font(key, idx)
-                        if not is_transfer:
-                            if key in ["{{student_name}}", "{{parent_name}}", "{{student_sign_path}}", "{{parent_sign_path}}"]:
-                                x -= 15
-                        else:
-                            if key == "{{address}}":
-                                if idx == 0:
-                                    x -= 7
-                                    wrapped_lines = textwrap.wrap(text, width=11)
-                                    current_y = y
-                                    for line in wrapped_lines:
-                                        draw.text((x, current_y), line, font=font, fill='black')
-                                        current_y += font.getbbox(line)[3] - font.getbbox(line)[1]
-                                    continue
-                                elif idx == 1:
-                                    x -= 50
-                            if key == "{{next_grade}}" and idx == 1:
-                                x += 50
-                        draw.text((x, y), text, font=font, fill='black')
-
-            draw_texts(draw1, consent_positions, consent_map, is_transfer=False)
-            student_sign_buffer.seek(0)
-            parent_sign_buffer.seek(0)
-            sign1 = Image.open(student_sign_buffer).resize((312, 104)).convert('RGBA')
-            sign2 = Image.open(parent_sign_buffer).resize((312, 104)).convert('RGBA')
-            for x, y in consent_positions.get("{{student_sign_path}}", []):
-                page1.paste(sign1, (x - 15, y), sign1)
-            for x, y in consent_positions.get("{{parent_sign_path}}", []):
-                page1.paste(sign2, (x - 15, y), sign2)
-
-            draw_texts(draw2, transfer_positions, transfer_map, is_transfer=True)
-            student_sign_buffer.seek(0)
-            parent_sign_buffer.seek(0)
-            sign1 = Image.open(student_sign_buffer).resize((312, 104)).convert('RGBA')
-            sign2 = Image.open(parent_sign_buffer).resize((312, 104)).convert('RGBA')
-            for x, y in transfer_positions.get("{{student_sign_path}}", []):
-                page2.paste(sign1, (x, y), sign1)
-            for x, y in transfer_positions.get("{{parent_sign_path}}", []):
-                page2.paste(sign2, (x, y), sign2)
-
-            buffer = BytesIO()
-            page1 = page1.convert('RGB')
-            page2 = page2.convert('RGB')
-            page1.save(buffer, format='PDF', quality=70)
-            page2.save(buffer, format='PDF', append=True, save_all=True, quality=70)
-            pdf_bytes = buffer.getvalue()
-            filename = f"전입예정확인서_{school_name}_{next_grade}.pdf"
-
-            st.session_state.pdf_bytes = pdf_bytes
-            st.session_state.filename = filename
-            st.session_state.stage = 4
-            st.rerun()
-
-        except Exception as e:
-            st.error(f"PDF 생성 중 오류 발생: {e}")
-        finally:
-            # 메모리 버퍼 정리
-            try:
-                student_sign_buffer.close()
-                parent_sign_buffer.close()
-            except Exception as e:
-                st.warning(f"메모리 버퍼 정리 중 오류 발생: {e}")
-
-# 4단계: 미리보기 및 제출
-elif st.session_state.stage == 4:
-    st.subheader("4단계: 미리보기 및 제출")
-    st.markdown('<div class="instruction-message">미리보기를 통해 최종 확인 후 제출하세요.</div>', unsafe_allow_html=True)
-
-    if st.session_state.pdf_bytes and st.session_state.filename:
-        try:
-            images = convert_from_bytes(st.session_state.pdf_bytes, dpi=150)
-            with st.expander("📄 전입예정확인서 미리보기", expanded=True):
-                for i, image in enumerate(images):
-                    st.image(image, use_container_width=True)
-
-            st.download_button(
-                label="💾 전입예정확인서 내려받기",
-                data=st.session_state.pdf_bytes,
-                file_name=st.session_state.filename,
-                mime='application/pdf'
-            )
-
-            if st.button("📮 전입예정확인서 제출하기"):
-                with st.spinner("제출 중입니다. 잠시만 기다려 주세요."):
-                    try:
-                        df = pd.read_excel(XLSX_FILE_PATH)
-                        email_series = df[df['학교'] == st.session_state.selected_school]['이메일']
-                        if email_series.empty:
-                            st.error(f"학교 '{st.session_state.selected_school}'에 해당하는 이메일이 없습니다.")
-                            st.error("오류가 발생했습니다. 다시 처음부터 진행해주세요.")
-                            clear_session_state()
-                            st.stop()
-                        selected_school_email = email_series.values[0]
-                        if send_pdf_email(st.session_state.pdf_bytes, st.session_state.filename, selected_school_email):
-                            st.success("정상적으로 제출되었습니다. 협조해 주셔서 감사합니다.")
-                            # 제출 완료 후 즉시 세션 데이터 초기화
-                            clear_session_state()
-                        else:
-                            st.error("오류가 발생했습니다. 다시 처음부터 진행해주세요.")
-                            clear_session_state()
-                    except Exception as e:
-                        st.error(f"이메일 발송 중 오류 발생: {e}")
-                        st.error("오류가 발생했습니다. 다시 처음부터 진행해주세요.")
-                        clear_session_state()
-        except Exception as e:
-            st.error(f"PDF 미리보기 이미지 생성 중 오류 발생: {e}")
-            st.error("PDF 파일을 다운로드하여 확인해 주세요.")
-            st.download_button(
-                label="💾 전입예정확인서 내려받기",
-                data=st.session_state.pdf_bytes,
-                file_name=st.session_state.filename,
-                mime='application/pdf'
-            )
-            clear_session_state()
-    else:
-        st.error("PDF가 생성되지 않았습니다. 3단계로 돌아가 PDF를 생성해 주세요.")
-        clear_session_state()
+import streamlit as st
+from datetime import date, timedelta
+import logging
+import os
+import threading
+import time
+import uuid
+import form_renderer
+import metrics
+import school_directory
+import validation
+from artifact_store import ArtifactStore, SqliteArtifactStore
+# 서명 캔버스(3단계), PDF 생성 작업자(3단계), 메일 모듈(4단계)은 해당 단계에서 처음 쓸 때 불러옴
+
+# 경로 설정 (템플릿 PDF 경로는 form_renderer의 서식 배치 정의에 포함)
+CONSENT_SAMPLE_PATH = "consent_sample.pdf"
+TRANSFER_SAMPLE_PATH = "transfer_sample.pdf"
+XLSX_FILE_PATH = "school_data.xlsx"
+
+# 환경 변수에서 이메일 설정 정보 읽어오기
+MAIL_FROM = os.getenv("MAIL_FROM")
+MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+SMTP_SERVER = os.getenv("SMTP_SERVER")
+SMTP_PORT = int(os.getenv("SMTP_PORT"))
+SMTP_WORKERS = int(os.getenv("SMTP_WORKERS", "2"))
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.sqlite3")
+# 같은 내용의 제출을 같은 학교에 다시 보내지 않는 기간(분, 0이면 사용 안 함)
+DEDUP_WINDOW_MINUTES = int(os.getenv("DEDUP_WINDOW_MINUTES", "60"))
+
+# PDF 생성 방식 설정 ("raster": 템플릿 이미지에 그리기, "vector": 원본 PDF에 오버레이)
+RENDER_ENGINE = os.getenv("RENDER_ENGINE", "raster")
+# 이미지 PDF 출력 프로필 (form_renderer.OUTPUT_PROFILES 참고) 및 첨부 파일 목표 크기(KB, 0이면 사용 안 함)
+OUTPUT_PROFILE = os.getenv("OUTPUT_PROFILE", form_renderer.DEFAULT_OUTPUT_PROFILE)
+OUTPUT_TARGET_KB = int(os.getenv("OUTPUT_TARGET_KB", "0"))
+# 운영 지표 설정 (METRICS_PORT: /metrics 경로를 제공할 포트, METRICS_FILE: 텍스트 형식으로 기록할 파일)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE")
+# 생성한 PDF·미리보기 보관 설정 (프로세스 전체 메모리 한도(MB)와 마지막 조회 후 보관 시간(초))
+ARTIFACT_BUDGET_MB = int(os.getenv("ARTIFACT_BUDGET_MB", "64"))
+ARTIFACT_TTL_SECONDS = int(os.getenv("ARTIFACT_TTL_SECONDS", "1800"))
+# 여러 앱 프로세스(복제본)가 결과물을 함께 보관할 SQLite 파일 경로 (비우면 프로세스 메모리에 보관)
+# 복제본을 여러 개 띄울 때는 OUTBOX_PATH와 form_renderer의 SHARED_CACHE_DIR도 같은 위치를 가리키도록 설정
+ARTIFACT_STORE_PATH = os.getenv("ARTIFACT_STORE_PATH")
+# PDF 생성 작업자 설정 (작업자 프로세스 수, 동시에 받을 최대 작업 수(0이면 작업자 수의 4배), 진행 상태 확인 간격(초))
+# 작업자마다 수정에 대비해 보관하는 서식 수는 render_pool의 RENDER_FORMS_PER_WORKER로 설정
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_QUEUE_LIMIT = int(os.getenv("RENDER_QUEUE_LIMIT", "0"))
+RENDER_POLL_SECONDS = float(os.getenv("RENDER_POLL_SECONDS", "0.5"))
+# 세션마다 내용별로 기억해 두는 생성 결과물 수 (같은 내용으로 다시 생성하면 작업자에 보내지 않고 재사용)
+RENDER_CACHE_SIZE = 4
+# 서버 시작 직후 학교 정보·서식 배치·글꼴·템플릿 캐시와 PDF 생성 작업자를 백그라운드에서 미리 준비할지 여부
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "0") == "1"
+# 서명 저장 방식 ("bitmap": 캔버스 RGBA 배열, "strokes": 캔버스 획 좌표를 보관했다가 서명 칸 크기로 한 번만 그림)
+SIGNATURE_CAPTURE = os.getenv("SIGNATURE_CAPTURE", "bitmap")
+SIGNATURE_CANVAS_WIDTH = 300
+SIGNATURE_CANVAS_HEIGHT = 150
+FAVICON_PATH = "my_favicon.png"
+FAVICON_SIZE = 64
+
+# 파비콘을 아이콘 크기로 줄여 한 번만 만들어 두는 함수 (원본 이미지는 2MB가 넘으므로 매 실행마다 디코딩하지 않음)
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_favicon(favicon_path, mtime_ns):
+    from PIL import Image
+    with Image.open(favicon_path) as image:
+        image.draft('RGB', (FAVICON_SIZE, FAVICON_SIZE))
+        icon = image.convert('RGBA')
+    icon.thumbnail((FAVICON_SIZE, FAVICON_SIZE))
+    return icon
+
+# 페이지 설정
+try:
+    favicon_image = load_favicon(FAVICON_PATH, os.stat(FAVICON_PATH).st_mtime_ns)
+    st.set_page_config(
+        page_title="전입예정확인서",
+        page_icon=favicon_image,
+        layout="centered"
+    )
+except FileNotFoundError:
+    st.warning("파비콘 이미지 파일을 찾을 수 없습니다. 기본 아이콘이 사용됩니다.")
+    st.set_page_config(page_title="전입예정확인서", layout="centered")
+
+# 샘플 PDF를 PNG 바이트 목록으로 래스터화하는 함수 (모든 세션이 공유하는 캐시)
+@st.cache_resource(show_spinner=False, max_entries=8)
+def rasterize_sample_pdf(pdf_path, mtime_ns, dpi):
+    return form_renderer.rasterize_pdf_to_png(pdf_path, dpi)
+
+# PDF 파일을 미리보기 이미지로 변환하는 함수
+def convert_pdf_to_images(pdf_path, dpi=150):
+    metrics.increment("cache_lookups", cache="sample_preview")
+    try:
+        # 파일이 변경되면 수정시각이 달라지므로 자동으로 다시 생성됨
+        mtime_ns = os.stat(pdf_path).st_mtime_ns
+        return rasterize_sample_pdf(pdf_path, mtime_ns, dpi)
+    except Exception as e:
+        st.error(f"PDF를 이미지로 변환 중 오류 발생: {e}")
+        return None
+
+# 학교 정보 XLSX를 읽어 지역별 학교 목록, 학교별 이메일 색인, 묶음 발송 기준을 만드는 함수 (프로세스 전역 캐시)
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_school_directory(xlsx_path, mtime_ns):
+    return school_directory.read_school_directory(xlsx_path)
+
+# 캐시된 학교 색인을 반환하는 함수
+def load_school_directory(xlsx_path=XLSX_FILE_PATH):
+    # 파일이 변경되면 수정시각이 달라지므로 새 색인으로 한 번에 교체됨
+    mtime_ns = os.stat(xlsx_path).st_mtime_ns
+    return build_school_directory(xlsx_path, mtime_ns)
+
+# 기존 CSS 유지
+st.markdown("""
+    <style>
+    .title {
+        font-size: 2.5rem;
+        font-weight: bold;
+        color: #4c51bf;
+        text-align: center;
+        padding-bottom: 1rem;
+        margin-bottom: 2rem;
+        background: linear-gradient(to right, #f0f2ff, #ffffff);
+        -webkit-background-clip: text;
+        color: transparent;
+        text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
+    }
+    .pdf-viewer {
+        width: 100%;
+        height: 500px;
+        border: 1px solid #d1d5db;
+        margin-bottom: 2rem;
+    }
+    .instruction-message {
+        background-color: #f0fdf4;
+        color: #15803d;
+        padding: 0.75rem;
+        margin-bottom: 1rem;
+        border-radius: 0.375rem;
+        border: 1px solid #bbf7d0;
+        font-size: 0.875rem;
+        text-align: center;
+    }
+    </style>
+    <h1 class="title">전입예정확인서</h1>
+""", unsafe_allow_html=True)
+
+# 사용자 안내
+st.markdown('<div class="instruction-message">🍀 진  행 순  서 🍀<br> ①지역 및 학교 → ②개인정보 수집·이용 동의서 → ③전입예정확인서 → ④미리보기 및 제출</div>', unsafe_allow_html=True)
+
+# Streamlit Session State 초기화
+if 'stage' not in st.session_state:
+    st.session_state.stage = 1
+    st.session_state.agree_to_collection = "none"
+    st.session_state.schools_by_region = {}
+    st.session_state.selected_region = ""
+    st.session_state.selected_school = ""
+    st.session_state.student_name = ""
+    st.session_state.move_date = None
+    st.session_state.student_birth_date = None
+    st.session_state.artifact_handle = None
+    st.session_state.render_job = None
+    st.session_state.render_cache = {}
+
+# 운영 지표 HTTP 서버를 프로세스당 한 번만 시작하는 함수 (Streamlit 서버에는 경로를 추가할 수 없으므로 별도 포트 사용)
+@st.cache_resource(show_spinner=False)
+def start_metrics_server():
+    return metrics.start_http_server(METRICS_PORT)
+
+# 운영 지표를 파일로 내보내는 함수 (METRICS_FILE을 지정한 경우)
+def export_metrics():
+    if not METRICS_FILE:
+        return
+    try:
+        metrics.write_prometheus_file(METRICS_FILE)
+    except OSError:
+        pass
+
+if METRICS_PORT:
+    try:
+        start_metrics_server()
+    except OSError as e:
+        st.warning(f"운영 지표 서버를 시작하지 못했습니다: {e}")
+
+# 생성 결과물 보관소를 프로세스당 하나만 만드는 함수 (세션에는 핸들만 저장)
+@st.cache_resource(show_spinner=False)
+def get_artifact_store():
+    if ARTIFACT_STORE_PATH:
+        return SqliteArtifactStore(ARTIFACT_STORE_PATH, ARTIFACT_BUDGET_MB * 1024 * 1024, ARTIFACT_TTL_SECONDS)
+    return ArtifactStore(ARTIFACT_BUDGET_MB * 1024 * 1024, ARTIFACT_TTL_SECONDS)
+
+# PDF 생성 작업자 프로세스를 프로세스당 한 번만 시작하는 함수
+@st.cache_resource(show_spinner=False)
+def get_render_pool():
+    from render_pool import RenderPool
+    return RenderPool(RENDER_WORKERS, RENDER_QUEUE_LIMIT)
+
+# 서버 시작 직후 캐시를 백그라운드에서 미리 채우는 함수 (프로세스당 한 번)
+# 실패해도 해당 단계에서 다시 시도하므로 앱은 계속 실행하되, 글꼴·배치 파일 누락 등을 사용자보다 먼저 알 수 있도록
+# 단계별 결과를 카운터(warmup{step, outcome})로 남기고 실패는 예외 내용과 함께 로그에 기록
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    def warm_up():
+        steps = (
+            ("school_directory", load_school_directory),
+            ("fonts", form_renderer.preload),
+            ("consent_sample", lambda: rasterize_sample_pdf(CONSENT_SAMPLE_PATH, os.stat(CONSENT_SAMPLE_PATH).st_mtime_ns, 150)),
+            ("transfer_sample", lambda: rasterize_sample_pdf(TRANSFER_SAMPLE_PATH, os.stat(TRANSFER_SAMPLE_PATH).st_mtime_ns, 150)),
+            ("render_pool", lambda: get_render_pool().warm_up()),
+        )
+        for name, step in steps:
+            try:
+                with metrics.span("warmup"):
+                    step()
+            except Exception:
+                metrics.increment("warmup", step=name, outcome="failed")
+                logging.getLogger(__name__).exception("서버 시작 예열 단계 '%s' 실패", name)
+            else:
+                metrics.increment("warmup", step=name, outcome="ok")
+        export_metrics()
+
+    thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+if WARMUP_ON_START:
+    start_warmup()
+
+# 제출 대기열과 SMTP 발송 작업자를 프로세스당 한 번만 시작하는 함수
+@st.cache_resource(show_spinner=False)
+def get_submission_queue():
+    from mailer import SubmissionQueue
+    queue = SubmissionQueue(OUTBOX_PATH, SMTP_SERVER, SMTP_PORT, MAIL_FROM, MAIL_PASSWORD, workers=SMTP_WORKERS,
+                            dedup_window=DEDUP_WINDOW_MINUTES * 60)
+    queue.start()
+    return queue
+
+# 이메일 발송 함수 (대기열에 넣은 뒤 바로 반환하고, 실제 발송은 작업자가 처리)
+# policy가 (최대 건수, 최대 대기 초)이면 학교별로 모아 두었다가 묶음 메일로 발송 (같은 주소를 쓰는 학교끼리도 따로 묶음)
+# fingerprint가 같은 제출을 이미 받았으면 다시 보내지 않고 제출된 것으로 안내
+def send_pdf_email(pdf_data, filename, recipient_email, school, policy=None, fingerprint=None):
+    _, error = validation.validate_email(recipient_email)
+    if error:
+        st.error(error)
+        return False
+
+    try:
+        if policy is not None:
+            job_id = get_submission_queue().enqueue_digest(recipient_email, school, filename, pdf_data, *policy, fingerprint=fingerprint)
+            outcome = "buffered"
+        else:
+            from mailer import build_pdf_email
+            msg = build_pdf_email(pdf_data, filename, recipient_email, MAIL_FROM)
+            job_id = get_submission_queue().enqueue(recipient_email, msg.as_bytes(), fingerprint=fingerprint)
+            outcome = "queued"
+        if job_id is None:
+            st.info("같은 내용의 전입예정확인서가 이미 제출되어 다시 보내지 않았습니다.")
+            outcome = "duplicate"
+        metrics.increment("submissions", outcome=outcome)
+        return True
+    except Exception as e:
+        metrics.increment("submissions", outcome="failed")
+        st.error(f"이메일 발송 실패: {e}")
+        st.error("이메일 설정을 확인하고 다시 시도해주세요.")
+        return False
+
+# 세션 데이터 초기화 함수
+def clear_session_state():
+    # 보관 중인 결과물도 만료를 기다리지 않고 바로 삭제
+    store = get_artifact_store()
+    store.discard(st.session_state.get("artifact_handle"))
+    for handle in st.session_state.get("render_cache", {}).values():
+        store.discard(handle)
+    render_job = st.session_state.get("render_job")
+    if render_job:
+        get_render_pool().cancel(render_job[0])
+    keys_to_keep = []  # 필요한 경우 유지할 키 지정
+    for key in list(st.session_state.keys()):
+        if key not in keys_to_keep:
+            del st.session_state[key]
+
+# 입력칸 값을 바로 검사하여 오류를 표시하는 함수 (올바르지 않으면 빈 값을 반환하고, 빈칸은 '다음 단계로'에서 안내)
+def checked_input(field, value):
+    if not value:
+        return ""
+    value, error = validation.validate_field(field, value)
+    if error:
+        st.error(error.message)
+        return ""
+    return value
+
+# 세션에서 같은 내용(지문)으로 이미 만든 결과물의 핸들을 찾는 함수 (보관 시간이 지났으면 None)
+def find_cached_render(fingerprint):
+    handle = st.session_state.setdefault("render_cache", {}).get(fingerprint)
+    if handle is None or get_artifact_store().get(handle) is None:
+        return None
+    return handle
+
+# 새 결과물을 세션 캐시에 기억하고, 한도를 넘은 오래된 결과물은 보관소에서 지우는 함수
+def remember_render(fingerprint, handle):
+    cache = st.session_state.setdefault("render_cache", {})
+    previous = cache.pop(fingerprint, None)
+    if previous is not None and previous != handle:
+        get_artifact_store().discard(previous)
+    cache[fingerprint] = handle
+    while len(cache) > RENDER_CACHE_SIZE:
+        get_artifact_store().discard(cache.pop(next(iter(cache))))
+
+# 같은 내용으로 만든 결과물이 있으면 바로 4단계에서 보여 주는 함수 (없으면 False)
+def reuse_cached_render(fingerprint):
+    handle = find_cached_render(fingerprint)
+    if handle is None:
+        return False
+    metrics.increment("renders", outcome="cache_hit", engine=RENDER_ENGINE)
+    st.session_state.artifact_handle = handle
+    st.session_state.stage = 4
+    st.rerun()
+
+# 작업자에게 넘긴 PDF 생성 작업의 진행 상태를 보여 주는 함수 (끝나면 결과를 보관소에 넣고 4단계로 이동)
+def show_render_progress():
+    if not st.session_state.get("render_job"):
+        return
+    job_id, form_id, filename, inputs, signatures, fingerprint = st.session_state.render_job
+    metrics.begin_submission()
+    status, value = get_render_pool().poll(job_id)
+    if status == "done":
+        pdf_bytes, preview_images, trace = value
+        metrics.record_trace(trace)
+        metrics.increment("renders", outcome="ok", engine=RENDER_ENGINE)
+        metrics.end_submission("rendered", engine=RENDER_ENGINE, profile=OUTPUT_PROFILE,
+                               pdf_bytes=len(pdf_bytes), pages=len(preview_images))
+        export_metrics()
+
+        # 새 결과물의 핸들을 세션에 저장하고 내용별 캐시에 기억 (오래된 결과물은 캐시 한도를 넘으면 지움)
+        # (수정 후 다시 만들 수 있도록 서식 ID·입력값·서명·지문을 함께 보관)
+        source_bytes = sum(form_renderer.signature_nbytes(sign) for sign in signatures.values())
+        st.session_state.artifact_handle = get_artifact_store().put(
+            pdf_bytes, preview_images, filename, (form_id, inputs, signatures, fingerprint), source_bytes,
+        )
+        remember_render(fingerprint, st.session_state.artifact_handle)
+        st.session_state.render_job = None
+        st.session_state.stage = 4
+        st.rerun()
+    elif status in ("queued", "running"):
+        if status == "queued":
+            st.info(f"PDF 생성 순서를 기다리고 있습니다. (앞에 {value}건)")
+            st.progress(0.0)
+        else:
+            st.info("PDF를 생성하고 있습니다. 잠시만 기다려 주세요.")
+            st.progress(value)
+        time.sleep(RENDER_POLL_SECONDS)
+        st.rerun()
+    else:
+        st.session_state.render_job = None
+        metrics.increment("renders", outcome="error", engine=RENDER_ENGINE)
+        metrics.end_submission("render_failed", engine=RENDER_ENGINE, profile=OUTPUT_PROFILE)
+        export_metrics()
+        if status == "failed":
+            st.error(f"PDF 생성 중 오류 발생: {value}")
+        else:
+            st.error("PDF 생성 작업을 찾을 수 없습니다. 다시 작성 후 제출해 주세요.")
+
+# 4단계에서 고칠 수 있는 항목 (build_field_map 인자, 입력칸 이름은 validation.FIELD_LABELS)
+EDITABLE_FIELDS = ("student_name", "student_school", "parent_name", "relationship", "parent_phone", "address")
+
+# 1단계: 지역 및 학교 선택
+if st.session_state.stage == 1:
+    st.subheader("1단계: 지역 및 학교")
+    st.markdown('<div class="instruction-message">전입 예정 지역 및 전학 예정 학교를 선택하세요.</div>', unsafe_allow_html=True)
+
+    try:
+        st.session_state.schools_by_region, _, _ = load_school_directory()
+        regions = list(st.session_state.schools_by_region.keys())
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    except Exception as e:
+        st.error(f"XLSX 파일을 읽는 중 오류가 발생했습니다: {e}. 파일 경로 및 형식을 확인해주세요. 경로: {XLSX_FILE_PATH}")
+        st.stop()
+
+    st.session_state.selected_region = st.selectbox("전입 예정 지역을 선택하세요.", regions)
+
+    available_schools = st.session_state.schools_by_region.get(st.session_state.selected_region, [])
+    if not available_schools:
+        st.warning("선택한 지역에 학교 정보가 없습니다. 다른 지역을 선택해주세요.")
+        st.session_state.selected_school = ""
+    else:
+        st.session_state.selected_school = st.selectbox("전학 예정 학교를 선택하세요.", available_schools)
+
+    if st.button("✒️다음 단계로"):
+        if st.session_state.selected_region and st.session_state.selected_school:
+            st.session_state.stage = 2
+            st.rerun()
+        else:
+            st.warning("지역과 학교를 모두 선택하세요.")
+
+# 2단계: 개인정보 수집·이용 동의서
+elif st.session_state.stage == 2:
+    st.subheader("2단계: 개인정보 수집·이용 동의서")
+    st.markdown('<div class="instruction-message">개인정보 수집·이용 동의서를 확인 후 진행하세요.</div>', unsafe_allow_html=True)
+
+    consent_images = convert_pdf_to_images(CONSENT_SAMPLE_PATH, dpi=150)
+    if consent_images:
+        with st.expander("📄 개인정보 수집·이용 동의서", expanded=True):
+            for i, image in enumerate(consent_images):
+                st.image(image, use_container_width=True)
+    else:
+        st.error("동의서 샘플 PDF를 불러올 수 없습니다. 파일 경로를 확인해주세요.")
+
+    consent_choice = st.radio(
+        "☞ 위와 같이 개인정보 수집·이용에 동의하십니까?",
+        options=["동의합니다.", "동의하지 않습니다."],
+        index=None,
+        key="consent_radio"
+    )
+    if consent_choice == "동의합니다.":
+        if st.button("✒️다음 단계로"):
+            st.session_state.stage = 3
+            st.rerun()
+    elif consent_choice == "동의하지 않습니다.":
+        st.warning("개인정보 수집·이용에 동의 시에만 다음 단계로 진행할 수 있습니다.")
+
+# 3단계: 전입예정확인서
+elif st.session_state.stage == 3:
+    st.subheader("3단계: 전입예정확인서")
+    from streamlit_drawable_canvas import st_canvas
+
+    # 서식 배치를 미리 컴파일하고 사용하는 글꼴을 불러오기 (배치 오류는 작성 전에 바로 안내)
+    try:
+        form_renderer.preload()
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    except OSError:
+        # 글꼴 파일이 없으면 PDF 생성 시 오류로 안내
+        pass
+
+    # 작업자에게 넘긴 PDF 생성 작업이 있으면 진행 상태를 보여 주고, 끝나면 4단계로 이동
+    show_render_progress()
+
+    st.markdown('<div class="instruction-message">모든 작성칸을 올바르게 작성하세요.</div>', unsafe_allow_html=True)
+
+    transfer_images = convert_pdf_to_images(TRANSFER_SAMPLE_PATH, dpi=150)
+    if transfer_images:
+        with st.expander("📄 전입예정확인서 예시", expanded=True):
+            for i, image in enumerate(transfer_images):
+                st.image(image, use_container_width=True)
+    else:
+        st.error("전입예정확인서 샘플 PDF를 불러올 수 없습니다. 파일 경로를 확인해주세요.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        student_name = st.text_input(
+            "(학생) 성명",
+            placeholder="예) 한잎새",
+            key="student_name_input"
+        )
+        st.session_state.student_name = checked_input("student_name", student_name)
+
+    # 작성일자 기준으로 앞뒤 30 년 범위 설정
+        today = date.today()
+        min_date = today - timedelta(days=30*365)  # 30 년 전
+        max_date = today + timedelta(days=30*365)  # 30 년 후
+        st.session_state.student_birth_date = st.date_input(
+            "(학생) 생년월일",
+            value=None,
+            min_value=min_date,
+            max_value=max_date,
+            key="student_birth_date_input"
+        )
+        student_school = st.text_input(
+            "(학생) 현 소속 학교 및 학년",
+            placeholder="예) 00초등학교, 00중학교, 00고등학교 1학년",
+            key="student_school_input"
+        )
+        student_school = checked_input("student_school", student_school)
+        parent_name = st.text_input(
+            "(법정대리인) 성명",
+            placeholder="예) 한나무",
+            key="parent_name_input"
+        )
+        parent_name = checked_input("parent_name", parent_name)
+        relationship = st.text_input(
+            "(법정대리인) 학생과의 관계",
+            placeholder="예) 부, 모, 조부, 조모 등",
+            key="relationship_input"
+        )
+        relationship = checked_input("relationship", relationship)
+    with col2:
+        parent_phone_input = st.text_input(
+            "(법정대리인) 휴대전화 번호",
+            placeholder="예) 01056785678 / 숫자로만 작성",
+            key="parent_phone_input"
+        )
+        parent_phone = checked_input("parent_phone", parent_phone_input)
+        st.session_state.move_date = st.date_input("전입 예정일", value=None)
+        address = st.text_input(
+            "전입 예정 주소",
+            placeholder="예) 행복택지 A-1블록 사랑아파트",
+            key="address_input"
+        )
+        address = checked_input("address", address)
+        school_name = st.text_input("전학 예정 학교", value=st.session_state.selected_school, disabled=True)
+        next_grade = st.selectbox(
+            "전학 예정 학년",
+            options=list(validation.GRADE_OPTIONS),
+            index=None,
+            placeholder="학년을 선택하세요.",
+            key="next_grade_input"
+        )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("학생 서명")
+        canvas_student = st_canvas(
+            fill_color="rgba(255, 255, 255, 0)",
+            stroke_width=5,
+            background_color="rgba(255, 255, 255, 0)",
+            height=SIGNATURE_CANVAS_HEIGHT,
+            width=SIGNATURE_CANVAS_WIDTH,
+            drawing_mode="freedraw",
+            key="student_sign_canvas"
+        )
+    with col2:
+        st.write("법정대리인 서명")
+        canvas_parent = st_canvas(
+            fill_color="rgba(255, 255, 255, 0)",
+            stroke_width=5,
+            background_color="rgba(255, 255, 255, 0)",
+            height=SIGNATURE_CANVAS_HEIGHT,
+            width=SIGNATURE_CANVAS_WIDTH,
+            drawing_mode="freedraw",
+            key="parent_sign_canvas"
+        )
+
+    if st.button("✒️다음 단계로"):
+        # 모든 항목을 한 번에 검사하고 빈칸·오류를 함께 안내
+        inputs, errors = validation.validate_fields({
+            "student_name": st.session_state.student_name, "parent_name": parent_name, "school_name": school_name,
+            "student_school": student_school, "relationship": relationship,
+            "student_birth_date": st.session_state.student_birth_date, "parent_phone": parent_phone,
+            "move_date": st.session_state.move_date, "address": address, "next_grade": next_grade,
+        })
+        if errors:
+            for message in validation.describe_errors(errors):
+                st.error(message)
+            st.stop()
+        try:
+            canvases = {"{{student_sign_path}}": canvas_student, "{{parent_sign_path}}": canvas_parent}
+            # 서명 비율 체크 (획 데이터 방식이면 캔버스 배열 대신 획 좌표로 계산)
+            if SIGNATURE_CAPTURE == "strokes":
+                with metrics.span("signature_process"):
+                    signatures = {
+                        key: form_renderer.SignatureStrokes.from_canvas_json(
+                            canvas.json_data, SIGNATURE_CANVAS_WIDTH, SIGNATURE_CANVAS_HEIGHT,
+                        )
+                        for key, canvas in canvases.items()
+                    }
+                coverages = [sign.coverage() for sign in signatures.values()]
+            else:
+                coverages = [form_renderer.calculate_signature_coverage(canvas.image_data) for canvas in canvases.values()]
+
+            if min(coverages) < 0.05:
+                st.warning("학생과 법정대리인 모두 올바르게 서명하세요.")
+                st.stop()
+
+            if SIGNATURE_CAPTURE != "strokes":
+                # 서명을 메모리에서 처리 (PNG 변환 없이 캔버스 배열을 그대로 사용)
+                with metrics.span("signature_process"):
+                    signatures = {key: form_renderer.signature_from_canvas(canvas.image_data) for key, canvas in canvases.items()}
+
+            field_map = form_renderer.build_field_map(**inputs)
+            # 이 세션에서 같은 내용으로 이미 만들었으면 다시 생성하지 않음
+            fingerprint = form_renderer.submission_fingerprint(
+                field_map, signatures, RENDER_ENGINE, OUTPUT_PROFILE, OUTPUT_TARGET_KB * 1024,
+            )
+            reuse_cached_render(fingerprint)
+            # PDF 생성은 작업자 프로세스에 맡기고 작업 ID만 세션에 저장 (대기 작업이 많으면 잠시 후 다시 시도하도록 안내)
+            job_id = get_render_pool().submit(
+                field_map, signatures, RENDER_ENGINE, OUTPUT_PROFILE, OUTPUT_TARGET_KB * 1024,
+            )
+            if job_id is None:
+                st.warning("지금 제출하는 분이 많아 PDF를 바로 만들 수 없습니다. 잠시 후 '다음 단계로'를 다시 눌러 주세요.")
+                st.stop()
+            filename = form_renderer.make_filename(school_name, next_grade)
+            st.session_state.render_job = (job_id, job_id, filename, inputs, signatures, fingerprint)
+            st.rerun()
+
+        except Exception as e:
+            metrics.increment("renders", outcome="error", engine=RENDER_ENGINE)
+            export_metrics()
+            st.error(f"PDF 생성 중 오류 발생: {e}")
+
+# 4단계: 미리보기 및 제출
+elif st.session_state.stage == 4:
+    st.subheader("4단계: 미리보기 및 제출")
+    st.markdown('<div class="instruction-message">미리보기를 통해 최종 확인 후 제출하세요.</div>', unsafe_allow_html=True)
+
+    # 수정 내용으로 다시 만드는 중이면 진행 상태를 보여 줌
+    show_render_progress()
+
+    artifact_handle = st.session_state.get("artifact_handle")
+    artifact = get_artifact_store().get(artifact_handle)
+    if artifact is not None:
+        pdf_bytes, images, filename, source = artifact
+        try:
+            # 3단계에서 PDF와 함께 만든 미리보기 이미지를 그대로 표시 (PDF를 다시 래스터화하지 않음)
+            with st.expander("📄 전입예정확인서 미리보기", expanded=True):
+                for i, image in enumerate(images):
+                    st.image(image, use_container_width=True)
+
+            # 잘못 쓴 내용은 고친 필드만 다시 그려 새 PDF로 만듦
+            if source is not None:
+                form_id, inputs, signatures, fingerprint = source
+                with st.expander("✏️ 내용 수정"):
+                    edited = {
+                        name: st.text_input(validation.FIELD_LABELS[name], value=inputs[name], key=f"edit_{name}")
+                        for name in EDITABLE_FIELDS
+                    }
+                    if st.button("🔄 수정 내용 반영하기"):
+                        # 3단계와 같은 규칙으로 고친 값을 검사
+                        values, errors = validation.validate_fields(edited)
+                        if errors:
+                            for message in validation.describe_errors(errors):
+                                st.error(message)
+                            st.stop()
+                        inputs = {**inputs, **values}
+                        field_map = form_renderer.build_field_map(**inputs)
+                        # 바뀐 내용이 없거나 전에 만든 내용으로 되돌린 경우 저장된 결과물을 그대로 사용
+                        fingerprint = form_renderer.submission_fingerprint(
+                            field_map, signatures, RENDER_ENGINE, OUTPUT_PROFILE, OUTPUT_TARGET_KB * 1024,
+                        )
+                        reuse_cached_render(fingerprint)
+                        job_id = get_render_pool().submit(
+                            field_map, signatures,
+                            RENDER_ENGINE, OUTPUT_PROFILE, OUTPUT_TARGET_KB * 1024, form_id=form_id,
+                        )
+                        if job_id is None:
+                            st.warning("지금 제출하는 분이 많아 PDF를 바로 만들 수 없습니다. 잠시 후 다시 눌러 주세요.")
+                            st.stop()
+                        st.session_state.render_job = (job_id, form_id, filename, inputs, signatures, fingerprint)
+                        st.rerun()
+
+            st.download_button(
+                label="💾 전입예정확인서 내려받기",
+                data=pdf_bytes,
+                file_name=filename,
+                mime='application/pdf'
+            )
+
+            if st.button("📮 전입예정확인서 제출하기"):
+                with st.spinner("제출 중입니다. 잠시만 기다려 주세요."):
+                    try:
+                        _, email_by_school, delivery_by_school = load_school_directory()
+                        selected_school_email = email_by_school.get(st.session_state.selected_school)
+                        if selected_school_email is None:
+                            st.error(f"학교 '{st.session_state.selected_school}'에 해당하는 이메일이 없습니다.")
+                            st.error("오류가 발생했습니다. 다시 처음부터 진행해주세요.")
+                            clear_session_state()
+                            st.stop()
+                        sent = send_pdf_email(pdf_bytes, filename, selected_school_email, st.session_state.selected_school,
+                                              delivery_by_school.get(st.session_state.selected_school),
+                                              source[3] if source is not None else None)
+                        export_metrics()
+                        if sent:
+                            st.success("정상적으로 제출되었습니다. 협조해 주셔서 감사합니다.")
+                            # 제출 완료 후 즉시 세션 데이터 초기화
+                            clear_session_state()
+                        else:
+                            st.error("오류가 발생했습니다. 다시 처음부터 진행해주세요.")
+                            clear_session_state()
+                    except Exception as e:
+                        st.error(f"이메일 발송 중 오류 발생: {e}")
+                        st.error("오류가 발생했습니다. 다시 처음부터 진행해주세요.")
+                        clear_session_state()
+        except Exception as e:
+            st.error(f"PDF 미리보기 이미지 생성 중 오류 발생: {e}")
+            st.error("PDF 파일을 다운로드하여 확인해 주세요.")
+            st.download_button(
+                label="💾 전입예정확인서 내려받기",
+                data=pdf_bytes,
+                file_name=filename,
+                mime='application/pdf'
+            )
+            clear_session_state()
+    elif artifact_handle:
+        # 보관 시간이 지났거나 메모리 한도 때문에 지워진 경우 다시 생성하도록 안내
+        st.warning("생성한 전입예정확인서의 보관 시간이 지났습니다. 3단계에서 다시 생성해 주세요.")
+        if st.button("✒️3단계로 돌아가기"):
+            st.session_state.artifact_handle = None
+            st.session_state.stage = 3
+            st.rerun()
+    else:
+        st.error("PDF가 생성되지 않았습니다. 3단계로 돌아가 PDF를 생성해 주세요.")
+        clear_session_state()
@@ -0,0 +1,255 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from io import BytesIO
+import metrics
+from shared_cache import pack_parts, unpack_parts
+
+# 생성한 PDF와 미리보기 이미지를 세션 밖에서 보관하는 모듈
+# 세션에는 핸들(문자열)만 두고, 실제 바이트는 전체 용량 한도와 보관 시간 안에서만 유지합니다.
+# ArtifactStore는 프로세스 메모리에, SqliteArtifactStore는 여러 프로세스(앱 복제본)가 함께 여는 SQLite 파일에 보관하며
+# 두 클래스는 같은 메서드(put·get·discard·usage)를 제공합니다.
+
+
+class ArtifactStore:
+    """프로세스 전역에서 생성 결과물을 바이트 한도와 보관 시간(TTL) 안에서 보관합니다.
+
+    한도를 넘으면 가장 오래 사용하지 않은 항목부터 지우고, 보관 시간이 지난 항목은 조회 시 지웁니다.
+    지워진 핸들로 조회하면 None을 반환하므로 호출하는 쪽에서 다시 생성하도록 안내하면 됩니다.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=1800.0, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    # 결과물을 보관하고 핸들을 반환 (한 항목이 한도보다 크면 ValueError)
+    # source에는 수정 후 다시 만들 때 필요한 입력값 등을 함께 보관하며, 그 크기(source_bytes)도 한도에 포함
+    def put(self, pdf_bytes, previews, filename, source=None, source_bytes=0):
+        size = len(pdf_bytes) + sum(len(preview) for preview in previews) + source_bytes
+        if size > self.max_bytes:
+            raise ValueError(f"생성 결과물({size} bytes)이 보관 한도({self.max_bytes} bytes)보다 큽니다.")
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self._entries[handle] = (self.clock() + self.ttl_seconds, size, (pdf_bytes, tuple(previews), filename, source))
+            self._size += size
+            while self._size > self.max_bytes:
+                self._evict(next(iter(self._entries)), "budget")
+        return handle
+
+    # 핸들로 (PDF 바이트, 미리보기 목록, 파일 이름, source)를 반환 (만료·삭제된 경우 None)
+    def get(self, handle):
+        if not handle:
+            return None
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            # 조회할 때마다 보관 시간을 연장하고 최근 사용 위치로 옮김
+            self._entries[handle] = (self.clock() + self.ttl_seconds, entry[1], entry[2])
+            self._entries.move_to_end(handle)
+            return entry[2]
+
+    # 제출이 끝났거나 세션을 초기화할 때 바로 지우기
+    def discard(self, handle):
+        with self._lock:
+            if handle in self._entries:
+                self._evict(handle, None)
+
+    # 현재 보관 중인 (항목 수, 바이트 수)
+    def usage(self):
+        with self._lock:
+            return len(self._entries), self._size
+
+    def _expire(self):
+        # 조회 시 보관 시간을 연장하며 맨 뒤로 옮기므로 앞쪽부터 만료 여부를 보면 됨
+        now = self.clock()
+        while self._entries:
+            handle, (expires, _, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            self._evict(handle, "ttl")
+
+    def _evict(self, handle, reason):
+        _, size, _ = self._entries.pop(handle)
+        self._size -= size
+        if reason:
+            metrics.increment("artifact_evictions", reason=reason)
+
+
+class SqliteArtifactStore:
+    """ArtifactStore와 같은 방식으로 쓰되 결과물을 SQLite 파일에 보관하여 여러 프로세스가 핸들을 함께 씁니다.
+
+    프로세스마다 시계가 다르므로 보관 시간은 벽시계(time.time) 기준으로 계산합니다.
+    source에는 학생·보호자 입력값과 서명이 들어 있으므로 pickle 대신 JSON(이미지는 PNG 바이트)으로 저장하고,
+    파일은 소유자만 읽고 쓸 수 있게(0600) 만듭니다. source에는 None·문자열·숫자·날짜·list·tuple·dict,
+    PIL 이미지와 SignatureStrokes만 넣을 수 있습니다(그 밖의 값은 TypeError).
+    SQLite WAL 모드는 공유 메모리를 쓰므로 같은 호스트의 프로세스끼리만 안전합니다.
+    """
+
+    def __init__(self, db_path, max_bytes=64 * 1024 * 1024, ttl_seconds=1800.0, clock=time.time):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        # 파일이 없으면 소유자 전용 권한으로 먼저 만듦 (SQLite는 -wal·-shm 파일을 본 파일과 같은 권한으로 만듦)
+        os.close(os.open(db_path, os.O_RDWR | os.O_CREAT, 0o600))
+        with self._transaction() as db:
+            # 예전 버전이 pickle로 저장한 표는 읽지 않고 지움 (보관 시간이 짧은 결과물이므로 다시 생성하면 됨)
+            db.execute("DROP TABLE IF EXISTS artifacts")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS artifact_entries (
+                    handle TEXT PRIMARY KEY,
+                    expires REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    pdf BLOB NOT NULL,
+                    previews BLOB NOT NULL,
+                    filename TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    source_blobs BLOB NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS artifact_entries_last_used ON artifact_entries (last_used)")
+
+    @contextmanager
+    def _transaction(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    # 결과물을 보관하고 핸들을 반환 (한 항목이 한도보다 크면 ValueError)
+    # 용량은 저장한 바이트 수로 계산하므로 source_bytes는 ArtifactStore와 호출 방식을 맞추기 위한 인자
+    def put(self, pdf_bytes, previews, filename, source=None, source_bytes=0):
+        blobs = []
+        source_json = json.dumps(encode_source(source, blobs), ensure_ascii=False)
+        previews_blob = pack_parts(previews)
+        source_blob = pack_parts(blobs)
+        size = len(pdf_bytes) + len(previews_blob) + len(source_json.encode('utf-8')) + len(source_blob)
+        if size > self.max_bytes:
+            raise ValueError(f"생성 결과물({size} bytes)이 보관 한도({self.max_bytes} bytes)보다 큽니다.")
+        handle = uuid.uuid4().hex
+        now = self.clock()
+        with self._transaction() as db:
+            self._expire(db, now)
+            db.execute("INSERT INTO artifact_entries (handle, expires, last_used, size, pdf, previews, filename, source, source_blobs)"
+                       " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (handle, now + self.ttl_seconds, now, size, pdf_bytes, previews_blob, filename, source_json, source_blob))
+            total = db.execute("SELECT SUM(size) FROM artifact_entries").fetchone()[0]
+            # 한도를 넘으면 가장 오래 사용하지 않은 항목부터 지움
+            for old_handle, old_size in db.execute(
+                    "SELECT handle, size FROM artifact_entries WHERE handle != ? ORDER BY last_used", (handle,)).fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM artifact_entries WHERE handle = ?", (old_handle,))
+                total -= old_size
+                metrics.increment("artifact_evictions", reason="budget")
+        return handle
+
+    # 핸들로 (PDF 바이트, 미리보기 목록, 파일 이름, source)를 반환 (만료·삭제된 경우 None)
+    def get(self, handle):
+        if not handle:
+            return None
+        now = self.clock()
+        with self._transaction() as db:
+            self._expire(db, now)
+            row = db.execute("SELECT pdf, previews, filename, source, source_blobs FROM artifact_entries WHERE handle = ?",
+                             (handle,)).fetchone()
+            if row is None:
+                return None
+            # 조회할 때마다 보관 시간을 연장하고 최근 사용 시각을 갱신
+            db.execute("UPDATE artifact_entries SET expires = ?, last_used = ? WHERE handle = ?",
+                       (now + self.ttl_seconds, now, handle))
+        pdf_bytes, previews, filename, source_json, source_blob = row
+        return pdf_bytes, unpack_parts(previews), filename, decode_source(json.loads(source_json), unpack_parts(source_blob))
+
+    # 제출이 끝났거나 세션을 초기화할 때 바로 지우기
+    def discard(self, handle):
+        if not handle:
+            return
+        with self._transaction() as db:
+            db.execute("DELETE FROM artifact_entries WHERE handle = ?", (handle,))
+
+    # 현재 보관 중인 (항목 수, 바이트 수)
+    def usage(self):
+        with self._transaction() as db:
+            count, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifact_entries").fetchone()
+        return count, size
+
+    def _expire(self, db, now):
+        expired = db.execute("DELETE FROM artifact_entries WHERE expires <= ?", (now,)).rowcount
+        if expired:
+            metrics.increment("artifact_evictions", amount=expired, reason="ttl")
+
+# source를 JSON으로 저장할 수 있는 값으로 바꾸는 함수 (이미지 PNG·획 좌표 바이트는 blobs에 모으고 번호로 가리킴)
+# 모든 묶음 값은 {"종류": 내용} 형태로 바꾸므로 JSON 객체는 항상 이 표시를 뜻함
+def encode_source(value, blobs):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return {type(value).__name__: [encode_source(item, blobs) for item in value]}
+    if isinstance(value, dict):
+        return {"dict": [[encode_source(key, blobs), encode_source(item, blobs)] for key, item in value.items()]}
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"date": value.isoformat()}
+    from PIL import Image
+    from form_renderer import SignatureStrokes
+    if isinstance(value, Image.Image):
+        buffer = BytesIO()
+        value.save(buffer, format='PNG')
+        blobs.append(buffer.getvalue())
+        return {"png": len(blobs) - 1}
+    if isinstance(value, SignatureStrokes):
+        first = len(blobs)
+        blobs.extend(points.tobytes() for points in value.strokes)
+        return {"strokes": [value.width, value.height, list(range(first, len(blobs))), value.stroke_width, list(value.color)]}
+    raise TypeError(f"보관소에 저장할 수 없는 값입니다: {type(value).__name__}")
+
+# encode_source로 바꾼 값을 되돌리는 함수
+def decode_source(value, blobs):
+    if not isinstance(value, dict):
+        return value
+    [(kind, body)] = value.items()
+    if kind == "list":
+        return [decode_source(item, blobs) for item in body]
+    if kind == "tuple":
+        return tuple(decode_source(item, blobs) for item in body)
+    if kind == "dict":
+        return {decode_source(key, blobs): decode_source(item, blobs) for key, item in body}
+    if kind == "datetime":
+        return datetime.fromisoformat(body)
+    if kind == "date":
+        return date.fromisoformat(body)
+    if kind == "png":
+        from PIL import Image
+        image = Image.open(BytesIO(blobs[body]))
+        image.load()
+        return image
+    if kind == "strokes":
+        from form_renderer import SignatureStrokes
+        width, height, indexes, stroke_width, color = body
+        return SignatureStrokes(width, height, [array('h', blobs[index]) for index in indexes], stroke_width, color)
+    raise ValueError(f"알 수 없는 보관 형식입니다: {kind}")
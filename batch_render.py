@@ -0,0 +1,161 @@
+import argparse
+import csv
+import os
+import sys
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from PIL import Image
+import form_renderer
+import validation
+
+# 전입예정확인서 일괄 생성 스크립트
+# 사용법: python batch_render.py 명단.xlsx -o 결과.zip [--engine vector] [--workers 4]
+# 명단의 각 행을 읽는 즉시 작업자 프로세스에 넘기고, 완성된 PDF는 바로 디스크(폴더 또는 ZIP)에 기록하므로
+# 행 수와 관계없이 메모리 사용량이 일정하게 유지됩니다.
+
+# 명단 열 이름 → build_field_map 인자
+COLUMNS = {
+    "학생성명": "student_name",
+    "학생생년월일": "student_birth_date",
+    "현소속학교및학년": "student_school",
+    "법정대리인성명": "parent_name",
+    "학생과의관계": "relationship",
+    "휴대전화번호": "parent_phone",
+    "전입예정일": "move_date",
+    "전입예정주소": "address",
+    "전학예정학교": "school_name",
+    "전학예정학년": "next_grade",
+}
+# 서명 이미지 파일 경로 열 (선택)
+SIGNATURE_COLUMNS = {
+    "학생서명": "{{student_sign_path}}",
+    "법정대리인서명": "{{parent_sign_path}}",
+}
+
+# CSV 또는 XLSX 명단을 한 행씩 읽어 (행 번호, 열 이름→값) 형태로 내보내는 함수
+def read_rows(path):
+    if path.lower().endswith('.csv'):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row_number, row in enumerate(csv.DictReader(f), start=2):
+                yield row_number, row
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+            for row_number, values in enumerate(rows, start=2):
+                if all(value is None for value in values):
+                    continue
+                yield row_number, dict(zip(header, values))
+        finally:
+            workbook.close()
+
+# 한 행으로 PDF를 만드는 함수 (작업자 프로세스에서 실행)
+def render_row(row_number, row, engine, profile=form_renderer.DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+    # 화면과 같은 규칙으로 모든 열을 한 번에 검사하고, 실패한 열을 모아 알림
+    values, errors = validation.validate_fields(
+        {name: row.get(column) for column, name in COLUMNS.items()}, COLUMNS.values(),
+    )
+    if errors:
+        columns = {name: column for column, name in COLUMNS.items()}
+        raise ValueError(", ".join(
+            f"'{columns[error.field]}' 값이 비어 있습니다." if error.empty else f"'{columns[error.field]}' {error.message}"
+            for error in errors
+        ))
+
+    signatures = {}
+    for column, key in SIGNATURE_COLUMNS.items():
+        sign_path = row.get(column)
+        if sign_path:
+            with Image.open(str(sign_path).strip()) as sign:
+                signatures[key] = sign.convert('RGBA')
+
+    field_map = form_renderer.build_field_map(**values)
+    pdf_bytes = form_renderer.render_pdf(field_map, signatures, engine, profile, target_bytes)
+    # 같은 학교·학년이 여러 행에 있으므로 행 번호와 학생 이름을 붙여 구분
+    filename = f"{row_number:05d}_{values['student_name']}_" + form_renderer.make_filename(values['school_name'], values['next_grade'])
+    return filename, pdf_bytes
+
+# 완성된 PDF를 폴더 또는 ZIP 파일에 바로 기록하는 클래스
+class OutputWriter:
+    def __init__(self, output):
+        self.zip_file = None
+        self.directory = None
+        if output.lower().endswith('.zip'):
+            self.zip_file = zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            os.makedirs(output, exist_ok=True)
+            self.directory = output
+
+    def write(self, filename, pdf_bytes):
+        if self.zip_file is not None:
+            self.zip_file.writestr(filename, pdf_bytes)
+        else:
+            with open(os.path.join(self.directory, filename), 'wb') as f:
+                f.write(pdf_bytes)
+
+    def close(self):
+        if self.zip_file is not None:
+            self.zip_file.close()
+
+# 명단 전체를 작업자 프로세스로 나누어 생성하고 (성공 수, 실패 목록)을 반환하는 함수
+def run_batch(input_path, output, engine="raster", workers=None, max_pending=None,
+              profile=form_renderer.DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+    # 서식 배치·글꼴 오류는 작업자를 띄우기 전에 바로 알림
+    form_renderer.preload()
+    workers = workers or os.cpu_count() or 1
+    # 처리 대기 작업 수를 제한하여 읽어 둔 행과 결과가 메모리에 쌓이지 않게 함
+    max_pending = max_pending or workers * 2
+    writer = OutputWriter(output)
+    succeeded = 0
+    failures = []
+
+    def collect(done):
+        nonlocal succeeded
+        for future in done:
+            row_number = pending.pop(future)
+            try:
+                filename, pdf_bytes = future.result()
+            except Exception as e:
+                failures.append((row_number, str(e)))
+                continue
+            writer.write(filename, pdf_bytes)
+            succeeded += 1
+
+    pending = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=form_renderer.preload) as pool:
+            for row_number, row in read_rows(input_path):
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[pool.submit(render_row, row_number, row, engine, profile, target_bytes)] = row_number
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+    finally:
+        writer.close()
+    return succeeded, sorted(failures)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="명단(CSV/XLSX)으로 전입예정확인서 PDF를 일괄 생성합니다.")
+    parser.add_argument("input", help="명단 파일 (.csv 또는 .xlsx)")
+    parser.add_argument("-o", "--output", required=True, help="결과 폴더 또는 .zip 파일 경로")
+    parser.add_argument("--engine", choices=sorted(form_renderer.RENDER_ENGINES), default=os.getenv("RENDER_ENGINE", "raster"))
+    parser.add_argument("--profile", choices=list(form_renderer.OUTPUT_PROFILES), default=form_renderer.DEFAULT_OUTPUT_PROFILE, help="이미지 PDF 출력 프로필")
+    parser.add_argument("--target-kb", type=int, default=0, help="PDF 목표 크기(KB), 넘으면 더 작은 프로필로 다시 저장")
+    parser.add_argument("--workers", type=int, default=None, help="작업자 프로세스 수 (기본값: CPU 코어 수)")
+    args = parser.parse_args(argv)
+
+    succeeded, failures = run_batch(
+        args.input, args.output, engine=args.engine, workers=args.workers,
+        profile=args.profile, target_bytes=args.target_kb * 1024,
+    )
+    for row_number, error in failures:
+        print(f"[실패] {row_number}행: {error}", file=sys.stderr)
+    print(f"생성 완료: {succeeded}건, 실패: {len(failures)}건")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
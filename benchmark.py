@@ -0,0 +1,482 @@
+import argparse
+import json
+import os
+import platform
+import smtplib
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import numpy as np
+from PIL import Image, ImageDraw
+import form_renderer
+import school_directory
+import validation
+from artifact_store import ArtifactStore
+from mailer import SubmissionQueue, build_pdf_email
+
+# 전입예정확인서 제출 경로 성능 측정 스크립트
+# 사용법: python benchmark.py [-n 20] [--users 8] [--startup 5] [--smtp-connect-ms 50] [--output bench.json] [--compare 이전결과.json]
+# Streamlit 없이 각 단계의 비용이 큰 작업을 합성 입력으로 반복 실행하여 단계별 p50/p95 지연 시간,
+# 최대 메모리(RSS), 출력 크기를 측정하고 JSON으로 저장합니다.
+
+SAMPLE_PDF_PATHS = ("consent_sample.pdf", "transfer_sample.pdf")
+XLSX_FILE_PATH = "school_data.xlsx"
+BENCH_MAIL_FROM = "bench@example.com"
+BENCH_RECIPIENT = "school@example.com"
+APP_PATH = "Confirmation_of_Scheduled_Residence_Transfer.py"
+# 메일 발송 측정 한 번에 보내는 메일 수
+DELIVERY_BATCH = 10
+# 앱이 시작할 때(1단계) 불러오는 모듈
+APP_STARTUP_MODULES = "streamlit, form_renderer, metrics, school_directory, artifact_store"
+
+# 새 인터프리터에서 앱 시작 모듈의 import 시간(ms)을 출력하는 스크립트
+STARTUP_IMPORT_SCRIPT = f"""
+import time
+started = time.perf_counter()
+import {APP_STARTUP_MODULES}
+print((time.perf_counter() - started) * 1000)
+"""
+# 새 인터프리터에서 앱의 첫 실행(1단계 화면)이 끝날 때까지의 시간(ms)을 출력하는 스크립트
+STARTUP_RENDER_SCRIPT = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+started = time.perf_counter()
+app.run()
+elapsed = (time.perf_counter() - started) * 1000
+if app.exception:
+    sys.exit(app.exception[0].value)
+print(elapsed)
+"""
+
+# 합성 입력: 3단계에서 입력하는 값과 같은 형식의 필드 값
+def synthetic_field_map():
+    return form_renderer.build_field_map(
+        "한잎새", "한나무", "민국초등학교", "대한초등학교 1학년", "부",
+        date(2017, 1, 1), "010-5678-5678", date(2025, 2, 2), "행복택지 A-1블록 사랑아파트 101동 1001호", "2학년",
+    )
+
+# 합성 입력: 서명 획의 좌표 40개
+def synthetic_points(seed):
+    rng = np.random.default_rng(seed)
+    return [tuple(point) for point in rng.integers((20, 20), (280, 130), size=(40, 2)).tolist()]
+
+# 합성 입력: 캔버스에 그린 서명처럼 투명 배경에 획이 있는 150×300 RGBA 배열
+def synthetic_canvas(seed):
+    image = Image.new('RGBA', (300, 150), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.line(synthetic_points(seed), fill=(0, 0, 0, 255), width=5, joint='curve')
+    return np.asarray(image).astype(np.float64)
+
+# 합성 입력: 같은 획을 캔버스의 json_data(freedraw path) 형식으로 나타낸 값
+def synthetic_canvas_json(seed):
+    points = synthetic_points(seed)
+    path = [["M", *points[0]]] + [["L", *point] for point in points[1:]]
+    return {"objects": [{"type": "path", "strokeWidth": 5, "stroke": "#000", "path": path}]}
+
+# 합성 입력: 지정한 행 수의 학교 정보 XLSX
+def synthetic_directory(path, rows):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([school_directory.REGION_COLUMN, school_directory.SCHOOL_COLUMN, school_directory.EMAIL_COLUMN])
+    for i in range(rows):
+        sheet.append([f"지역{i % 50:02d}", f"학교{i:06d}", f"school{i}@example.com"])
+    workbook.save(path)
+
+# 합성 입력: 일괄 생성 명단처럼 문자열로 된 입력 행 (10행마다 한 행은 주소·전화번호가 잘못됨)
+def synthetic_rows(rows):
+    valid = {
+        "student_name": "한잎새", "student_birth_date": "2017-01-01", "student_school": "대한초등학교 1학년",
+        "parent_name": "한나무", "relationship": "부", "parent_phone": "01056785678", "move_date": "2025-02-02",
+        "address": "행복택지 A-1블록 사랑아파트 101동 1001호", "school_name": "민국초등학교", "next_grade": "2학년",
+    }
+    invalid = {**valid, "address": "행복택지 A-1블록 #101", "parent_phone": "0105678"}
+    return [invalid if i % 10 == 9 else valid for i in range(rows)]
+
+_sample_preview_cache = None
+
+# 앱의 rasterize_sample_pdf와 같은 방식(수정시각을 키에 넣은 st.cache_resource)으로 샘플 미리보기를 반환하는 함수
+def cached_sample_previews(pdf_path, mtime_ns, dpi):
+    global _sample_preview_cache
+    if _sample_preview_cache is None:
+        import streamlit as st
+
+        @st.cache_resource(show_spinner=False, max_entries=8)
+        def rasterize_sample_pdf(pdf_path, mtime_ns, dpi):
+            return form_renderer.rasterize_pdf_to_png(pdf_path, dpi)
+
+        _sample_preview_cache = rasterize_sample_pdf
+    return _sample_preview_cache(pdf_path, mtime_ns, dpi)
+
+# 로컬 SMTP 대역 서버 (받은 메일 수만 세고 내용은 버림)
+# connect_delay초만큼 인사 응답을 늦추어 실제 서버의 TLS 협상·로그인 시간을 흉내 낼 수 있음
+class SMTPSink(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay=0.0):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.connect_delay = connect_delay
+        self.received = 0
+        self.lock = threading.Lock()
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        time.sleep(self.server.connect_delay)
+        self.wfile.write(b"220 bench ESMTP\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250 bench\r\n")
+            elif command == b"DATA":
+                self.wfile.write(b"354 end with .\r\n")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with self.server.lock:
+                    self.server.received += 1
+                self.wfile.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+# 최대 메모리 사용량(MB), resource 모듈이 없는 환경(Windows)에서는 None
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트 단위
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def summarize(timings):
+    return {
+        "iterations": len(timings),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+# 함수를 반복 실행하여 지연 시간 통계와 마지막 결과의 크기를 기록하는 함수
+def measure(fn, iterations):
+    timings = []
+    result = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    record = summarize(timings)
+    size = output_size(result)
+    if size is not None:
+        record["output_bytes"] = size
+    return record
+
+def output_size(result):
+    if isinstance(result, (bytes, bytearray)):
+        return len(result)
+    if isinstance(result, (tuple, list)) and result and all(isinstance(item, (bytes, bytearray)) for item in result):
+        return sum(len(item) for item in result)
+    return None
+
+# 단계별 측정 항목을 만드는 함수
+def build_stages(args, workdir, sink):
+    field_map = synthetic_field_map()
+    canvases = [synthetic_canvas(seed) for seed in (1, 2)]
+    canvas_jsons = [synthetic_canvas_json(seed) for seed in (1, 2)]
+    signatures = {
+        "{{student_sign_path}}": form_renderer.signature_from_canvas(canvases[0]),
+        "{{parent_sign_path}}": form_renderer.signature_from_canvas(canvases[1]),
+    }
+    plans = form_renderer.load_form_layouts()
+    directory_path = os.path.join(workdir, "directory.xlsx")
+    synthetic_directory(directory_path, args.directory_rows)
+    validation_rows = synthetic_rows(args.validation_rows)
+    state = {}
+
+    def signature_processing():
+        resized = {}
+        for canvas_data in canvases:
+            form_renderer.calculate_signature_coverage(canvas_data)
+        images = {key: form_renderer.signature_from_canvas(canvas_data) for key, canvas_data in zip(signatures, canvases)}
+        for plan in plans:
+            form_renderer.layout_signatures(plan, images, resized)
+
+    def stroke_signature_processing():
+        resized = {}
+        images = {key: form_renderer.SignatureStrokes.from_canvas_json(canvas_json, 300, 150)
+                  for key, canvas_json in zip(signatures, canvas_jsons)}
+        for sign in images.values():
+            sign.coverage()
+        for plan in plans:
+            form_renderer.layout_signatures(plan, images, resized)
+
+    def compose():
+        state["pages"] = form_renderer.compose_pages(field_map, signatures)
+
+    # 글자 그리기만 따로 측정: 글꼴 캐시 사용 vs 예전 get_font처럼 필드마다 글꼴 파일을 다시 읽고 줄 높이도 매번 측정
+    text_pages = [form_renderer.load_template_page(plan["template"], dpi=plan["dpi"]) for plan in plans]
+
+    def draw_texts_only():
+        for plan, page in zip(plans, text_pages):
+            draw = ImageDraw.Draw(page)
+            for x, y, text, font in form_renderer.layout_texts(plan, field_map):
+                draw.text((x, y), text, font=font, fill='black')
+
+    def draw_texts_without_font_cache():
+        cached = form_renderer.load_font, form_renderer.measure_line_height
+        form_renderer.load_font = cached[0].__wrapped__
+        form_renderer.measure_line_height = cached[1].__wrapped__
+        try:
+            draw_texts_only()
+        finally:
+            form_renderer.load_font, form_renderer.measure_line_height = cached
+
+    # 4단계에서 주소만 고친 경우: 바뀐 영역만 다시 그리기 vs 처음부터 다시 생성 (주소 두 가지를 번갈아 적용)
+    edited_maps = [field_map, {**field_map, "{{address}}": "행복택지 B-2블록 우정아파트 202동 2002호"}]
+    composed = form_renderer.ComposedForm(field_map, signatures)
+
+    def incremental_rerender():
+        state["edits"] = state.get("edits", 0) + 1
+        composed.update(edited_maps[state["edits"] % 2])
+        return composed.render_pdf()
+
+    def full_rerender():
+        state["edits"] = state.get("edits", 0) + 1
+        return form_renderer.render_with_previews(edited_maps[state["edits"] % 2], signatures)[0]
+
+    def template_rasterization():
+        for plan in plans:
+            form_renderer.rasterize_template_page.__wrapped__(plan["template"], 0, plan["dpi"])
+
+    # 2·3단계 재실행마다 샘플 미리보기를 얻는 비용: 예전처럼 매번 poppler로 래스터화 vs 앱과 같은 방식의 공유 캐시
+    def sample_preview_rerun_uncached():
+        from pdf2image import convert_from_path
+        return [convert_from_path(path, dpi=150) for path in SAMPLE_PDF_PATHS]
+
+    def sample_preview_rerun_cached():
+        return [cached_sample_previews(path, os.stat(path).st_mtime_ns, 150) for path in SAMPLE_PDF_PATHS]
+
+    # 재실행 비용만 재도록 첫 실행(캐시 채우기)은 측정 전에 끝내 둠
+    sample_preview_rerun_cached()
+
+    # 4단계 재실행마다 미리보기를 얻는 비용: 예전처럼 생성한 PDF를 poppler로 다시 래스터화 vs 보관소에 둔 축소 이미지 조회
+    # (생성은 측정 전에 한 번만 하고, 벡터 엔진 미리보기용 저해상도 템플릿도 미리 래스터화해 둠)
+    stage4_pages = form_renderer.compose_pages(field_map, signatures)
+    stage4_pdf = form_renderer.encode_pages(stage4_pages)
+    store = ArtifactStore()
+    stage4_handle = store.put(stage4_pdf, form_renderer.make_previews(stage4_pages), "전입예정확인서_민국초등학교_2학년.pdf")
+    form_renderer.compose_previews(field_map, signatures)
+
+    def stage4_preview_convert_from_bytes():
+        from pdf2image import convert_from_bytes
+        return convert_from_bytes(stage4_pdf, dpi=150)
+
+    def stage4_preview_thumbnails():
+        return store.get(stage4_handle)[1]
+
+    stages = {
+        "school_directory_load": lambda: school_directory.read_school_directory(XLSX_FILE_PATH),
+        f"school_directory_load_{args.directory_rows}_rows": lambda: school_directory.read_school_directory(directory_path),
+        f"validate_{args.validation_rows}_rows": lambda: [validation.validate_fields(row) for row in validation_rows],
+        "sample_preview_rasterization": lambda: [form_renderer.rasterize_pdf_to_png(path, 150) for path in SAMPLE_PDF_PATHS],
+        "sample_preview_rerun_uncached": sample_preview_rerun_uncached,
+        "sample_preview_rerun_cached": sample_preview_rerun_cached,
+        "template_rasterization": template_rasterization,
+        "signature_processing": signature_processing,
+        "signature_processing_strokes": stroke_signature_processing,
+        "draw_texts": compose,
+        "draw_texts_font_cache": draw_texts_only,
+        "draw_texts_no_font_cache": draw_texts_without_font_cache,
+        "preview_regeneration": lambda: form_renderer.make_previews(state["pages"]),
+        "preview_regeneration_vector": lambda: form_renderer.compose_previews(field_map, signatures),
+        "stage4_preview_convert_from_bytes": stage4_preview_convert_from_bytes,
+        "stage4_preview_thumbnails": stage4_preview_thumbnails,
+        "edit_full_rerender": full_rerender,
+        "edit_incremental_rerender": incremental_rerender,
+    }
+    # 엔진별 PDF 생성 전체(합성·인코딩) 시간과 출력 크기 비교 (래스터 엔진은 기본 출력 프로필)
+    for engine in form_renderer.RENDER_ENGINES:
+        stages[f"render_engine_{engine}"] = lambda engine=engine: form_renderer.render_pdf(field_map, signatures, engine)
+    for profile in form_renderer.OUTPUT_PROFILES:
+        stages[f"pdf_encoding_{profile}"] = lambda profile=profile: form_renderer.encode_pages(state["pages"], profile)
+    stages["email_assembly"] = lambda: build_pdf_email(
+        form_renderer.encode_pages(state["pages"]), "전입예정확인서_민국초등학교_2학년.pdf", BENCH_RECIPIENT, BENCH_MAIL_FROM,
+    ).as_bytes()
+    stages["email_delivery_sequential"] = lambda: deliver_sequential(sink, state, count=DELIVERY_BATCH)
+    stages["email_delivery"] = lambda: deliver(workdir, sink, state, count=DELIVERY_BATCH)
+    return stages
+
+def delivery_message(state):
+    if "message" not in state:
+        state["message"] = build_pdf_email(
+            form_renderer.encode_pages(state["pages"]), "전입예정확인서_민국초등학교_2학년.pdf", BENCH_RECIPIENT, BENCH_MAIL_FROM,
+        ).as_bytes()
+    return state["message"]
+
+# 예전 send_pdf_email처럼 메일마다 SMTP 연결을 새로 열어 차례로 보내는 시간을 재는 함수 (대기열 발송과 비교용)
+def deliver_sequential(sink, state, count):
+    message = delivery_message(state)
+    for _ in range(count):
+        with smtplib.SMTP("127.0.0.1", sink.server_address[1], timeout=30) as server:
+            server.sendmail(BENCH_MAIL_FROM, [BENCH_RECIPIENT], message)
+
+# 대기열에 넣은 메일이 모두 로컬 SMTP 대역 서버에 도착할 때까지의 시간을 재는 함수
+def deliver(workdir, sink, state, count):
+    delivery_message(state)
+    db_path = os.path.join(workdir, f"outbox-{time.perf_counter_ns()}.sqlite3")
+    queue = SubmissionQueue(db_path, "127.0.0.1", sink.server_address[1], BENCH_MAIL_FROM, None,
+                            workers=2, starttls=False, poll_interval=0.05)
+    queue.start()
+    try:
+        for _ in range(count):
+            queue.enqueue(BENCH_RECIPIENT, state["message"])
+        while queue.pending():
+            time.sleep(0.005)
+    finally:
+        queue.stop()
+
+# 매번 새 인터프리터를 띄워 앱 시작 모듈의 import 시간과 첫 화면 실행 시간을 재는 함수 (캐시가 빈 콜드 스타트)
+def measure_startup(iterations):
+    env = dict(os.environ)
+    env.setdefault("SMTP_PORT", "25")
+    app_path = os.path.abspath(APP_PATH)
+    records = {}
+    for name, script, args in (("startup_import", STARTUP_IMPORT_SCRIPT, []),
+                               ("startup_first_render", STARTUP_RENDER_SCRIPT, [app_path])):
+        timings = []
+        for _ in range(iterations):
+            completed = subprocess.run([sys.executable, "-c", script, *args], capture_output=True, text=True, env=env)
+            if completed.returncode != 0:
+                raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else completed.returncode)
+            timings.append(float(completed.stdout.strip().splitlines()[-1]))
+        records[name] = summarize(timings)
+    return records
+
+# 여러 세션이 동시에 3단계 생성과 4단계 메일 작성을 수행할 때의 세션별 지연 시간을 재는 함수
+def run_concurrent(users, iterations):
+    field_map = synthetic_field_map()
+
+    def session(seed):
+        started = time.perf_counter()
+        signatures = {
+            "{{student_sign_path}}": form_renderer.signature_from_canvas(synthetic_canvas(seed)),
+            "{{parent_sign_path}}": form_renderer.signature_from_canvas(synthetic_canvas(seed + 1)),
+        }
+        pdf_bytes, _ = form_renderer.render_with_previews(field_map, signatures)
+        build_pdf_email(pdf_bytes, "전입예정확인서_민국초등학교_2학년.pdf", BENCH_RECIPIENT, BENCH_MAIL_FROM).as_bytes()
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        timings = list(pool.map(session, range(users * iterations)))
+    elapsed = time.perf_counter() - started
+    return {
+        "users": users,
+        "sessions": len(timings),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "throughput_per_s": round(len(timings) / elapsed, 2),
+    }
+
+# 측정 결과를 저장하고 한 줄로 출력하는 함수
+def report(results, name, record):
+    results["stages"][name] = record
+    summary = record.get("error") or f"p50 {record['p50_ms']:9.2f} ms  p95 {record['p95_ms']:9.2f} ms"
+    if "output_bytes" in record:
+        summary += f"  {record['output_bytes']:>9,d} B"
+    if "messages_per_s" in record:
+        summary += f"  {record['messages_per_s']:9.1f} msg/s"
+    print(f"{name:42s} {summary}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# 이전 결과와 p50을 비교하여 출력하는 함수
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n비교 기준: {baseline_path} (commit {baseline.get('commit')})")
+    for name, record in results["stages"].items():
+        before = baseline.get("stages", {}).get(name, {}).get("p50_ms")
+        if before and "p50_ms" in record:
+            print(f"  {name:42s} {before:10.2f} → {record['p50_ms']:10.2f} ms ({record['p50_ms'] / before:5.2f}x)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="전입예정확인서 제출 경로의 단계별 성능을 측정합니다.")
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="단계별 반복 횟수")
+    parser.add_argument("--users", type=int, default=0, help="동시 세션 수 (0이면 동시 세션 측정 생략)")
+    parser.add_argument("--startup", type=int, default=5, help="콜드 스타트 측정 반복 횟수 (0이면 생략)")
+    parser.add_argument("--directory-rows", type=int, default=20000, help="대용량 학교 정보 XLSX 행 수")
+    parser.add_argument("--validation-rows", type=int, default=10000, help="입력값 검사 측정에 쓰는 명단 행 수")
+    parser.add_argument("--smtp-connect-ms", type=float, default=0, help="SMTP 대역 서버의 연결 지연(ms), TLS 협상·로그인 시간 흉내")
+    parser.add_argument("--font", default=None, help="글꼴 파일 경로 (기본값: form_renderer.FONT_PATH)")
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로")
+    parser.add_argument("--compare", default=None, help="비교할 이전 결과 JSON 경로")
+    args = parser.parse_args(argv)
+
+    if args.font:
+        form_renderer.FONT_PATH = args.font
+    form_renderer.preload()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": {},
+    }
+    if args.startup:
+        try:
+            startup = measure_startup(args.startup)
+        except Exception as e:
+            startup = {"startup": {"error": f"{type(e).__name__}: {e}"}}
+        for name, record in startup.items():
+            report(results, name, record)
+    sink = SMTPSink(args.smtp_connect_ms / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, fn in build_stages(args, workdir, sink).items():
+                try:
+                    record = measure(fn, args.iterations)
+                except Exception as e:
+                    record = {"error": f"{type(e).__name__}: {e}"}
+                if name.startswith("email_delivery") and "p50_ms" in record:
+                    record["messages_per_s"] = round(DELIVERY_BATCH * 1000 / record["p50_ms"], 1)
+                report(results, name, record)
+        if args.users:
+            results["concurrent"] = run_concurrent(args.users, max(1, args.iterations // 4))
+            print(f"concurrent ({args.users} users): {results['concurrent']}")
+    finally:
+        sink.shutdown()
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(f"peak RSS: {results['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        print_comparison(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
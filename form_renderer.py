@@ -0,0 +1,767 @@
+import os
+import hashlib
+import json
+import textwrap
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+import metrics
+
+# 전입예정확인서 PDF 생성 모듈 (Streamlit 화면과 일괄 생성 스크립트가 함께 사용)
+# 무거운 라이브러리(numpy, pdf2image, pypdf, reportlab)는 처음 쓰는 함수 안에서 불러오므로
+# 이 모듈을 불러오는 것만으로는 1단계 화면의 시작 시간이 늘지 않습니다.
+
+# 경로 설정 (서식 배치 정의 폴더에 템플릿 PDF 경로 포함)
+LAYOUT_DIR = "layouts"
+FONT_PATH = "malgun.ttf"
+VECTOR_FONT_NAME = "Malgun"
+DATE_FORMAT = "%Y년 %m월 %d일"
+# 여러 프로세스가 함께 쓰는 래스터화 결과 캐시 폴더 (비우면 프로세스 안에서만 캐시)
+# 작업자 프로세스도 같은 환경 변수를 물려받으므로 앱 복제본과 작업자가 모두 같은 폴더를 사용
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR")
+
+# 공유 파일 캐시를 반환하는 함수 (설정하지 않았으면 None)
+@lru_cache(maxsize=1)
+def get_shared_cache():
+    if not SHARED_CACHE_DIR:
+        return None
+    from shared_cache import FileCache
+    return FileCache(SHARED_CACHE_DIR)
+
+# 공유 캐시 키를 파일 내용 기준으로 만드는 함수 (복제본마다 파일 수정시각이 달라도 같은 키)
+def shared_cache_key(kind, pdf_path, dpi):
+    with open(pdf_path, 'rb') as f:
+        return f"{kind}:{hashlib.sha256(f.read()).hexdigest()}:{dpi}"
+
+# PDF 전체 페이지를 PNG 바이트 목록으로 래스터화하는 함수 (샘플 미리보기용)
+def rasterize_pdf_to_png(pdf_path, dpi):
+    cache = get_shared_cache()
+    if cache is not None:
+        from shared_cache import pack_parts, unpack_parts
+        key = shared_cache_key("sample", pdf_path, dpi)
+        data = cache.get(key)
+        if data is not None:
+            return unpack_parts(data)
+    from pdf2image import convert_from_path
+    with metrics.span("sample_rasterize"):
+        previews = []
+        for image in convert_from_path(pdf_path, dpi=dpi):
+            buffer = BytesIO()
+            image.save(buffer, format='PNG', optimize=True)
+            previews.append(buffer.getvalue())
+    if cache is not None:
+        cache.put(key, pack_parts(previews))
+    return tuple(previews)
+
+# 템플릿 PDF 첫 페이지를 래스터화하는 함수 (프로세스 전역 캐시, 경로·수정시각·DPI 기준)
+# 공유 캐시가 있으면 다른 프로세스가 저장해 둔 PNG를 읽고, 없으면 래스터화한 뒤 저장
+@lru_cache(maxsize=8)
+def rasterize_template_page(pdf_path, mtime_ns, dpi):
+    metrics.increment("cache_misses", cache="template")
+    cache = get_shared_cache()
+    if cache is not None:
+        key = shared_cache_key("template", pdf_path, dpi)
+        data = cache.get(key)
+        if data is not None:
+            with Image.open(BytesIO(data)) as image:
+                return image.convert('RGBA')
+    from pdf2image import convert_from_path
+    with metrics.span("template_rasterize"):
+        page = convert_from_path(pdf_path, dpi=dpi)[0]
+    if cache is not None:
+        buffer = BytesIO()
+        page.save(buffer, format='PNG', compress_level=1)
+        cache.put(key, buffer.getvalue())
+    return page.convert('RGBA')
+
+# 캐시된 템플릿 페이지의 복사본을 반환하는 함수
+def load_template_page(pdf_path, dpi=200):
+    # 파일이 변경되면 수정시각이 달라지므로 자동으로 다시 래스터화됨
+    metrics.increment("cache_lookups", cache="template")
+    mtime_ns = os.stat(pdf_path).st_mtime_ns
+    return rasterize_template_page(pdf_path, mtime_ns, dpi).copy()
+
+# 서식 배치 정의 파일(JSON)에서 허용하는 항목
+LAYOUT_KEYS = {"page", "template", "dpi", "font_size", "fields", "signatures"}
+FIELD_KEYS = {"key", "x", "y", "dx", "dy", "font_size", "wrap"}
+SIGNATURE_KEYS = {"key", "x", "y", "dx", "dy", "width", "height"}
+
+# 서식 배치 정의를 검증하고 오프셋을 미리 적용한 그리기 계획으로 컴파일하는 함수
+def compile_layout(spec, source):
+    from pypdf import PdfReader
+
+    def fail(message):
+        raise ValueError(f"서식 배치 파일 오류 ({source}): {message}")
+
+    def integer(entry, name, default=None, minimum=None):
+        value = entry.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool):
+            fail(f"'{name}' 값은 정수여야 합니다: {entry}")
+        if minimum is not None and value < minimum:
+            fail(f"'{name}' 값은 {minimum} 이상이어야 합니다: {entry}")
+        return value
+
+    def check_keys(entry, allowed, required):
+        if not isinstance(entry, dict):
+            fail(f"항목은 객체여야 합니다: {entry}")
+        unknown = set(entry) - allowed
+        if unknown:
+            fail(f"알 수 없는 항목 {sorted(unknown)}: {entry}")
+        missing = required - set(entry)
+        if missing:
+            fail(f"필수 항목 {sorted(missing)}이(가) 없습니다: {entry}")
+
+    check_keys(spec, LAYOUT_KEYS, {"page", "template", "dpi", "fields"})
+    template = spec["template"]
+    try:
+        mtime_ns = os.stat(template).st_mtime_ns
+    except OSError:
+        fail(f"템플릿 PDF를 찾을 수 없습니다: {template}")
+    dpi = integer(spec, "dpi", minimum=1)
+    default_font_size = integer(spec, "font_size", 42, minimum=1)
+
+    # 좌표가 템플릿 페이지 안에 있는지 확인하기 위해 페이지 크기를 픽셀로 환산
+    box = PdfReader(BytesIO(read_template_bytes(template, mtime_ns))).pages[0].cropbox
+    page_width = float(box.width) * dpi / 72
+    page_height = float(box.height) * dpi / 72
+
+    def position(entry):
+        x = integer(entry, "x", minimum=0) + integer(entry, "dx", 0)
+        y = integer(entry, "y", minimum=0) + integer(entry, "dy", 0)
+        if not (0 <= x < page_width and 0 <= y < page_height):
+            fail(f"좌표가 페이지 밖에 있습니다: {entry}")
+        return x, y
+
+    texts = []
+    for entry in spec["fields"]:
+        check_keys(entry, FIELD_KEYS, {"key", "x", "y"})
+        x, y = position(entry)
+        font_size = integer(entry, "font_size", default_font_size, minimum=1)
+        wrap = integer(entry, "wrap", 0, minimum=0)
+        texts.append((entry["key"], x, y, font_size, wrap))
+
+    signatures = []
+    for entry in spec.get("signatures", []):
+        check_keys(entry, SIGNATURE_KEYS, {"key", "x", "y", "width", "height"})
+        x, y = position(entry)
+        size = (integer(entry, "width", minimum=1), integer(entry, "height", minimum=1))
+        signatures.append((entry["key"], x, y, size))
+
+    return {
+        "page": integer(spec, "page", minimum=1),
+        "template": template,
+        "dpi": dpi,
+        "size": (page_width, page_height),
+        "texts": tuple(texts),
+        "signatures": tuple(signatures),
+    }
+
+# 배치 정의 폴더의 JSON 파일을 모두 컴파일하여 페이지 순서대로 반환하는 함수 (프로세스 전역 캐시)
+@lru_cache(maxsize=4)
+def build_form_layouts(layout_dir, mtimes):
+    plans = []
+    for name, _ in mtimes:
+        path = os.path.join(layout_dir, name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"서식 배치 파일 오류 ({path}): JSON 형식이 올바르지 않습니다. {e}")
+        plans.append(compile_layout(spec, path))
+    plans.sort(key=lambda plan: plan["page"])
+    if [plan["page"] for plan in plans] != list(range(1, len(plans) + 1)):
+        raise ValueError(f"서식 배치 파일 오류 ({layout_dir}): 'page' 번호는 1부터 중복 없이 이어져야 합니다.")
+    return tuple(plans)
+
+# 캐시된 서식 그리기 계획을 반환하는 함수
+def load_form_layouts(layout_dir=LAYOUT_DIR):
+    # 배치 파일이 추가·변경되면 수정시각 목록이 달라지므로 다시 컴파일됨
+    mtimes = tuple(sorted(
+        (entry.name, entry.stat().st_mtime_ns)
+        for entry in os.scandir(layout_dir) if entry.name.endswith('.json')
+    ))
+    return build_form_layouts(layout_dir, mtimes)
+
+# 글꼴 파일을 크기별로 한 번만 읽어 두는 함수 (프로세스 전역 캐시)
+@lru_cache(maxsize=None)
+def load_font(font_path, size):
+    metrics.increment("cache_misses", cache="font")
+    with metrics.span("font_load"):
+        return ImageFont.truetype(font_path, size)
+
+# 한 줄 문자열의 높이를 측정하는 함수 (주소 줄바꿈 간격 계산용 캐시)
+@lru_cache(maxsize=4096)
+def measure_line_height(font_path, size, line):
+    _, top, _, bottom = load_font(font_path, size).getbbox(line)
+    return bottom - top
+
+# 서명 크기 조정 필터 (Pillow의 RGBA 기본값과 같은 BICUBIC)
+SIGNATURE_RESAMPLE = Image.Resampling.BICUBIC
+
+# 그리기 계획에 따라 각 필드를 그릴 위치·문자열·글꼴 목록을 계산하는 함수 (래스터·벡터 엔진 공통)
+# keys를 주면 해당 필드만 계산 (수정된 필드만 다시 그릴 때 사용)
+def layout_texts(plan, data_map, keys=None):
+    ops = []
+    for key, x, y, font_size, wrap in plan["texts"]:
+        if keys is not None and key not in keys:
+            continue
+        text = data_map.get(key, "")
+        if not text:
+            continue
+        font = load_font(FONT_PATH, font_size)
+        if wrap:
+            for line in textwrap.wrap(text, width=wrap):
+                ops.append((x, y, line, font))
+                y += measure_line_height(FONT_PATH, font_size, line)
+        else:
+            ops.append((x, y, text, font))
+    return ops
+
+# 글자 외곽에 안티앨리어싱으로 번지는 픽셀까지 포함하기 위한 여유(px)
+TEXT_REGION_MARGIN = 2
+
+# 그리기 항목 하나가 페이지에서 차지하는 영역 (left, top, right, bottom)을 계산하는 함수
+def text_region(x, y, text, font):
+    left, top, right, bottom = font.getbbox(text)
+    margin = TEXT_REGION_MARGIN
+    return (x + left - margin, y + top - margin, x + right + margin, y + bottom + margin)
+
+def regions_overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+# 캔버스 배열에서 서명이 차지하는 비율을 계산하는 함수
+def calculate_signature_coverage(image_data):
+    import numpy as np
+    drawn_pixels = np.count_nonzero(image_data[:, :, 3])
+    return drawn_pixels / (image_data.shape[0] * image_data.shape[1])
+
+# 캔버스 배열을 PNG 인코딩 없이 서명 이미지로 변환하는 함수 (이미 uint8이면 복사하지 않음)
+def signature_from_canvas(image_data):
+    import numpy as np
+    return Image.fromarray(np.asarray(image_data, dtype=np.uint8))
+
+# 획 좌표 저장 단위 (1/10 px, int16로 저장)
+STROKE_SCALE = 10
+# 2차 베지어 곡선 한 구간을 직선으로 나누는 수
+STROKE_CURVE_STEPS = 4
+# 획을 그릴 때의 초과 표본 배율 (가장자리를 부드럽게 한 뒤 서명 칸 크기로 줄임)
+STROKE_SUPERSAMPLE = 4
+
+
+class SignatureStrokes:
+    """캔버스의 획 데이터(json_data)를 좌표 배열로 보관하는 서명입니다.
+
+    캔버스 전체 RGBA 배열 대신 획마다 int16 좌표 배열만 두므로 수 KB 안에 들어가고,
+    render()로 서명 칸 크기에 맞춰 한 번만 그리므로 비트맵을 늘리거나 줄일 때처럼 흐려지지 않습니다.
+    그리기 모드(freedraw)의 path는 캔버스 좌표를 그대로 쓰므로 객체의 이동·확대 변환은 적용하지 않습니다.
+    """
+
+    mode = "strokes"
+
+    def __init__(self, width, height, strokes, stroke_width=5, color=(0, 0, 0)):
+        self.width = width
+        self.height = height
+        self.strokes = tuple(strokes)
+        self.stroke_width = stroke_width
+        self.color = tuple(color)
+
+    # st_canvas의 json_data에서 획을 읽어 만드는 함수 (Q 곡선은 짧은 직선으로 나눔)
+    @classmethod
+    def from_canvas_json(cls, json_data, width, height):
+        strokes = []
+        stroke_width = 5
+        color = (0, 0, 0)
+        limit = 32767 // STROKE_SCALE
+        for obj in (json_data or {}).get("objects", []):
+            if obj.get("type") != "path":
+                continue
+            stroke_width = obj.get("strokeWidth") or stroke_width
+            if obj.get("stroke"):
+                color = ImageColor.getrgb(obj["stroke"])[:3]
+            points = array('h')
+            last = None
+            for command in obj.get("path", []):
+                op, values = command[0], command[1:]
+                if op in ("M", "L") and len(values) >= 2:
+                    segment = [(values[0], values[1])]
+                elif op == "Q" and len(values) >= 4 and last is not None:
+                    (x0, y0), (cx, cy), (x1, y1) = last, values[0:2], values[2:4]
+                    segment = [((1 - t) ** 2 * x0 + 2 * (1 - t) * t * cx + t * t * x1,
+                                (1 - t) ** 2 * y0 + 2 * (1 - t) * t * cy + t * t * y1)
+                               for t in (step / STROKE_CURVE_STEPS for step in range(1, STROKE_CURVE_STEPS + 1))]
+                else:
+                    continue
+                for x, y in segment:
+                    points.extend((round(max(-limit, min(limit, x)) * STROKE_SCALE),
+                                   round(max(-limit, min(limit, y)) * STROKE_SCALE)))
+                last = segment[-1]
+            if points:
+                strokes.append(points)
+        return cls(width, height, strokes, stroke_width, color)
+
+    # 획 좌표를 캔버스 크기의 흑백 마스크로 그려 서명이 차지하는 비율을 계산 (캔버스 RGBA 배열 없이 같은 기준으로 검사)
+    def coverage(self):
+        histogram = self._mask((self.width, self.height), 1).histogram()
+        return 1 - histogram[0] / (self.width * self.height)
+
+    # 서명 칸 크기(size)에 맞춰 투명 배경의 RGBA 이미지로 그리는 함수
+    def render(self, size):
+        sign = Image.new('RGBA', size, self.color + (0,))
+        sign.putalpha(self._mask(size, STROKE_SUPERSAMPLE).resize(size, Image.Resampling.BOX))
+        return sign
+
+    def _mask(self, size, factor):
+        # size×factor 크기에 획을 그린 흑백 마스크 (factor배로 그려 줄이면 가장자리가 부드러워짐)
+        scale_x = size[0] * factor / (self.width * STROKE_SCALE)
+        scale_y = size[1] * factor / (self.height * STROKE_SCALE)
+        line_width = max(1, round(self.stroke_width * (scale_x + scale_y) / 2 * STROKE_SCALE))
+        radius = line_width / 2
+        mask = Image.new('L', (size[0] * factor, size[1] * factor), 0)
+        draw = ImageDraw.Draw(mask)
+        for points in self.strokes:
+            xy = [(points[i] * scale_x, points[i + 1] * scale_y) for i in range(0, len(points), 2)]
+            if len(xy) > 1:
+                draw.line(xy, fill=255, width=line_width, joint='curve')
+            # 획의 양 끝을 둥글게 (점 하나만 찍은 경우에도 보이도록)
+            for x, y in (xy[0], xy[-1]):
+                draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=255)
+        return mask
+
+    # 지문 계산용 바이트 (캔버스 크기·굵기·색상·좌표)
+    def tobytes(self):
+        header = array('h', (self.width, self.height, round(self.stroke_width * STROKE_SCALE)) + self.color)
+        return header.tobytes() + b''.join(len(points).to_bytes(4, 'little') + points.tobytes() for points in self.strokes)
+
+    # 보관 용량 계산용 바이트 수
+    def nbytes(self):
+        return sum(len(points) * points.itemsize for points in self.strokes)
+
+# 세션·보관소 용량 계산에 쓰는 서명 하나의 바이트 수 (비트맵이면 픽셀 수×채널 수)
+def signature_nbytes(sign):
+    if isinstance(sign, SignatureStrokes):
+        return sign.nbytes()
+    return sign.width * sign.height * len(sign.getbands())
+
+# 그리기 계획에 따라 서명 이미지를 붙일 위치 목록을 계산하는 함수
+# 획 데이터 서명은 서명 칸 크기로 바로 그리고, 비트맵 서명은 크기를 조정
+def layout_signatures(plan, signatures, resized):
+    slots = []
+    for key, x, y, size in plan["signatures"]:
+        if key not in signatures:
+            continue
+        # 같은 서명·크기는 여러 페이지에서 한 번만 그리거나 크기 조정
+        if (key, size) not in resized:
+            sign = signatures[key]
+            if isinstance(sign, SignatureStrokes):
+                resized[key, size] = sign.render(size)
+            else:
+                resized[key, size] = sign.convert('RGBA').resize(size, SIGNATURE_RESAMPLE)
+        slots.append((x, y, resized[key, size]))
+    return slots
+
+# 래스터화한 템플릿 위에 필드와 서명을 그린 페이지 이미지 목록을 만드는 함수
+def compose_pages(data_map, signatures):
+    with metrics.span("compose_pages"):
+        pages = []
+        resized = {}
+        for plan in load_form_layouts():
+            page = load_template_page(plan["template"], dpi=plan["dpi"])
+            draw = ImageDraw.Draw(page)
+            for x, y, text, font in layout_texts(plan, data_map):
+                draw.text((x, y), text, font=font, fill='black')
+            for x, y, sign in layout_signatures(plan, signatures, resized):
+                page.paste(sign, (x, y), sign)
+            page = page.convert('RGB')
+            page.info['dpi'] = (plan["dpi"], plan["dpi"])
+            pages.append(page)
+        return pages
+
+
+# 이미지 PDF 출력 프로필 (위에서부터 화질이 높은 순서, 목표 크기를 맞출 때 이 순서로 시도)
+# dpi: 저장 해상도, mode: 색상 방식(RGB·L 그레이·1 흑백), codec: jpeg·flate(무손실)·ccitt(흑백 G4)
+OUTPUT_PROFILES = {
+    "color": {"dpi": 200, "mode": "RGB", "codec": "jpeg", "quality": 70},
+    "gray-lossless": {"dpi": 200, "mode": "L", "codec": "flate"},
+    "gray": {"dpi": 200, "mode": "L", "codec": "jpeg", "quality": 70},
+    "gray-150": {"dpi": 150, "mode": "L", "codec": "jpeg", "quality": 60},
+    "mono": {"dpi": 200, "mode": "1", "codec": "ccitt"},
+}
+DEFAULT_OUTPUT_PROFILE = "color"
+# 흑백 변환 시 이 값보다 밝은 픽셀은 흰색으로 처리
+MONO_THRESHOLD = 160
+MONO_TABLE = [0] * (MONO_THRESHOLD + 1) + [255] * (255 - MONO_THRESHOLD)
+
+# 페이지 이미지를 프로필의 해상도와 색상 방식으로 변환하는 함수
+def convert_page(page, settings):
+    source_dpi = page.info.get('dpi', (settings["dpi"],))[0]
+    # 채널 수를 먼저 줄인 뒤 크기를 조정
+    page = page.convert('RGB' if settings["mode"] == "RGB" else 'L')
+    if source_dpi != settings["dpi"]:
+        size = (round(page.width * settings["dpi"] / source_dpi), round(page.height * settings["dpi"] / source_dpi))
+        page = page.resize(size, Image.Resampling.BICUBIC)
+    if settings["mode"] == "1":
+        return page.point(MONO_TABLE, '1')
+    return page
+
+_a85_lock = threading.Lock()
+_a85_users = 0
+_a85_saved = None
+
+# reportlab PDF를 만드는 동안만 ASCII85 감싸기를 끄는 컨텍스트 관리자
+# 기본값인 ASCII85는 압축된 스트림을 약 25% 키우지만, rl_config는 프로세스 전역 설정이므로
+# 이 모듈이 쓰는 동안만 바꾸고 마지막 사용자가 끝나면 원래 값으로 되돌림 (여러 스레드가 겹쳐 써도 안전)
+@contextmanager
+def binary_pdf_streams():
+    global _a85_users, _a85_saved
+    from reportlab import rl_config
+    with _a85_lock:
+        if _a85_users == 0:
+            _a85_saved = rl_config.useA85
+            rl_config.useA85 = 0
+        _a85_users += 1
+    try:
+        yield
+    finally:
+        with _a85_lock:
+            _a85_users -= 1
+            if _a85_users == 0:
+                rl_config.useA85 = _a85_saved
+
+# 페이지 이미지 목록을 무손실(Flate) 압축 이미지 PDF로 저장하는 함수 (Pillow의 PDF 저장은 Flate를 지원하지 않음)
+def encode_flate(images, dpi):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.utils import ImageReader
+    buffer = BytesIO()
+    with binary_pdf_streams():
+        pdf = canvas.Canvas(buffer)
+        for image in images:
+            size = (image.width * 72 / dpi, image.height * 72 / dpi)
+            pdf.setPageSize(size)
+            pdf.drawImage(ImageReader(image), 0, 0, width=size[0], height=size[1])
+            pdf.showPage()
+        pdf.save()
+    return buffer.getvalue()
+
+# 페이지 이미지 목록을 지정한 프로필로 이미지 PDF로 저장하는 함수
+def encode_with_profile(pages, profile):
+    with metrics.span("pdf_encode"):
+        settings = OUTPUT_PROFILES[profile]
+        images = [convert_page(page, settings) for page in pages]
+        if settings["codec"] == "flate":
+            return encode_flate(images, settings["dpi"])
+        # mode '1' 이미지는 Pillow가 CCITT G4로, RGB·L 이미지는 JPEG로 저장
+        options = {"quality": settings["quality"]} if settings["codec"] == "jpeg" else {}
+        buffer = BytesIO()
+        images[0].save(buffer, format='PDF', resolution=settings["dpi"], save_all=True, append_images=images[1:], **options)
+        return buffer.getvalue()
+
+# 페이지 이미지 목록을 이미지 PDF로 저장하는 함수
+# target_bytes를 주면 지정한 프로필부터 화질 순서대로 시도하여 목표 크기 이하가 되는 첫 결과를 사용하고,
+# 모두 넘으면 가장 작은 결과를 사용
+def encode_pages(pages, profile=DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+    if not target_bytes:
+        return encode_with_profile(pages, profile)
+    names = list(OUTPUT_PROFILES)
+    smallest = None
+    for name in names[names.index(profile):]:
+        pdf_bytes = encode_with_profile(pages, name)
+        if len(pdf_bytes) <= target_bytes:
+            return pdf_bytes
+        if smallest is None or len(pdf_bytes) < len(smallest):
+            smallest = pdf_bytes
+    return smallest
+
+# 템플릿을 래스터화한 이미지 위에 필드와 서명을 그려 이미지 PDF로 저장하는 함수
+def render_raster_pdf(data_map, signatures, profile=DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+    return encode_pages(compose_pages(data_map, signatures), profile, target_bytes)
+
+# 템플릿 PDF 원본 바이트를 읽는 함수 (프로세스 전역 캐시)
+@lru_cache(maxsize=8)
+def read_template_bytes(pdf_path, mtime_ns):
+    with open(pdf_path, 'rb') as f:
+        return f.read()
+
+# 벡터 렌더링에 쓸 TrueType 글꼴을 한 번만 등록하는 함수
+def register_vector_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    if VECTOR_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(VECTOR_FONT_NAME, FONT_PATH))
+    return VECTOR_FONT_NAME
+
+# 원본 벡터 PDF 페이지를 writer에 추가하고 그 위에 필드와 서명을 담은 오버레이 페이지를 합성하는 함수
+# (pypdf는 writer에 속하지 않은 페이지의 내용 교체를 지원하지 않으므로 먼저 추가한 뒤 합성)
+def overlay_template_page(writer, template_path, dpi, ops, slots):
+    from pypdf import PdfReader
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.utils import ImageReader
+    template_bytes = read_template_bytes(template_path, os.stat(template_path).st_mtime_ns)
+    page = writer.add_page(PdfReader(BytesIO(template_bytes)).pages[0])
+    box = page.cropbox
+    left, top = float(box.left), float(box.top)
+    scale = 72 / dpi  # 템플릿 픽셀 좌표 → PDF 포인트
+
+    font_name = register_vector_font()
+    overlay_buffer = BytesIO()
+    # 서명 이미지 스트림도 ASCII85 없이 이진으로 저장
+    with binary_pdf_streams():
+        overlay = canvas.Canvas(overlay_buffer, pagesize=(float(page.mediabox.right), float(page.mediabox.top)))
+        for x, y, text, font in ops:
+            # ImageDraw는 글자 윗선(ascender) 기준, PDF는 기준선(baseline) 기준으로 그림
+            ascent, _ = font.getmetrics()
+            overlay.setFont(font_name, font.size * scale)
+            overlay.drawString(left + x * scale, top - (y + ascent) * scale, text)
+        for x, y, sign in slots:
+            overlay.drawImage(ImageReader(sign), left + x * scale, top - (y + sign.height) * scale,
+                              width=sign.width * scale, height=sign.height * scale, mask='auto')
+        overlay.save()
+
+    page.merge_page(PdfReader(overlay_buffer).pages[0])
+    return page
+
+# 원본 벡터 PDF에 필드와 서명을 오버레이하여 저장하는 함수 (출력 프로필은 이미지 PDF에만 적용)
+def render_vector_pdf(data_map, signatures, profile=None, target_bytes=None):
+    from pypdf import PdfWriter
+    with metrics.span("vector_render"):
+        writer = PdfWriter()
+        resized = {}
+        for plan in load_form_layouts():
+            ops = layout_texts(plan, data_map)
+            slots = layout_signatures(plan, signatures, resized)
+            overlay_template_page(writer, plan["template"], plan["dpi"], ops, slots)
+        # 합성 과정에서 풀린 내용 스트림을 다시 압축
+        for page in writer.pages:
+            page.compress_content_streams()
+        writer.compress_identical_objects()
+        buffer = BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+RENDER_ENGINES = {
+    "raster": render_raster_pdf,
+    "vector": render_vector_pdf,
+}
+
+# 입력값으로 서식에 채울 필드 값을 만드는 함수 (날짜는 date 객체 또는 YYYY-MM-DD 문자열)
+def build_field_map(student_name, parent_name, school_name, student_school, relationship,
+                    student_birth_date, parent_phone, move_date, address, next_grade, today=None):
+    def format_date(value):
+        if isinstance(value, str):
+            value = datetime.strptime(value.strip(), "%Y-%m-%d")
+        return value.strftime(DATE_FORMAT)
+
+    return {
+        "{{student_name}}": student_name,
+        "{{parent_name}}": parent_name,
+        "{{date.today}}": format_date(today or date.today()),
+        "{{school_name}}": school_name,
+        "{{student_school}}": student_school,
+        "{{relationship}}": relationship,
+        "{{student_birth_date}}": format_date(student_birth_date),
+        "{{parent_phone}}": parent_phone,
+        "{{move_date}}": format_date(move_date),
+        "{{address}}": address,
+        "{{next_grade}}": next_grade,
+    }
+
+# 서식 배치·템플릿·글꼴 파일 내용으로 서식 버전(해시)을 만드는 함수 (파일 수정시각별 프로세스 전역 캐시)
+@lru_cache(maxsize=4)
+def build_template_version(files):
+    digest = hashlib.sha256()
+    for path, _ in files:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+# 현재 서식 버전을 반환하는 함수 (배치·템플릿·글꼴 중 하나라도 바뀌면 값이 달라짐)
+def template_version(layout_dir=LAYOUT_DIR):
+    paths = sorted(entry.path for entry in os.scandir(layout_dir) if entry.name.endswith('.json'))
+    paths += [plan["template"] for plan in load_form_layouts(layout_dir)] + [FONT_PATH]
+    return build_template_version(tuple((path, os.stat(path).st_mtime_ns) for path in paths))
+
+# 같은 PDF가 나오는 제출을 구분하는 지문(해시)을 만드는 함수
+# 필드 값, 서명 픽셀, 서식 버전, 출력 설정이 모두 같으면 같은 값이므로 다시 생성·발송하지 않는 데 사용
+def submission_fingerprint(data_map, signatures, engine="raster", profile=DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+    digest = hashlib.sha256(template_version().encode('ascii'))
+    settings = [engine, profile, target_bytes or 0, sorted((key, str(value)) for key, value in data_map.items())]
+    digest.update(json.dumps(settings, ensure_ascii=False).encode('utf-8'))
+    for key in sorted(signatures):
+        sign = signatures[key]
+        digest.update(f"{key}:{sign.mode}:{sign.width}x{sign.height}".encode('utf-8'))
+        digest.update(sign.tobytes())
+    return digest.hexdigest()
+
+# 선택한 엔진으로 PDF를 생성하는 함수 (알 수 없는 엔진이면 래스터 방식 사용)
+def render_pdf(data_map, signatures, engine="raster", profile=DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+    return RENDER_ENGINES.get(engine, render_raster_pdf)(data_map, signatures, profile, target_bytes)
+
+PREVIEW_WIDTH = 800
+
+# 미리보기용 축소 배율 (페이지 너비가 미리보기 너비의 몇 배인지, 정수)
+def preview_factor(page_width, width=PREVIEW_WIDTH):
+    return max(1, int(page_width) // width)
+
+def encode_preview(image):
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
+
+# 합성한 페이지 이미지를 정수 배율로 축소하여 미리보기용 JPEG 바이트 목록으로 만드는 함수
+def make_previews(pages, width=PREVIEW_WIDTH):
+    with metrics.span("preview"):
+        return tuple(encode_preview(page.reduce(preview_factor(page.width, width))) for page in pages)
+
+# 미리보기 해상도로 래스터화한 템플릿에 필드와 서명을 줄여 그린 미리보기 JPEG 바이트 목록을 만드는 함수
+# 벡터 엔진은 원래 해상도의 페이지가 필요 없으므로 make_previews와 같은 크기의 미리보기를 이 방식으로 만듦
+def compose_previews(data_map, signatures, width=PREVIEW_WIDTH):
+    with metrics.span("preview"):
+        previews = []
+        resized = {}
+        for plan in load_form_layouts():
+            factor = preview_factor(plan["size"][0], width)
+            page = load_template_page(plan["template"], dpi=plan["dpi"] / factor)
+            draw = ImageDraw.Draw(page)
+            for x, y, text, font in layout_texts(plan, data_map):
+                small_font = load_font(FONT_PATH, max(1, round(font.size / factor)))
+                draw.text((x / factor, y / factor), text, font=small_font, fill='black')
+            for x, y, sign in layout_signatures(plan, signatures, resized):
+                small = sign.reduce(factor)
+                page.paste(small, (round(x / factor), round(y / factor)), small)
+            previews.append(encode_preview(page.convert('RGB')))
+        return tuple(previews)
+
+
+class ComposedForm:
+    """입력값과 서명, 페이지마다 글자·서명이 그려진 영역의 픽셀만 보관하여 수정된 필드가 차지하는 영역만 다시 그립니다.
+
+    페이지 이미지는 캐시한 템플릿에 보관한 영역을 붙여 필요할 때만 만들고 보관하지 않으므로,
+    한 서식이 차지하는 메모리는 전체 페이지(약 23MB)가 아니라 그려진 영역과 미리보기 크기 정도입니다.
+    바뀐 필드의 이전·새 글자 영역을 템플릿에서 복원한 뒤 그 영역에 걸친 글자와 서명만 다시 그리므로
+    결과는 처음부터 다시 합성한 페이지와 같고, 바뀐 필드가 없는 페이지는 미리보기도 다시 만들지 않습니다.
+    """
+
+    def __init__(self, data_map, signatures):
+        self.data_map = dict(data_map)
+        self.signatures = signatures
+        # 크기를 맞춘 서명 이미지 ((key, size) → RGBA 이미지), 수정할 때마다 다시 그리지 않도록 보관
+        self.resized = {}
+        pages = compose_pages(self.data_map, signatures)
+        self.patches = [self._cut(plan, page, self.data_map) for plan, page in zip(load_form_layouts(), pages)]
+        self.previews = list(make_previews(pages))
+        # 방금 합성한 페이지는 다음 render_pdf()까지만 두어 템플릿에서 다시 만들지 않음
+        self._composed = pages
+
+    # 현재 입력값으로 합성한 페이지 이미지 목록을 만드는 함수
+    @property
+    def pages(self):
+        return [composed or self._page(plan, patches)
+                for plan, patches, composed in zip(load_form_layouts(), self.patches, self._composed)]
+
+    # 새 입력값을 반영하고 다시 그린 페이지 번호(0부터) 목록을 반환
+    def update(self, data_map):
+        data_map = dict(data_map)
+        changed = {key for key in self.data_map.keys() | data_map.keys() if self.data_map.get(key) != data_map.get(key)}
+        dirty = []
+        pages = []
+        if changed:
+            with metrics.span("partial_compose"):
+                for index, plan in enumerate(load_form_layouts()):
+                    regions = [text_region(*op) for op in layout_texts(plan, self.data_map, changed) + layout_texts(plan, data_map, changed)]
+                    if regions:
+                        page = self._page(plan, self.patches[index])
+                        self._redraw(page, plan, data_map, regions)
+                        self.patches[index] = self._cut(plan, page, data_map)
+                        self._composed[index] = page
+                        dirty.append(index)
+                        pages.append(page)
+        self.data_map = data_map
+        if dirty:
+            for index, preview in zip(dirty, make_previews(pages)):
+                self.previews[index] = preview
+        return dirty
+
+    # 글자와 서명이 차지하는 영역 목록 (글자 → 서명 순서, 그리는 순서와 같음)
+    def _items(self, plan, data_map):
+        ops = layout_texts(plan, data_map)
+        slots = layout_signatures(plan, self.signatures, self.resized)
+        boxes = [text_region(*op) for op in ops] + [(x, y, x + sign.width, y + sign.height) for x, y, sign in slots]
+        return ops, slots, boxes
+
+    # 합성한 페이지에서 글자·서명 영역만 잘라 보관할 조각 목록을 만드는 함수
+    def _cut(self, plan, page, data_map):
+        patches = []
+        for left, top, right, bottom in self._items(plan, data_map)[2]:
+            box = (max(0, left), max(0, top), min(page.width, right), min(page.height, bottom))
+            if box[0] < box[2] and box[1] < box[3]:
+                patches.append((box[:2], page.crop(box)))
+        return patches
+
+    # 템플릿에 보관한 조각을 붙여 페이지 이미지를 만드는 함수 (조각 밖은 템플릿과 같음)
+    def _page(self, plan, patches):
+        page = load_template_page(plan["template"], dpi=plan["dpi"]).convert('RGB')
+        for position, patch in patches:
+            page.paste(patch, position)
+        page.info['dpi'] = (plan["dpi"], plan["dpi"])
+        return page
+
+    def _redraw(self, page, plan, data_map, regions):
+        ops, slots, boxes = self._items(plan, data_map)
+        # 다시 그리는 항목은 영역 전체를 복원해야 겹쳐 그려지지 않으므로, 겹치는 항목이 더 없을 때까지 영역을 넓힘
+        selected = set()
+        while True:
+            touched = [i for i, box in enumerate(boxes)
+                       if i not in selected and any(regions_overlap(box, region) for region in regions)]
+            if not touched:
+                break
+            selected.update(touched)
+            regions += [boxes[i] for i in touched]
+
+        template = load_template_page(plan["template"], dpi=plan["dpi"])
+        for left, top, right, bottom in regions:
+            box = (max(0, left), max(0, top), min(page.width, right), min(page.height, bottom))
+            if box[0] < box[2] and box[1] < box[3]:
+                page.paste(template.crop(box).convert('RGB'), box[:2])
+        # 처음 합성할 때와 같은 순서(글자 → 서명)로 다시 그림
+        draw = ImageDraw.Draw(page)
+        for i, (x, y, text, font) in enumerate(ops):
+            if i in selected:
+                draw.text((x, y), text, font=font, fill='black')
+        for i, (x, y, sign) in enumerate(slots, start=len(ops)):
+            if i in selected:
+                page.paste(sign, (x, y), sign)
+
+    # 현재 입력값으로 PDF를 만드는 함수 (벡터 엔진은 원본 PDF에 다시 오버레이)
+    def render_pdf(self, engine="raster", profile=DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+        if engine == "vector":
+            return render_vector_pdf(self.data_map, self.signatures)
+        pages = self.pages
+        self._composed = [None] * len(pages)
+        return encode_pages(pages, profile, target_bytes)
+
+
+# PDF와 미리보기 이미지를 함께 생성하는 함수
+# 래스터 엔진은 합성한 페이지를 PDF와 미리보기에 함께 쓰고, 벡터 엔진은 미리보기만 작은 해상도로 따로 그림
+def render_with_previews(data_map, signatures, engine="raster", profile=DEFAULT_OUTPUT_PROFILE, target_bytes=None):
+    if engine == "vector":
+        return render_vector_pdf(data_map, signatures), compose_previews(data_map, signatures)
+    pages = compose_pages(data_map, signatures)
+    return encode_pages(pages, profile, target_bytes), make_previews(pages)
+
+# 제출 파일 이름을 만드는 함수
+def make_filename(school_name, next_grade):
+    return f"전입예정확인서_{school_name}_{next_grade}.pdf"
+
+# 서식 배치를 미리 컴파일하고 사용하는 글꼴을 불러오는 함수 (배치 오류는 ValueError, 글꼴 누락은 OSError)
+# templates=True이면 템플릿 페이지 래스터화 캐시도 미리 채움 (시작 직후 예열용)
+def preload(templates=False):
+    for plan in load_form_layouts():
+        for _, _, _, font_size, _ in plan["texts"]:
+            load_font(FONT_PATH, font_size)
+        if templates:
+            load_template_page(plan["template"], dpi=plan["dpi"])
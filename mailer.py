@@ -0,0 +1,431 @@
+import argparse
+import csv
+import io
+import os
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+import sys
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+from email import encoders
+from email.header import Header
+from email.utils import formataddr
+import metrics
+
+# 학년을 영어 형식으로 변환하는 함수
+def grade_to_english(grade):
+    number = re.search(r'\d+', grade)
+    if number:
+        return f"{number.group()}gr"
+    return grade
+
+# 첨부 파일 이름을 영어로 만드는 함수 (메일 프로그램에서 한글 파일 이름이 깨지지 않도록)
+def english_attachment_name(filename):
+    parts = filename.split('_')
+    if len(parts) >= 3:
+        grade = parts[2].replace('.pdf', '')
+        english_grade = grade_to_english(grade)
+        return f"Confirmation.of.Scheduled.Residence.Transfer_{english_grade}.pdf"
+    return "Confirmation.of.Scheduled.Residence.Transfer.pdf"
+
+# 제출용 이메일 메시지를 만드는 함수
+def build_pdf_email(pdf_data, filename, recipient_email, mail_from):
+    email_filename = english_attachment_name(filename)
+
+    msg = MIMEMultipart()
+    msg['From'] = formataddr((str(Header("전입예정확인서 시스템", 'utf-8')), mail_from))
+    msg['To'] = recipient_email
+    msg['Subject'] = f"전입예정확인서({filename})"
+
+    body = f"안녕하세요.\n\n{filename}가 제출되었습니다.\nPDF 파일을 저장 후 이상이 없는지 확인해 주세요.\n보다 편리한 관리를 위해 파일명 변경을 권장드립니다.\n아울러, 철저한 개인정보 관리 부탁드립니다.\n\n감사합니다."
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+    part = MIMEBase('application', 'pdf')
+    part.set_payload(pdf_data)
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', f'attachment; filename="{email_filename}"', filename=('utf-8', '', email_filename))
+    part.add_header('Content-Type', f'application/pdf; name="{email_filename}"')
+    msg.attach(part)
+    return msg
+
+# 모아 둔 제출 건들을 ZIP 하나로 묶은 이메일 메시지를 만드는 함수
+# items는 (파일 이름, PDF 바이트, 제출 시각) 목록이며, ZIP 안의 manifest.csv에 번호별 원래 파일 이름과 제출 시각을 적음
+# 여러 학교가 같은 주소를 쓰는 경우가 있으므로 제목에 학교 이름을 넣음
+def build_digest_email(items, recipient_email, mail_from, school=None):
+    stamp = datetime.now().strftime('%Y%m%d-%H%M')
+    zip_filename = f"Confirmation.of.Scheduled.Residence.Transfer_{stamp}_{len(items)}.zip"
+
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(["번호", "파일명", "제출시각"])
+    archive = io.BytesIO()
+    # PDF는 이미 압축되어 있으므로 다시 압축하지 않고 그대로 담음
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+        for number, (filename, pdf_data, created) in enumerate(items, start=1):
+            submitted = datetime.fromtimestamp(created).strftime('%Y-%m-%d %H:%M')
+            zip_file.writestr(f"{number:03d}_{english_attachment_name(filename)}", pdf_data)
+            writer.writerow([f"{number:03d}", filename, submitted])
+        # 엑셀에서 한글이 깨지지 않도록 BOM을 붙여 저장
+        zip_file.writestr("manifest.csv", manifest.getvalue().encode('utf-8-sig'))
+
+    msg = MIMEMultipart()
+    msg['From'] = formataddr((str(Header("전입예정확인서 시스템", 'utf-8')), mail_from))
+    msg['To'] = recipient_email
+    msg['Subject'] = f"전입예정확인서 {school + ' ' if school else ''}{len(items)}건 묶음 제출"
+
+    listing = "\n".join(f"{number:03d}. {filename}" for number, (filename, _, _) in enumerate(items, start=1))
+    body = f"안녕하세요.\n\n전입예정확인서 {len(items)}건이 제출되었습니다.\n\n{listing}\n\n첨부한 ZIP 파일의 번호별 원래 파일명은 manifest.csv에서 확인하실 수 있습니다.\nPDF 파일을 저장 후 이상이 없는지 확인해 주세요.\n아울러, 철저한 개인정보 관리 부탁드립니다.\n\n감사합니다."
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+    part = MIMEBase('application', 'zip')
+    part.set_payload(archive.getvalue())
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', f'attachment; filename="{zip_filename}"', filename=('utf-8', '', zip_filename))
+    part.add_header('Content-Type', f'application/zip; name="{zip_filename}"')
+    msg.attach(part)
+    return msg
+
+
+class SubmissionQueue:
+    """SQLite 대기열에 쌓인 제출 메일을 작업자 스레드가 유지 중인 SMTP 연결로 발송합니다.
+
+    작업은 발송이 끝날 때까지 파일에 남아 있으므로 프로세스가 재시작되어도 유실되지 않습니다.
+    발송 중 멈춘 작업은 임대 시간(lease)이 지나면 다시 발송 대상이 됩니다.
+    묶음 발송 학교의 제출 건은 digest_items에 모아 두었다가, 수신자·학교별로 건수·대기 시간·용량 기준 중 하나에 이르면
+    한 통의 메일로 묶어 jobs에 넣습니다. 여러 학교가 같은 주소를 써도 학교마다 따로 묶고 각 학교의 기준을 따릅니다. 묶기와 삭제는 한 트랜잭션에서 처리하므로 중간에 멈춰도 유실되거나 두 번 발송되지 않습니다.
+    dedup_window초 안에 같은 지문(fingerprint)의 제출이 같은 수신자에게 다시 들어오면 대기열에 넣지 않습니다.
+    끝내 발송하지 못한 작업은 메시지(첨부)를 지우고 수신자·오류만 failed_retention초 동안 남기므로
+    운영자가 failed_jobs() 또는 `python mailer.py`로 확인하여 학교에 알릴 수 있습니다.
+    """
+
+    def __init__(self, db_path, smtp_server, smtp_port, mail_from, mail_password,
+                 workers=2, starttls=True, max_attempts=5, backoff_base=5.0,
+                 backoff_max=300.0, lease_seconds=120.0, idle_timeout=60.0,
+                 poll_interval=5.0, digest_max_bytes=10 * 1024 * 1024, dedup_window=0.0,
+                 failed_retention=30 * 24 * 3600.0):
+        self.db_path = db_path
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.mail_from = mail_from
+        self.mail_password = mail_password
+        self.workers = workers
+        self.starttls = starttls
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        # 묶음 메일 첨부 용량 한도 (메일 서버의 메시지 크기 제한을 넘지 않도록)
+        self.digest_max_bytes = digest_max_bytes
+        # 중복 제출을 막는 기간(초), 0이면 사용 안 함
+        self.dedup_window = dedup_window
+        # 발송 실패 기록(수신자·오류)을 남겨 두는 기간(초)
+        self.failed_retention = failed_retention
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        with self._transaction() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    recipient TEXT NOT NULL,
+                    message BLOB NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    lease_until REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_attempt)")
+            # 이전 버전에서 실패 처리하며 남긴 첨부도 지움
+            db.execute("UPDATE jobs SET message = X'' WHERE status = 'failed' AND LENGTH(message) > 0")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS digest_items (
+                    id TEXT PRIMARY KEY,
+                    recipient TEXT NOT NULL,
+                    school TEXT NOT NULL DEFAULT '',
+                    filename TEXT NOT NULL,
+                    pdf BLOB NOT NULL,
+                    max_count INTEGER NOT NULL,
+                    deadline REAL NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            # 학교 열이 없던 이전 버전의 파일은 열을 추가 (남아 있던 건은 학교 ''로 따로 묶임)
+            if "school" not in [row[1] for row in db.execute("PRAGMA table_info(digest_items)")]:
+                db.execute("ALTER TABLE digest_items ADD COLUMN school TEXT NOT NULL DEFAULT ''")
+            db.execute("DROP INDEX IF EXISTS digest_items_recipient")
+            db.execute("CREATE INDEX IF NOT EXISTS digest_items_school ON digest_items (recipient, school, created)")
+            # 최근에 대기열에 넣은 제출의 지문 (job_id는 jobs 또는 digest_items의 ID)
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS deliveries (
+                    fingerprint TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    job_id TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (fingerprint, recipient)
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS deliveries_job ON deliveries (job_id)")
+
+    @contextmanager
+    def _transaction(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    # 발송할 메일을 대기열에 넣고 작업 ID를 반환 (같은 지문의 제출을 이미 받았으면 None)
+    def enqueue(self, recipient, message, fingerprint=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as db:
+            if self._is_duplicate(db, fingerprint, recipient, job_id, now):
+                return None
+            db.execute(
+                "INSERT INTO jobs (id, recipient, message, status, next_attempt, created) VALUES (?, ?, ?, 'pending', ?, ?)",
+                (job_id, recipient, message, now, now),
+            )
+        self._wakeup.set()
+        return job_id
+
+    # 묶음 발송할 제출 건을 모아 두고 ID를 반환 (같은 지문의 제출을 이미 받았으면 None)
+    # 같은 수신자·학교의 건이 max_count건 모이거나 첫 건을 받은 뒤 max_age_seconds초가 지나면 작업자가 한 통으로 묶어 발송
+    def enqueue_digest(self, recipient, school, filename, pdf_bytes, max_count, max_age_seconds, fingerprint=None):
+        item_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as db:
+            if self._is_duplicate(db, fingerprint, recipient, item_id, now):
+                return None
+            db.execute(
+                "INSERT INTO digest_items (id, recipient, school, filename, pdf, max_count, deadline, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (item_id, recipient, school, filename, pdf_bytes, max_count, now + max_age_seconds, now),
+            )
+        self._wakeup.set()
+        return item_id
+
+    # 아직 발송되지 않은 작업 수 (실패 처리된 작업 제외)
+    def pending(self):
+        with self._transaction() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status != 'failed'").fetchone()[0]
+
+    # 발송에 실패한 작업의 (ID, 수신자, 시도 횟수, 마지막 오류, 접수 시각) 목록 (운영자 확인용)
+    def failed_jobs(self):
+        with self._transaction() as db:
+            return db.execute(
+                "SELECT id, recipient, attempts, last_error, created FROM jobs WHERE status = 'failed' ORDER BY created"
+            ).fetchall()
+
+    # 운영자가 확인한 실패 기록을 지우고 지운 수를 반환 (job_ids를 주지 않으면 모두)
+    def clear_failed(self, job_ids=None):
+        with self._transaction() as db:
+            if job_ids is None:
+                return db.execute("DELETE FROM jobs WHERE status = 'failed'").rowcount
+            return sum(db.execute("DELETE FROM jobs WHERE status = 'failed' AND id = ?", (job_id,)).rowcount
+                       for job_id in job_ids)
+
+    # 묶음 발송을 기다리며 모아 둔 제출 건 수
+    def buffered(self):
+        with self._transaction() as db:
+            return db.execute("SELECT COUNT(*) FROM digest_items").fetchone()[0]
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"smtp-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _is_duplicate(self, db, fingerprint, recipient, job_id, now):
+        # 기간이 지난 지문은 지우고, 남아 있으면 중복으로 보며, 없으면 이번 제출의 지문을 기록
+        if not fingerprint or self.dedup_window <= 0:
+            return False
+        db.execute("DELETE FROM deliveries WHERE created < ?", (now - self.dedup_window,))
+        if db.execute("SELECT 1 FROM deliveries WHERE fingerprint = ? AND recipient = ?",
+                      (fingerprint, recipient)).fetchone():
+            metrics.increment("deliveries", outcome="duplicate")
+            return True
+        db.execute("INSERT INTO deliveries (fingerprint, recipient, job_id, created) VALUES (?, ?, ?, ?)",
+                   (fingerprint, recipient, job_id, now))
+        return False
+
+    def _flush_digests(self):
+        # 기준에 이른 수신자·학교별 제출 건을 메일 한 통으로 묶어 jobs에 넣고 모아 둔 건은 삭제
+        now = time.time()
+        flushed = 0
+        with self._transaction() as db:
+            ready = db.execute(
+                "SELECT recipient, school FROM digest_items GROUP BY recipient, school "
+                "HAVING COUNT(*) >= MIN(max_count) OR MIN(deadline) <= ? OR SUM(LENGTH(pdf)) >= ?",
+                (now, self.digest_max_bytes),
+            ).fetchall()
+            for recipient, school in ready:
+                rows = db.execute(
+                    "SELECT id, filename, pdf, created FROM digest_items WHERE recipient = ? AND school = ? ORDER BY created",
+                    (recipient, school),
+                ).fetchall()
+                # 용량 한도 안에서 먼저 들어온 건부터 담고, 남은 건은 다음 묶음으로 넘김 (한 건은 항상 담음)
+                batch = []
+                size = 0
+                for row in rows:
+                    if batch and size + len(row[2]) > self.digest_max_bytes:
+                        break
+                    batch.append(row)
+                    size += len(row[2])
+                message = build_digest_email([(filename, pdf, created) for _, filename, pdf, created in batch],
+                                             recipient, self.mail_from, school).as_bytes()
+                job_id = uuid.uuid4().hex
+                db.execute(
+                    "INSERT INTO jobs (id, recipient, message, status, next_attempt, created) VALUES (?, ?, ?, 'pending', ?, ?)",
+                    (job_id, recipient, message, now, now),
+                )
+                db.executemany("DELETE FROM digest_items WHERE id = ?", [(row[0],) for row in batch])
+                db.executemany("UPDATE deliveries SET job_id = ? WHERE job_id = ?", [(job_id, row[0]) for row in batch])
+                metrics.increment("digests", outcome="flushed")
+                metrics.increment("digest_items", amount=len(batch))
+                flushed += 1
+        return flushed
+
+    def _claim(self):
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT id, recipient, message, attempts FROM jobs "
+                "WHERE (status = 'pending' AND next_attempt <= ?) OR (status = 'sending' AND lease_until < ?) "
+                "ORDER BY created LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'sending', lease_until = ? WHERE id = ?",
+                           (now + self.lease_seconds, row[0]))
+        return row
+
+    def _complete(self, job_id):
+        # 개인정보가 담긴 첨부를 남기지 않도록 발송된 작업은 바로 삭제
+        with self._transaction() as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def _retry_or_fail(self, job_id, attempts, error, permanent=False):
+        attempts += 1
+        with self._transaction() as db:
+            if permanent or attempts >= self.max_attempts:
+                # 개인정보가 담긴 첨부는 지우고 운영자 확인용 수신자·오류만 남김
+                db.execute("UPDATE jobs SET status = 'failed', attempts = ?, last_error = ?, message = X'' WHERE id = ?",
+                           (attempts, str(error), job_id))
+                db.execute("DELETE FROM jobs WHERE status = 'failed' AND created < ?", (time.time() - self.failed_retention,))
+                # 발송하지 못한 제출은 다시 제출할 수 있도록 지문을 지움
+                db.execute("DELETE FROM deliveries WHERE job_id = ?", (job_id,))
+                outcome = "failed"
+            else:
+                delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+                db.execute("UPDATE jobs SET status = 'pending', attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                           (attempts, time.time() + delay, str(error), job_id))
+                outcome = "retry"
+        metrics.increment("deliveries", outcome=outcome)
+
+    def _connect(self):
+        with metrics.span("smtp_connect"):
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+            if self.starttls:
+                server.starttls()
+            if self.mail_password:
+                server.login(self.mail_from, self.mail_password)
+            return server
+
+    def _run(self):
+        server = None
+        last_used = 0.0
+        while not self._stopping.is_set():
+            try:
+                self._flush_digests()
+            except Exception:
+                # 묶기에 실패해도 모아 둔 건은 그대로 남으므로 다음 차례에 다시 시도
+                metrics.increment("digests", outcome="error")
+            job = self._claim()
+            if job is None:
+                # 오래 쉬는 연결은 서버가 끊기 전에 정리
+                if server is not None and time.monotonic() - last_used > self.idle_timeout:
+                    _close_quietly(server)
+                    server = None
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, recipient, message, attempts = job
+            try:
+                if server is None:
+                    server = self._connect()
+                try:
+                    with metrics.span("smtp_send"):
+                        server.sendmail(self.mail_from, [recipient], message)
+                except smtplib.SMTPServerDisconnected:
+                    server = self._connect()
+                    with metrics.span("smtp_send"):
+                        server.sendmail(self.mail_from, [recipient], message)
+                last_used = time.monotonic()
+                self._complete(job_id)
+                metrics.increment("deliveries", outcome="sent")
+            except smtplib.SMTPRecipientsRefused as e:
+                last_used = time.monotonic()
+                self._retry_or_fail(job_id, attempts, e, permanent=True)
+            except Exception as e:
+                if server is not None:
+                    _close_quietly(server)
+                    server = None
+                self._retry_or_fail(job_id, attempts, e)
+
+        if server is not None:
+            _close_quietly(server)
+
+
+def _close_quietly(server):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="제출 대기열에서 발송에 실패한 작업을 확인합니다.")
+    parser.add_argument("outbox", nargs="?", default=os.getenv("OUTBOX_PATH", "outbox.sqlite3"), help="대기열 SQLite 파일 경로")
+    parser.add_argument("--clear", action="store_true", help="출력한 실패 기록을 지움")
+    args = parser.parse_args(argv)
+
+    queue = SubmissionQueue(args.outbox, None, None, None, None)
+    failed = queue.failed_jobs()
+    for job_id, recipient, attempts, last_error, created in failed:
+        submitted = datetime.fromtimestamp(created).strftime('%Y-%m-%d %H:%M')
+        print(f"[실패] {submitted} {recipient} ({attempts}회 시도, 작업 {job_id}): {last_error}")
+    print(f"발송 실패: {len(failed)}건, 대기 중: {queue.pending()}건, 묶음 대기: {queue.buffered()}건")
+    if args.clear and failed:
+        print(f"실패 기록 {queue.clear_failed([row[0] for row in failed])}건을 지웠습니다.")
+    # 실패 건이 있으면 1을 반환하여 주기 점검(cron 등)에서 알림을 보낼 수 있게 함
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 처리 단계별 소요 시간·카운터 수집 모듈
+# METRICS_ENABLED=0이면 span()은 공용 빈 객체를 돌려주고 increment()는 바로 반환하므로 비용이 거의 없습니다.
+# SUBMISSION_LOG_PATH를 지정하면 제출 건마다 단계별 소요 시간을 JSON 한 줄로 기록합니다.
+# 이 기록에는 LOG_ATTRIBUTES에 있는 항목(엔진·프로필·크기 등)만 남기며 입력값(이름·주소 등)은 남기지 않습니다.
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+SUBMISSION_LOG_PATH = os.getenv("SUBMISSION_LOG_PATH")
+NAMESPACE = "transfer"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 제출 기록에 남길 수 있는 항목 (개인정보가 아닌 설정값·숫자만)
+LOG_ATTRIBUTES = {"engine", "profile", "pdf_bytes", "pages", "cache_hit"}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_local = threading.local()
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+# 처리 단계의 소요 시간을 재는 컨텍스트 관리자를 반환하는 함수
+def span(name):
+    if not ENABLED:
+        return _NOOP_SPAN
+    return _Span(name)
+
+# 단계별 소요 시간(초)을 히스토그램과 현재 제출 기록에 반영하는 함수
+def observe(name, seconds):
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = [0, 0.0, [0] * len(BUCKETS)]
+        histogram[0] += 1
+        histogram[1] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[2][i] += 1
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace[name] = trace.get(name, 0.0) + seconds
+
+# 카운터를 증가시키는 함수 (labels는 캐시 이름·결과 등 개인정보가 아닌 값만 사용)
+def increment(name, amount=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    counts = getattr(_local, "counts", None)
+    if counts is not None:
+        counts[key] = counts.get(key, 0) + amount
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# 수집한 값을 Prometheus 텍스트 형식으로 반환하는 함수
+def render_prometheus():
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((name, (count, total, list(buckets))) for name, (count, total, buckets) in _histograms.items())
+    declared = set()
+    for (name, labels), value in counters:
+        metric = f"{NAMESPACE}_{name}_total"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} counter")
+            declared.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    if histograms:
+        metric = f"{NAMESPACE}_span_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for name, (count, total, buckets) in histograms:
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{metric}_bucket{{span="{name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{span="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+# Prometheus 텍스트를 파일에 원자적으로 기록하는 함수 (node_exporter textfile 수집기용)
+def write_prometheus_file(path):
+    if not ENABLED:
+        return
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(temp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# /metrics 경로로 Prometheus 텍스트를 제공하는 HTTP 서버를 백그라운드에서 시작하는 함수
+def start_http_server(port, host="0.0.0.0"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+# 작업자 프로세스에서 단계별 소요 시간과 카운터 증가분 수집을 시작하는 함수 (프로세스 안의 값은 밖에서 볼 수 없으므로)
+def begin_trace():
+    _local.trace = {} if ENABLED else None
+    _local.counts = {} if ENABLED else None
+
+# 수집한 {"spans": 단계별 소요 시간(초), "counters": 카운터별 증가분}을 반환하고 수집을 끝내는 함수
+def end_trace():
+    trace = getattr(_local, "trace", None)
+    counts = getattr(_local, "counts", None)
+    _local.trace = None
+    _local.counts = None
+    return {"spans": trace or {}, "counters": counts or {}}
+
+# 작업자 프로세스에서 받은 소요 시간과 카운터 증가분을 이 프로세스의 히스토그램·카운터와 현재 제출 기록에 반영하는 함수
+def record_trace(trace):
+    for name, seconds in trace.get("spans", {}).items():
+        observe(name, seconds)
+    for (name, labels), amount in trace.get("counters", {}).items():
+        increment(name, amount, **dict(labels))
+
+# 현재 스레드에서 제출 한 건의 단계별 소요 시간 기록을 시작하는 함수
+def begin_submission():
+    _local.trace = {} if ENABLED and SUBMISSION_LOG_PATH else None
+
+# 제출 한 건의 기록을 마치고 JSON 한 줄로 남기는 함수 (LOG_ATTRIBUTES 밖의 항목은 버림)
+def end_submission(outcome, **attributes):
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    if trace is None:
+        return
+    record = {
+        "id": uuid.uuid4().hex,
+        "ts": round(time.time(), 3),
+        "outcome": outcome,
+        "spans_ms": {name: round(seconds * 1000, 3) for name, seconds in trace.items()},
+    }
+    for key, value in attributes.items():
+        if key in LOG_ATTRIBUTES and (value is None or isinstance(value, (bool, int, float, str))):
+            record[key] = value
+    line = json.dumps(record, ensure_ascii=False)
+    with _lock:
+        with open(SUBMISSION_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
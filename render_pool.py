@@ -0,0 +1,207 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import form_renderer
+import metrics
+
+# 3단계 PDF 생성을 Streamlit 스크립트 스레드 밖의 작업자 프로세스에서 처리하는 모듈
+# 세션에는 작업 ID만 두고, 다음 재실행 때 poll()로 진행 상태나 완성된 결과를 가져갑니다.
+# 작업자 프로세스는 최근에 합성한 서식을 보관하므로, 같은 서식(form_id)의 수정 작업은 같은 작업자에게 보내
+# 바뀐 필드의 영역만 다시 그립니다.
+
+# 작업자 프로세스마다 보관하는 합성 서식 수 (0이면 보관하지 않고 매번 처음부터 합성)
+# 서식 하나는 그려진 영역 조각·서명·미리보기만 보관하므로 약 1MB(전체 페이지 이미지는 약 23MB)이고, 작업자 수를 곱해 메모리를 잡으면 됨
+# 작업자 프로세스도 같은 환경 변수를 물려받으므로 앱 설정과 함께 바꿀 수 있음
+FORMS_PER_WORKER = int(os.getenv("RENDER_FORMS_PER_WORKER", "16"))
+# 서식별 담당 작업자를 기억해 두는 최대 개수
+FORM_SLOT_LIMIT = 4096
+
+# 작업자 프로세스에 보관 중인 합성 서식 (form_id → ComposedForm, 오래 쓰지 않은 것부터 버림)
+_forms = OrderedDict()
+# 작업자 프로세스 시작 시 글꼴 준비가 끝났는지 여부와, 그때 수집한 소요 시간·카운터 (첫 작업 결과에 합쳐 전달)
+_ready = False
+_startup_trace = None
+
+# 작업자 프로세스에서 글꼴(templates=True면 템플릿도)을 미리 읽는 함수 (실패하면 원인을 담은 RuntimeError)
+def prepare_worker(templates=False):
+    global _ready
+    try:
+        form_renderer.preload(templates)
+    except Exception as error:
+        raise RuntimeError(f"PDF 작업자 준비 실패 (글꼴 {form_renderer.FONT_PATH}): {type(error).__name__}: {error}") from error
+    _ready = True
+
+# 작업자 프로세스 시작 시 실행하는 함수
+# 여기서 예외가 나면 실행기 전체가 BrokenProcessPool이 되어 원인을 알 수 없으므로 실패를 넘기고,
+# 작업을 받을 때 다시 준비하여 원인을 작업 결과(예외)로 알림
+def init_worker():
+    global _startup_trace
+    metrics.begin_trace()
+    try:
+        prepare_worker()
+    except RuntimeError:
+        pass
+    finally:
+        _startup_trace = metrics.end_trace()
+
+# 작업자를 미리 준비하고 그 과정의 소요 시간·카운터를 반환하는 함수 (RenderPool.warm_up용)
+def warm_worker():
+    metrics.begin_trace()
+    try:
+        prepare_worker(True)
+    finally:
+        trace = metrics.end_trace()
+    return trace
+
+# 작업자 프로세스에서 PDF와 미리보기를 만들고 단계별 소요 시간·카운터 증가분을 함께 반환하는 함수
+# 보관 중인 서식이 있으면 바뀐 필드만 다시 그리고, 없으면(처음 생성·작업자 재시작) 처음부터 합성
+# 벡터 엔진은 매번 원본 PDF에 오버레이하므로 합성 페이지를 만들거나 보관하지 않음
+def render_job(form_id, data_map, signatures, engine, profile, target_bytes):
+    global _startup_trace
+    metrics.begin_trace()
+    try:
+        if _startup_trace is not None:
+            metrics.record_trace(_startup_trace)
+            _startup_trace = None
+        if not _ready:
+            prepare_worker()
+        if engine == "vector":
+            pdf_bytes, previews = form_renderer.render_with_previews(data_map, signatures, engine, profile, target_bytes)
+        else:
+            form = _forms.pop(form_id, None)
+            if form is None:
+                form = form_renderer.ComposedForm(data_map, signatures)
+            else:
+                form.update(data_map)
+            _forms[form_id] = form
+            while len(_forms) > FORMS_PER_WORKER:
+                _forms.popitem(last=False)
+            pdf_bytes = form.render_pdf(engine, profile, target_bytes)
+            previews = tuple(form.previews)
+    finally:
+        trace = metrics.end_trace()
+    return pdf_bytes, previews, trace
+
+
+class RenderPool:
+    """PDF 생성 작업을 정해진 수의 작업자 프로세스에서 처리하고, 대기 작업 수를 제한합니다.
+
+    작업자마다 프로세스 하나짜리 실행기를 두어, 같은 서식의 수정 작업이 그 서식을 보관한 작업자에게 가도록 합니다.
+    처리 중이거나 대기 중인 작업이 max_pending개에 이르면 submit()이 None을 반환하므로
+    화면에서는 잠시 후 다시 시도하도록 안내하면 됩니다.
+    찾아가지 않은 결과는 result_ttl초가 지나면 버립니다.
+    """
+
+    def __init__(self, workers=2, max_pending=None, result_ttl=300.0):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._form_slots = OrderedDict()
+        # 최근 작업 소요 시간의 이동 평균 (진행률 추정용)
+        self._average_seconds = None
+        self._executors = [self._start_executor() for _ in range(workers)]
+
+    def _start_executor(self):
+        # Streamlit 서버는 여러 스레드를 쓰므로 fork 대신 spawn으로 작업자를 띄움
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        )
+
+    def _restart(self, slot):
+        # 비정상 종료된 작업자를 새로 띄움 (보관 중이던 서식은 처음부터 합성)
+        self._executors[slot].shutdown(wait=False, cancel_futures=True)
+        self._executors[slot] = self._start_executor()
+
+    # 작업을 넣고 작업 ID를 반환 (대기 작업이 한도에 이르면 None)
+    # form_id를 주면 같은 서식의 수정 작업으로 보고 이전 작업과 같은 작업자에게 보냄 (없으면 작업 ID를 서식 ID로 사용)
+    def submit(self, data_map, signatures, engine, profile, target_bytes, form_id=None):
+        with self._lock:
+            self._prune()
+            if sum(1 for future, _, _ in self._jobs.values() if not future.done()) >= self.max_pending:
+                metrics.increment("render_jobs", outcome="rejected")
+                return None
+            job_id = uuid.uuid4().hex
+            form_id = form_id or job_id
+            slot = self._form_slots.get(form_id)
+            if slot is None:
+                slot = min(range(self.workers), key=self._load)
+            args = (render_job, form_id, data_map, signatures, engine, profile, target_bytes)
+            try:
+                future = self._executors[slot].submit(*args)
+            except BrokenProcessPool:
+                # 작업자 프로세스가 비정상 종료되었으면 새로 띄워 다시 시도
+                self._restart(slot)
+                future = self._executors[slot].submit(*args)
+            self._jobs[job_id] = (future, time.monotonic(), slot)
+            self._form_slots[form_id] = slot
+            self._form_slots.move_to_end(form_id)
+            while len(self._form_slots) > FORM_SLOT_LIMIT:
+                self._form_slots.popitem(last=False)
+        metrics.increment("render_jobs", outcome="submitted")
+        return job_id
+
+    # 작업 상태를 (상태, 값)으로 반환
+    # ("queued", 앞에 있는 작업 수), ("running", 예상 진행률 0~1), ("done", (PDF 바이트, 미리보기 목록, 단계별 소요 시간)),
+    # ("failed", 예외), ("missing", None) 중 하나이며 done·failed는 한 번만 반환
+    def poll(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return "missing", None
+            future, submitted, slot = job
+            if future.done():
+                del self._jobs[job_id]
+                elapsed = time.monotonic() - submitted
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool):
+                    # 작업 중 작업자가 비정상 종료됨 (메모리 부족 등): 작업자는 다음 submit()에서 새로 띄움
+                    error = RuntimeError("PDF 작업자 프로세스가 비정상 종료되었습니다. 잠시 후 다시 제출해 주세요.")
+                if error is not None:
+                    metrics.increment("render_jobs", outcome="failed")
+                    return "failed", error
+                self._average_seconds = elapsed if self._average_seconds is None else 0.8 * self._average_seconds + 0.2 * elapsed
+                metrics.increment("render_jobs", outcome="done")
+                metrics.observe("render_wait", elapsed)
+                return "done", future.result()
+            ahead = sum(1 for other, other_submitted, other_slot in self._jobs.values()
+                        if other_slot == slot and other_submitted < submitted and not other.done())
+            if ahead:
+                return "queued", ahead
+            expected = self._average_seconds or 2.0
+            return "running", min(0.95, (time.monotonic() - submitted) / expected)
+
+    # 작업자 프로세스를 미리 띄우고 각 작업자의 템플릿 캐시를 채움 (시작 직후 예열용, 준비 실패 시 RuntimeError)
+    def warm_up(self):
+        futures = [executor.submit(warm_worker) for executor in self._executors]
+        for future in futures:
+            metrics.record_trace(future.result())
+
+    # 세션 초기화 등으로 더 이상 필요 없는 작업을 취소 (이미 실행 중이면 결과만 버림)
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job[0].cancel()
+
+    def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, slot):
+        return sum(1 for future, _, job_slot in self._jobs.values() if job_slot == slot and not future.done())
+
+    def _prune(self):
+        # 찾아가지 않은 완료 작업을 정리하여 결과가 쌓이지 않게 함
+        now = time.monotonic()
+        for job_id, (future, submitted, _) in list(self._jobs.items()):
+            if future.done() and now - submitted > self.result_ttl:
+                del self._jobs[job_id]
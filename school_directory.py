@@ -0,0 +1,66 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# 학교 정보 XLSX 열 이름
+REGION_COLUMN = '지역'
+SCHOOL_COLUMN = '학교'
+EMAIL_COLUMN = '이메일'
+# 선택 열: 학교별 발송 방식 ("즉시" 또는 빈칸: 제출마다 바로 발송, "묶음 [N건] [M분]": 모아서 한 번에 발송)
+DELIVERY_COLUMN = '발송방식'
+# "묶음"에 건수·시간을 적지 않았을 때의 기본값
+DIGEST_DEFAULT_COUNT = 10
+DIGEST_DEFAULT_MINUTES = 60
+DELIVERY_PATTERN = re.compile(r'^묶음(?:\s+(\d+)건)?(?:\s+(\d+)분)?$')
+
+# 발송 방식 값을 해석하는 함수 (즉시 발송이면 None, 묶음 발송이면 (최대 건수, 최대 대기 초))
+def parse_delivery_policy(value, school):
+    text = str(value).strip() if value is not None else ""
+    if text in ("", "즉시"):
+        return None
+    match = DELIVERY_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"'{school}'의 발송방식 값 '{text}'을(를) 알 수 없습니다. '즉시' 또는 '묶음 10건 60분' 형식으로 작성해주세요.")
+    count = int(match.group(1) or DIGEST_DEFAULT_COUNT)
+    minutes = int(match.group(2) or DIGEST_DEFAULT_MINUTES)
+    if count < 1 or minutes < 1:
+        raise ValueError(f"'{school}'의 발송방식 건수와 시간은 1 이상이어야 합니다.")
+    return count, minutes * 60
+
+# 학교 정보 XLSX를 읽어 지역별 학교 목록, 학교별 이메일 색인, 학교별 묶음 발송 기준을 만드는 함수
+# (pandas 대신 openpyxl 읽기 전용 모드로 행을 차례로 읽어 시작 시간과 메모리를 줄임)
+# 발송방식 값을 해석할 수 없는 학교는 경고를 남기고 즉시 발송으로 처리 (칸 하나 때문에 전체 파일을 못 읽지 않도록)
+def read_school_directory(xlsx_path):
+    from openpyxl import load_workbook
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        if not all(col in header for col in [REGION_COLUMN, SCHOOL_COLUMN, EMAIL_COLUMN]):
+            raise ValueError("XLSX 파일에 '지역', '학교', '이메일' 컬럼이 있어야 합니다. 파일 내용을 확인하고 다시 시도해주세요.")
+        columns = [header.index(col) for col in [REGION_COLUMN, SCHOOL_COLUMN, EMAIL_COLUMN]]
+        # 발송방식 열이 없는 예전 파일은 모든 학교를 즉시 발송으로 처리
+        columns.append(header.index(DELIVERY_COLUMN) if DELIVERY_COLUMN in header else len(header))
+        schools_by_region = {}
+        email_by_school = {}
+        delivery_by_school = {}
+        for row_number, values in enumerate(rows, start=2):
+            region, school, email, delivery = (values[i] if i < len(values) else None for i in columns)
+            if region is None or school is None:
+                continue
+            schools_by_region.setdefault(region, []).append(school)
+            # 같은 학교가 여러 번 나오면 첫 번째 이메일을 사용
+            if school not in email_by_school and email is not None:
+                email_by_school[school] = email
+                try:
+                    policy = parse_delivery_policy(delivery, school)
+                except ValueError as error:
+                    logger.warning("%s 파일 %d행: %s 즉시 발송으로 처리합니다.", xlsx_path, row_number, error)
+                    policy = None
+                if policy is not None:
+                    delivery_by_school[school] = policy
+    finally:
+        workbook.close()
+    schools_by_region = dict(sorted(schools_by_region.items()))
+    return schools_by_region, email_by_school, delivery_by_school
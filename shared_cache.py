@@ -0,0 +1,83 @@
+import hashlib
+import os
+import uuid
+import metrics
+
+# 여러 프로세스(앱 복제본·PDF 생성 작업자)가 함께 쓰는 파일 캐시 모듈
+# 템플릿 래스터화·샘플 미리보기처럼 입력이 같으면 결과가 같은 값을 한 프로세스가 만들면 나머지는 파일에서 읽습니다.
+# 쓰기는 임시 파일에 쓴 뒤 os.replace로 바꾸므로 동시에 같은 키를 써도 읽는 쪽은 완성된 파일만 봅니다.
+
+
+class FileCache:
+    """키별 바이트 값을 폴더에 파일로 보관하고, 전체 용량이 max_bytes를 넘으면 오래 쓰지 않은 파일부터 지웁니다.
+
+    키는 해시한 파일 이름으로 저장하므로 경로에 쓸 수 없는 문자가 있어도 됩니다.
+    읽을 때 파일 수정시각을 갱신하여 최근 사용 순서로 삼습니다.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    # 키의 값을 반환 (없거나 다른 프로세스가 막 지운 경우 None)
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.increment("shared_cache", outcome="miss")
+            return None
+        metrics.increment("shared_cache", outcome="hit")
+        return data
+
+    # 키의 값을 원자적으로 기록하고 용량 한도를 넘으면 정리
+    def put(self, key, data):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self._prune()
+
+    def _prune(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            metrics.increment("shared_cache", outcome="evicted")
+
+# 여러 바이트 값을 길이를 붙여 하나로 묶는 함수 (여러 페이지의 미리보기를 한 키에 저장할 때 사용)
+def pack_parts(parts):
+    return b''.join(len(part).to_bytes(8, 'little') + part for part in parts)
+
+# pack_parts로 묶은 값을 다시 나누는 함수
+def unpack_parts(data):
+    parts = []
+    offset = 0
+    while offset < len(data):
+        size = int.from_bytes(data[offset:offset + 8], 'little')
+        parts.append(data[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    return tuple(parts)
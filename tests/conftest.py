@@ -0,0 +1,135 @@
+import os
+import socketserver
+import sys
+import threading
+from PIL import Image
+import pytest
+
+# 저장소 최상위 모듈(form_renderer 등)을 불러올 수 있도록 경로 추가
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import form_renderer
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def repo_cwd(monkeypatch):
+    # 서식 배치·템플릿 경로가 저장소 기준 상대 경로이므로 저장소 폴더에서 실행
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def fake_poppler(monkeypatch):
+    # poppler 대신 템플릿 페이지 크기의 흰 이미지를 돌려주고 호출 기록을 남김
+    import pdf2image
+    from pypdf import PdfReader
+    calls = []
+
+    def convert_from_path(pdf_path, dpi=200):
+        calls.append((pdf_path, dpi))
+        pages = []
+        for page in PdfReader(pdf_path).pages:
+            box = page.cropbox
+            pages.append(Image.new('RGB', (round(float(box.width) * dpi / 72), round(float(box.height) * dpi / 72)), 'white'))
+        return pages
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", convert_from_path)
+    monkeypatch.setattr(form_renderer, "SHARED_CACHE_DIR", None)
+    form_renderer.get_shared_cache.cache_clear()
+    form_renderer.rasterize_template_page.cache_clear()
+    yield calls
+    form_renderer.get_shared_cache.cache_clear()
+    form_renderer.rasterize_template_page.cache_clear()
+
+
+@pytest.fixture
+def noisy_poppler(fake_poppler, monkeypatch):
+    # 흰 이미지 대신 잡음 이미지를 돌려주어 픽셀이 하나라도 어긋나면 드러나게 함
+    import pdf2image
+    convert_from_path = pdf2image.convert_from_path
+
+    def noisy_convert_from_path(pdf_path, dpi=200):
+        return [Image.effect_noise(page.size, 64).convert('RGB') for page in convert_from_path(pdf_path, dpi)]
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", noisy_convert_from_path)
+    return fake_poppler
+
+
+@pytest.fixture
+def font(monkeypatch):
+    # 배포용 글꼴(malgun.ttf)이 없는 환경에서는 reportlab에 들어 있는 글꼴로 대신 그림
+    if not os.path.exists(form_renderer.FONT_PATH):
+        import reportlab
+        monkeypatch.setattr(form_renderer, "FONT_PATH", os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf"))
+    return form_renderer.FONT_PATH
+
+
+@pytest.fixture
+def fresh_metrics(monkeypatch, tmp_path):
+    # 모듈 전역 수집값을 비우고 제출 기록 파일을 임시 폴더로 지정
+    log_path = tmp_path / "submissions.jsonl"
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "SUBMISSION_LOG_PATH", str(log_path))
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    yield log_path
+    metrics._local.trace = None
+    metrics._local.counts = None
+
+
+# 받은 메일과 연결 수를 기록하는 로컬 SMTP 대역 서버 (refused 수신자는 550으로 거부)
+class SMTPSink(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.refused = "refused@example.com"
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.wfile.write(b"220 test ESMTP\r\n")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250 test\r\n")
+            elif command == b"RCPT":
+                recipient = line.decode().split(":", 1)[1].strip().strip("<>")
+                if recipient == self.server.refused:
+                    self.wfile.write(b"550 no such user\r\n")
+                else:
+                    recipients.append(recipient)
+                    self.wfile.write(b"250 ok\r\n")
+            elif command == b"DATA":
+                self.wfile.write(b"354 end with .\r\n")
+                data = []
+                while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                    data.append(line)
+                with self.server.lock:
+                    self.server.messages.append((recipients, b"".join(data)))
+                recipients = []
+                self.wfile.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+@pytest.fixture
+def sink():
+    server = SMTPSink()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,152 @@
+import os
+import random
+import sqlite3
+import stat
+import sys
+import tracemalloc
+from datetime import date
+from PIL import Image, ImageChops
+import pytest
+import form_renderer
+from artifact_store import ArtifactStore, SqliteArtifactStore
+
+TTL = 600.0
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    # 같은 시험을 두 보관소에 모두 적용 (가짜 시계를 주입)
+    def make(max_bytes, clock):
+        if request.param == "memory":
+            return ArtifactStore(max_bytes=max_bytes, ttl_seconds=TTL, clock=clock)
+        return SqliteArtifactStore(str(tmp_path / "artifacts.sqlite3"), max_bytes=max_bytes, ttl_seconds=TTL, clock=clock)
+    make.kind = request.param
+    return make
+
+
+def test_usage_stays_within_budget_across_sessions(make_store):
+    clock = FakeClock()
+    budget = 1024 * 1024
+    store = make_store(budget, clock)
+    rng = random.Random(0)
+    handles = []
+    for number in range(2000):
+        pdf = bytes(rng.randrange(20_000, 60_000))
+        previews = [bytes(rng.randrange(5_000, 15_000)) for _ in range(2)]
+        handles.append(store.put(pdf, previews, f"form{number}.pdf"))
+        # 세션이 결과물을 다시 보거나(재실행), 제출을 끝내고 지우는 경우를 섞음
+        if rng.random() < 0.5:
+            store.get(rng.choice(handles[-20:]))
+        if rng.random() < 0.3:
+            store.discard(handles[-1])
+        clock.advance(rng.uniform(0.1, 5.0))
+        count, size = store.usage()
+        assert size <= budget
+        assert count <= budget // 30_000
+    # 오래된 핸들은 한도 또는 보관 시간 때문에 지워져 None
+    assert store.get(handles[0]) is None
+
+
+def test_memory_store_allocations_stay_flat():
+    clock = FakeClock()
+    budget = 512 * 1024
+    store = ArtifactStore(max_bytes=budget, ttl_seconds=TTL, clock=clock)
+    tracemalloc.start()
+    try:
+        for number in range(2000):
+            store.put(bytes(40_000), [bytes(10_000)], f"form{number}.pdf")
+            clock.advance(1.0)
+            if number == 500:
+                baseline = tracemalloc.get_traced_memory()[0]
+        current = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # 한도에 도달한 뒤에는 세션이 늘어도 메모리가 늘지 않음
+    assert current - baseline < 64 * 1024
+
+
+def test_expired_handle_returns_none(make_store):
+    clock = FakeClock()
+    store = make_store(1024 * 1024, clock)
+    handle = store.put(b"%PDF", [b"png"], "form.pdf", source={"grade": 1})
+    clock.advance(TTL - 1)
+    assert store.get(handle) == (b"%PDF", (b"png",), "form.pdf", {"grade": 1})
+    # 조회하면 보관 시간이 연장됨
+    clock.advance(TTL - 1)
+    assert store.get(handle) is not None
+    clock.advance(TTL)
+    assert store.get(handle) is None
+    assert store.usage() == (0, 0)
+
+
+def test_budget_evicts_least_recently_used(make_store):
+    clock = FakeClock()
+    store = make_store(1000, clock)
+    first = store.put(bytes(400), [], "first.pdf")
+    clock.advance(1)
+    second = store.put(bytes(400), [], "second.pdf")
+    clock.advance(1)
+    store.get(first)
+    clock.advance(1)
+    third = store.put(bytes(400), [], "third.pdf")
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+    assert store.usage()[0] == 2
+
+
+def test_oversized_artifact_is_rejected(make_store):
+    store = make_store(1000, FakeClock())
+    with pytest.raises(ValueError):
+        store.put(bytes(2000), [], "large.pdf")
+    assert store.get(None) is None
+    assert store.usage() == (0, 0)
+
+
+def test_sqlite_store_round_trips_source_without_pickle(tmp_path):
+    db_path = str(tmp_path / "artifacts.sqlite3")
+    store = SqliteArtifactStore(db_path)
+    bitmap = Image.effect_noise((300, 150), 64).convert('RGBA')
+    strokes = form_renderer.SignatureStrokes.from_canvas_json(
+        {"objects": [{"type": "path", "stroke": "#123456", "strokeWidth": 3, "path": [["M", 10, 10], ["Q", 50, 90, 120, 40]]}]}, 300, 150)
+    inputs = {"student_name": "한잎새", "student_birth_date": date(2017, 1, 1), "relationship": ""}
+    source = ("form-1", inputs, {"{{student_sign_path}}": bitmap, "{{parent_sign_path}}": strokes}, "fingerprint")
+    handle = store.put(b"%PDF", [b"jpeg1", b"jpeg2"], "form.pdf", source)
+
+    pdf_bytes, previews, filename, (form_id, restored, signatures, fingerprint) = store.get(handle)
+    assert (pdf_bytes, previews, filename, form_id, restored, fingerprint) == (
+        b"%PDF", (b"jpeg1", b"jpeg2"), "form.pdf", "form-1", inputs, "fingerprint")
+    restored_bitmap = signatures["{{student_sign_path}}"]
+    assert restored_bitmap.mode == 'RGBA' and ImageChops.difference(restored_bitmap, bitmap).getbbox() is None
+    assert signatures["{{parent_sign_path}}"].tobytes() == strokes.tobytes()
+
+    # 저장한 내용은 pickle이 아닌 JSON·PNG이고, 다른 값은 저장하지 않음
+    with sqlite3.connect(db_path) as db:
+        [(stored,)] = db.execute("SELECT source FROM artifact_entries").fetchall()
+    assert "한잎새" in stored and "2017-01-01" in stored
+    with pytest.raises(TypeError):
+        store.put(b"%PDF", [], "form.pdf", source={"callback": print})
+    assert store.usage()[0] == 1
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX 권한 비트")
+def test_sqlite_store_file_readable_by_owner_only(tmp_path):
+    db_path = str(tmp_path / "artifacts.sqlite3")
+    store = SqliteArtifactStore(db_path)
+    # 연결이 남아 있는 동안에는 WAL·공유 메모리 파일도 남아 있으므로 함께 확인
+    with sqlite3.connect(db_path) as db:
+        db.execute("SELECT COUNT(*) FROM artifact_entries").fetchone()
+        store.put(b"%PDF", [], "form.pdf", {"student_name": "한잎새"})
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    db.close()
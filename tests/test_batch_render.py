@@ -0,0 +1,81 @@
+import csv
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from PIL import Image
+import pytest
+import batch_render
+
+HEADER = list(batch_render.COLUMNS) + ["학생서명"]
+ROW = {
+    "학생성명": "한잎새", "학생생년월일": "2017-01-01", "현소속학교및학년": "대한초등학교 1학년",
+    "법정대리인성명": "한나무", "학생과의관계": "부", "휴대전화번호": "010-5678-5678",
+    "전입예정일": "2025-02-02", "전입예정주소": "행복택지 A-1블록 사랑아파트 101동 1001호",
+    "전학예정학교": "민국초등학교", "전학예정학년": "2학년", "학생서명": "",
+}
+
+
+@pytest.fixture
+def batch(monkeypatch, fake_poppler, font):
+    # 작업자 프로세스 대신 스레드로 실행하여 가짜 poppler·대체 글꼴을 그대로 사용
+    monkeypatch.setattr(batch_render, "ProcessPoolExecutor", ThreadPoolExecutor)
+    return batch_render
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=HEADER)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def write_xlsx(path, rows):
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append([row.get(column) for column in HEADER])
+    workbook.save(path)
+    return str(path)
+
+
+def test_csv_to_zip_reports_bad_row_number(batch, tmp_path, capsys):
+    sign_path = str(tmp_path / "sign.png")
+    Image.new('RGBA', (300, 150), (0, 0, 0, 255)).save(sign_path)
+    rows = [
+        {**ROW, "학생서명": sign_path},
+        {**ROW, "학생성명": "한새싹"},
+        {**ROW, "학생성명": "한열매", "휴대전화번호": "02-123-4567"},
+    ]
+    output = str(tmp_path / "out.zip")
+    assert batch.main([write_csv(tmp_path / "rows.csv", rows), "-o", output, "--engine", "raster", "--workers", "2"]) == 1
+    with zipfile.ZipFile(output) as archive:
+        names = sorted(archive.namelist())
+        assert all(archive.read(name).startswith(b"%PDF") for name in names)
+    assert [name[:9] for name in names] == ["00002_한잎새", "00003_한새싹"]
+    out, err = capsys.readouterr()
+    assert "[실패] 4행: '휴대전화번호'" in err
+    assert "생성 완료: 2건, 실패: 1건" in out
+
+
+def test_xlsx_with_date_cells_to_directory(batch, tmp_path):
+    rows = [
+        {**ROW, "학생생년월일": datetime(2017, 1, 1), "전입예정일": datetime(2025, 2, 2)},
+        {},
+        {**ROW, "학생성명": "한새싹", "학생생년월일": datetime(2018, 3, 4), "학생과의관계": None},
+    ]
+    output = str(tmp_path / "out")
+    assert batch.main([write_xlsx(tmp_path / "rows.xlsx", rows), "-o", output, "--engine", "raster"]) == 0
+    # 빈 행은 건너뛰고 행 번호는 명단의 실제 행 번호를 사용
+    assert sorted(name[:9] for name in os.listdir(output)) == ["00002_한잎새", "00004_한새싹"]
+
+
+def test_read_rows_keeps_row_numbers(tmp_path):
+    rows = [ROW, {**ROW, "학생성명": "한새싹"}]
+    assert [(number, row["학생성명"]) for number, row in batch_render.read_rows(write_csv(tmp_path / "rows.csv", rows))] == [
+        (2, "한잎새"), (3, "한새싹"),
+    ]
+    assert [number for number, _ in batch_render.read_rows(write_xlsx(tmp_path / "rows.xlsx", [ROW, {}, ROW]))] == [2, 4]
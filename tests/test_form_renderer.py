@@ -0,0 +1,182 @@
+import os
+import shutil
+from io import BytesIO
+from PIL import Image, ImageChops, ImageDraw
+import pytest
+import form_renderer
+
+FIELD_MAP = form_renderer.build_field_map(
+    "한잎새", "한나무", "민국초등학교", "대한초등학교 1학년", "부",
+    "2017-01-01", "010-5678-5678", "2025-02-02", "행복택지 A-1블록 사랑아파트 101동 1001호", "2학년",
+)
+
+
+def test_template_rasterized_once_across_renders(fake_poppler, tmp_path):
+    template = str(tmp_path / "consent.pdf")
+    shutil.copy("consent.pdf", template)
+
+    for _ in range(20):
+        page = form_renderer.load_template_page(template)
+        # 호출하는 쪽에서 그려도 캐시된 원본은 바뀌지 않아야 함
+        ImageDraw.Draw(page).rectangle((0, 0, 9, 9), fill='black')
+    assert len(fake_poppler) == 1
+    assert form_renderer.load_template_page(template).getpixel((0, 0)) == (255, 255, 255, 255)
+
+    # 템플릿 파일이 바뀌면(수정시각 변경) 한 번만 다시 래스터화
+    stat = os.stat(template)
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    for _ in range(5):
+        form_renderer.load_template_page(template)
+    assert len(fake_poppler) == 2
+
+
+def test_template_cache_keyed_by_dpi(fake_poppler):
+    form_renderer.load_template_page("consent.pdf", dpi=200)
+    form_renderer.load_template_page("consent.pdf", dpi=100)
+    form_renderer.load_template_page("consent.pdf", dpi=200)
+    assert fake_poppler == [("consent.pdf", 200), ("consent.pdf", 100)]
+
+
+def test_vector_previews_skip_full_resolution_raster(fake_poppler, font):
+    pdf_bytes, previews = form_renderer.render_with_previews(FIELD_MAP, {}, engine="vector")
+    assert pdf_bytes.startswith(b"%PDF")
+    # 미리보기 해상도(200 DPI의 절반)로만 래스터화
+    assert sorted(dpi for _, dpi in fake_poppler) == [100, 100]
+    raster_previews = form_renderer.make_previews(form_renderer.compose_pages(FIELD_MAP, {}))
+    for preview, raster_preview in zip(previews, raster_previews):
+        size, raster_size = Image.open(BytesIO(preview)).size, Image.open(BytesIO(raster_preview)).size
+        # 템플릿을 100 DPI로 바로 래스터화한 크기와 200 DPI를 절반으로 줄인 크기는 반올림 차이만 남
+        assert all(abs(a - b) <= 1 for a, b in zip(size, raster_size))
+
+
+@pytest.fixture
+def layout_copy(tmp_path, monkeypatch, font):
+    # 배치·템플릿 파일을 임시 폴더에 복사하여 내용을 바꿔 볼 수 있게 함
+    shutil.copytree("layouts", tmp_path / "layouts")
+    for plan in form_renderer.load_form_layouts():
+        shutil.copy(plan["template"], tmp_path / plan["template"])
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def signature(seed):
+    return Image.frombytes('RGBA', (300, 150), bytes((seed + i) % 256 for i in range(300 * 150 * 4)))
+
+
+def test_fingerprint_follows_signature_profile_and_layout(layout_copy):
+    signatures = {"{{student_sign_path}}": signature(0)}
+    fingerprint = form_renderer.submission_fingerprint(FIELD_MAP, signatures)
+    assert form_renderer.submission_fingerprint(FIELD_MAP, {"{{student_sign_path}}": signature(0)}) == fingerprint
+    assert form_renderer.submission_fingerprint(FIELD_MAP, {"{{student_sign_path}}": signature(1)}) != fingerprint
+    assert form_renderer.submission_fingerprint(FIELD_MAP, signatures, profile="gray") != fingerprint
+    assert form_renderer.submission_fingerprint(FIELD_MAP, signatures, engine="vector") != fingerprint
+    assert form_renderer.submission_fingerprint({**FIELD_MAP, "{{next_grade}}": "3학년"}, signatures) != fingerprint
+
+    # 수정시각만 바뀌고 내용이 같으면 같은 지문
+    layout = layout_copy / "layouts" / "consent.json"
+    stat = os.stat(layout)
+    os.utime(layout, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert form_renderer.submission_fingerprint(FIELD_MAP, signatures) == fingerprint
+
+    # 배치 내용을 고치면 다른 지문
+    layout.write_text(layout.read_text(encoding='utf-8').replace('"font_size": 42', '"font_size": 40'), encoding='utf-8')
+    os.utime(layout, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+    assert form_renderer.submission_fingerprint(FIELD_MAP, signatures) != fingerprint
+
+
+# 200 DPI로 합성한 페이지처럼 글자와 잡음이 있는 A4 페이지 이미지 (JPEG·Flate 크기가 프로필마다 달라지도록)
+def noisy_pages(count=2):
+    pages = []
+    for number in range(count):
+        page = Image.effect_noise((1654, 2339), 8).convert('RGB')
+        draw = ImageDraw.Draw(page)
+        for y in range(100, 2200, 60):
+            draw.text((120, y), f"page {number} line {y}" * 4, fill='black')
+        page.info['dpi'] = (200, 200)
+        pages.append(page)
+    return pages
+
+
+@pytest.mark.parametrize("profile", list(form_renderer.OUTPUT_PROFILES))
+def test_output_profile_dpi_mode_and_codec(profile):
+    from pypdf import PdfReader
+    settings = form_renderer.OUTPUT_PROFILES[profile]
+    pages = noisy_pages()
+    reader = PdfReader(BytesIO(form_renderer.encode_with_profile(pages, profile)))
+    assert len(reader.pages) == len(pages)
+    filters = {"jpeg": "/DCTDecode", "flate": "/FlateDecode", "ccitt": "/CCITTFaxDecode"}
+    for page, source in zip(reader.pages, pages):
+        # 인쇄 크기(포인트)는 원본과 같고, 이미지 픽셀 수가 프로필 해상도에 맞음
+        assert abs(float(page.mediabox.width) - source.width * 72 / 200) < 1
+        [image] = page.images
+        assert abs(image.image.width - source.width * settings["dpi"] / 200) <= 1
+        assert image.image.mode == settings["mode"]
+        # 이미지 스트림은 프로필의 압축 방식 하나로만 저장 (ASCII85 등 다른 필터 없음)
+        stream_filter = image.indirect_reference.get_object()["/Filter"]
+        assert (list(stream_filter) if isinstance(stream_filter, list) else [stream_filter]) == [filters[settings["codec"]]]
+
+
+def test_encode_flate_leaves_reportlab_settings_alone():
+    from reportlab import rl_config
+    previous = rl_config.useA85
+    rl_config.useA85 = 1
+    try:
+        pdf_bytes = form_renderer.encode_flate([noisy_pages(1)[0].convert('L')], 200)
+        assert rl_config.useA85 == 1
+    finally:
+        rl_config.useA85 = previous
+    assert b"/ASCII85Decode" not in pdf_bytes
+
+
+# (시작 프로필, 목표 크기) → (시도한 프로필, 결과 프로필)
+@pytest.mark.parametrize("profile, target, tried, chosen", [
+    ("color", None, ["color"], "color"),
+    ("color", 350, ["color", "gray-lossless", "gray"], "gray"),
+    ("gray", 350, ["gray"], "gray"),
+    ("color", 100, ["color", "gray-lossless", "gray", "gray-150", "mono"], "gray-150"),
+    ("gray-150", 100, ["gray-150", "mono"], "gray-150"),
+    ("mono", 100, ["mono"], "mono"),
+])
+def test_encode_pages_target_fallback(monkeypatch, profile, target, tried, chosen):
+    sizes = {"color": 500, "gray-lossless": 400, "gray": 300, "gray-150": 200, "mono": 250}
+    calls = []
+
+    def encode_with_profile(pages, name):
+        calls.append(name)
+        return name.encode() + bytes(sizes[name] - len(name))
+
+    monkeypatch.setattr(form_renderer, "encode_with_profile", encode_with_profile)
+    result = form_renderer.encode_pages([], profile, target)
+    assert calls == tried
+    assert result.startswith(chosen.encode()) and len(result) == sizes[chosen]
+
+
+def test_composed_form_update_matches_full_compose(noisy_poppler, font):
+    # 흰 바탕에서는 복원 영역이 어긋나도 드러나지 않으므로 잡음 템플릿 위에서 비교
+    signatures = {"{{student_sign_path}}": signature(1), "{{parent_sign_path}}": signature(2)}
+    plans = form_renderer.load_form_layouts()
+    form = form_renderer.ComposedForm(FIELD_MAP, signatures)
+    edits = [
+        {"{{address}}": "행복택지 B-2블록"},
+        {"{{address}}": "행복택지 B-2블록 우정아파트 202동 2002호 " * 3},
+        {"{{student_name}}": "한새싹"},
+        {"{{parent_name}}": "한바다"},
+        {"{{relationship}}": ""},
+        {"{{relationship}}": "모"},
+        {},
+    ]
+    for edit in edits:
+        data_map = {**FIELD_MAP, **edit}
+        changed = {key for key in FIELD_MAP if form.data_map[key] != data_map[key]}
+        dirty = form.update(data_map)
+        assert dirty == [index for index, plan in enumerate(plans) if changed & {text[0] for text in plan["texts"]}]
+        expected = form_renderer.compose_pages(data_map, signatures)
+        # 다시 그린 페이지와, PDF를 만든 뒤 보관한 조각으로 다시 만든 페이지 모두 처음부터 합성한 페이지와 같아야 함
+        redrawn = form.pages
+        assert form.render_pdf().startswith(b"%PDF")
+        for pages in (redrawn, form.pages):
+            for page, full in zip(pages, expected):
+                assert ImageChops.difference(page, full).getbbox() is None
+        assert form.previews == list(form_renderer.make_previews(expected))
+    # 같은 입력값으로 다시 요청하면 아무 페이지도 다시 그리지 않음
+    assert form.update(FIELD_MAP) == []
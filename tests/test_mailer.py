@@ -0,0 +1,184 @@
+import email
+import email.header
+import socketserver
+import sqlite3
+import time
+from mailer import SubmissionQueue, build_pdf_email
+
+MAIL_FROM = "sender@example.com"
+
+
+def make_queue(path, port, **options):
+    options = {"workers": 2, "starttls": False, "poll_interval": 0.05, **options}
+    return SubmissionQueue(str(path), "127.0.0.1", port, MAIL_FROM, None, **options)
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "시간 안에 끝나지 않았습니다."
+        time.sleep(0.01)
+
+def message(recipient, number):
+    return build_pdf_email(b"%PDF-1.4 " + str(number).encode(), f"전입예정확인서_학교{number}_1학년.pdf",
+                           recipient, MAIL_FROM).as_bytes()
+
+
+def test_jobs_delivered_once_over_pooled_connections(sink, tmp_path):
+    queue = make_queue(tmp_path / "outbox.sqlite3", sink.server_address[1])
+    queue.start()
+    try:
+        for number in range(20):
+            queue.enqueue(f"school{number}@example.com", message(f"school{number}@example.com", number))
+        wait_until(lambda: queue.pending() == 0)
+    finally:
+        queue.stop()
+    assert sorted(recipients[0] for recipients, _ in sink.messages) == sorted(f"school{n}@example.com" for n in range(20))
+    # 작업자마다 연결 하나를 유지하므로 메일마다 새로 연결하지 않음
+    assert sink.connections <= 2
+
+
+def test_queued_jobs_survive_restart(sink, tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    make_queue(path, sink.server_address[1]).enqueue("school@example.com", message("school@example.com", 1))
+    queue = make_queue(path, sink.server_address[1])
+    assert queue.pending() == 1
+    queue.start()
+    try:
+        wait_until(lambda: queue.pending() == 0)
+    finally:
+        queue.stop()
+    assert len(sink.messages) == 1
+    assert email.message_from_bytes(sink.messages[0][1])["To"] == "school@example.com"
+
+
+def test_refused_recipient_fails_without_keeping_attachment(sink, tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    queue = make_queue(path, sink.server_address[1])
+    job_id = queue.enqueue(sink.refused, message(sink.refused, 1))
+    queue.start()
+    try:
+        wait_until(lambda: queue.pending() == 0)
+    finally:
+        queue.stop()
+    [(failed_id, recipient, attempts, last_error, _)] = queue.failed_jobs()
+    assert (failed_id, recipient, attempts) == (job_id, sink.refused, 1)
+    assert "550" in last_error
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT LENGTH(message) FROM jobs WHERE id = ?", (job_id,)).fetchone() == (0,)
+    assert queue.clear_failed() == 1
+    assert queue.failed_jobs() == []
+
+
+def test_unreachable_server_retries_then_fails(tmp_path):
+    with socketserver.TCPServer(("127.0.0.1", 0), socketserver.BaseRequestHandler) as closed:
+        port = closed.server_address[1]
+    queue = make_queue(tmp_path / "outbox.sqlite3", port, workers=1, max_attempts=3, backoff_base=0.01)
+    queue.enqueue("school@example.com", message("school@example.com", 1))
+    queue.start()
+    try:
+        wait_until(lambda: queue.pending() == 0)
+    finally:
+        queue.stop()
+    [(_, _, attempts, _, _)] = queue.failed_jobs()
+    assert attempts == 3
+
+
+def test_old_failures_are_pruned(sink, tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    queue = make_queue(path, sink.server_address[1], failed_retention=60.0)
+    queue.start()
+    try:
+        old_id = queue.enqueue(sink.refused, message(sink.refused, 1))
+        wait_until(lambda: queue.pending() == 0)
+        with sqlite3.connect(path) as db:
+            db.execute("UPDATE jobs SET created = created - 120 WHERE id = ?", (old_id,))
+        new_id = queue.enqueue(sink.refused, message(sink.refused, 2))
+        wait_until(lambda: queue.pending() == 0)
+    finally:
+        queue.stop()
+    # 보관 기간이 지난 실패 기록은 새 실패를 기록할 때 지움
+    assert [row[0] for row in queue.failed_jobs()] == [new_id]
+
+
+def subject(data):
+    header = email.message_from_bytes(data)["Subject"]
+    return str(email.header.make_header(email.header.decode_header(header)))
+
+
+def test_shared_address_digests_follow_each_school_policy(sink, tmp_path):
+    queue = make_queue(tmp_path / "outbox.sqlite3", sink.server_address[1])
+    shared = "shared@example.com"
+    # 같은 주소를 쓰는 두 학교: 가는 2건마다, 나는 5건마다 묶음 발송
+    for number in range(2):
+        queue.enqueue_digest(shared, "가초등학교", f"가_{number}.pdf", b"%PDF-1.4 a", 2, 3600)
+    queue.enqueue_digest(shared, "나초등학교", "나_0.pdf", b"%PDF-1.4 b", 5, 3600)
+    queue.start()
+    try:
+        wait_until(lambda: len(sink.messages) == 1 and queue.pending() == 0)
+    finally:
+        queue.stop()
+    # 가초등학교 건만 묶여 발송되고, 나초등학교 건은 자기 기준(5건)에 이를 때까지 남음
+    assert subject(sink.messages[0][1]) == "전입예정확인서 가초등학교 2건 묶음 제출"
+    assert queue.buffered() == 1
+
+
+def test_digest_items_without_school_column_are_migrated(sink, tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    with sqlite3.connect(path) as db:
+        db.execute("""
+            CREATE TABLE digest_items (
+                id TEXT PRIMARY KEY, recipient TEXT NOT NULL, filename TEXT NOT NULL, pdf BLOB NOT NULL,
+                max_count INTEGER NOT NULL, deadline REAL NOT NULL, created REAL NOT NULL
+            )
+        """)
+        db.execute("INSERT INTO digest_items VALUES ('old', 'school@example.com', 'old.pdf', X'00', 1, 0, 0)")
+    db.close()
+    queue = make_queue(path, sink.server_address[1])
+    queue.start()
+    try:
+        wait_until(lambda: len(sink.messages) == 1 and queue.pending() == 0)
+    finally:
+        queue.stop()
+    assert queue.buffered() == 0
+    assert subject(sink.messages[0][1]) == "전입예정확인서 1건 묶음 제출"
+
+
+def test_duplicate_suppressed_only_inside_window(tmp_path):
+    queue = make_queue(tmp_path / "outbox.sqlite3", 25, dedup_window=60.0)
+    recipient = "school@example.com"
+    with queue._transaction() as db:
+        assert not queue._is_duplicate(db, "fingerprint", recipient, "job1", 1000.0)
+        assert queue._is_duplicate(db, "fingerprint", recipient, "job2", 1059.0)
+        # 다른 수신자나 다른 지문은 중복이 아님
+        assert not queue._is_duplicate(db, "fingerprint", "other@example.com", "job3", 1059.0)
+        assert not queue._is_duplicate(db, "other", recipient, "job4", 1059.0)
+        # 첫 제출로부터 기간이 지나면 다시 받음
+        assert not queue._is_duplicate(db, "fingerprint", recipient, "job5", 1061.0)
+        # 지문이 없거나 기능을 끄면 항상 받음
+        assert not queue._is_duplicate(db, None, recipient, "job6", 1061.0)
+    queue.dedup_window = 0.0
+    with queue._transaction() as db:
+        assert not queue._is_duplicate(db, "fingerprint", recipient, "job7", 1062.0)
+
+
+def test_duplicate_enqueue_returns_none(tmp_path):
+    queue = make_queue(tmp_path / "outbox.sqlite3", 25, dedup_window=60.0)
+    assert queue.enqueue("school@example.com", message("school@example.com", 1), fingerprint="a") is not None
+    assert queue.enqueue("school@example.com", message("school@example.com", 1), fingerprint="a") is None
+    assert queue.enqueue_digest("school@example.com", "가초등학교", "a.pdf", b"%PDF", 5, 3600, fingerprint="b") is not None
+    assert queue.enqueue_digest("school@example.com", "가초등학교", "a.pdf", b"%PDF", 5, 3600, fingerprint="b") is None
+    assert (queue.pending(), queue.buffered()) == (1, 1)
+
+
+def test_permanent_failure_releases_fingerprint(sink, tmp_path):
+    queue = make_queue(tmp_path / "outbox.sqlite3", sink.server_address[1], dedup_window=3600.0)
+    assert queue.enqueue(sink.refused, message(sink.refused, 1), fingerprint="a") is not None
+    queue.start()
+    try:
+        wait_until(lambda: queue.pending() == 0)
+        # 발송하지 못한 제출은 기간 안이라도 다시 제출할 수 있음
+        assert queue.enqueue(sink.refused, message(sink.refused, 1), fingerprint="a") is not None
+        wait_until(lambda: queue.pending() == 0)
+    finally:
+        queue.stop()
+    assert len(queue.failed_jobs()) == 2
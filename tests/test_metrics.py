@@ -0,0 +1,42 @@
+import json
+import metrics
+
+NAME = "홍길동"
+ADDRESS = "서울특별시 종로구 세종대로 209"
+
+
+def submit_once(**attributes):
+    metrics.begin_submission()
+    with metrics.span("compose"):
+        pass
+    metrics.observe("pdf_encode", 0.02)
+    metrics.increment("cache_lookups", cache="template")
+    metrics.end_submission("sent", **attributes)
+
+
+def test_submission_log_keeps_spans_without_personal_data(fresh_metrics):
+    submit_once(name=NAME, address=ADDRESS, student=NAME, engine="raster", pdf_bytes=1234, pages=2)
+    [line] = fresh_metrics.read_text(encoding="utf-8").splitlines()
+    record = json.loads(line)
+    assert record["outcome"] == "sent"
+    assert set(record["spans_ms"]) == {"compose", "pdf_encode"}
+    assert record["spans_ms"]["pdf_encode"] == 20.0
+    assert (record["engine"], record["pdf_bytes"], record["pages"]) == ("raster", 1234, 2)
+    assert not {"name", "address", "student"} & set(record)
+    assert NAME not in line and ADDRESS not in line
+
+
+def test_prometheus_text_has_no_submission_attributes(fresh_metrics):
+    submit_once(name=NAME, address=ADDRESS, engine="vector")
+    text = metrics.render_prometheus()
+    assert 'transfer_span_seconds_count{span="compose"} 1' in text
+    assert 'transfer_span_seconds_count{span="pdf_encode"} 1' in text
+    assert 'transfer_cache_lookups_total{cache="template"} 1' in text
+    assert NAME not in text and ADDRESS not in text
+
+
+def test_disabled_metrics_record_nothing(fresh_metrics, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    submit_once(name=NAME, address=ADDRESS)
+    assert not fresh_metrics.exists()
+    assert metrics.render_prometheus() == "\n"
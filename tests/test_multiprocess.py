@@ -0,0 +1,173 @@
+import email
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import Counter
+import form_renderer
+from artifact_store import SqliteArtifactStore
+from mailer import SubmissionQueue, build_pdf_email
+from shared_cache import FileCache
+
+MAIL_FROM = "sender@example.com"
+PROCESSES = 4
+UNIQUE_JOBS = 15
+SHARED_JOBS = 10
+DIGEST_ITEMS = 12
+DIGEST_RECIPIENT = "digest@example.com"
+CACHE_ROUNDS = 40
+CACHE_VALUE_BYTES = 256 * 1024
+
+
+# 앱 복제본 하나처럼 같은 대기열 파일에 제출하고 작업자 2개로 발송하는 함수 (spawn한 프로세스에서 실행)
+# 복제본마다 다른 제출과, 모든 복제본이 같은 지문으로 다시 넣는 제출(새로 고침·중복 클릭)을 섞음
+def run_replica(outbox_path, port, replica):
+    queue = SubmissionQueue(outbox_path, "127.0.0.1", port, MAIL_FROM, None, workers=2, starttls=False,
+                            poll_interval=0.05, dedup_window=3600.0)
+    queue.start()
+    try:
+        for number in range(UNIQUE_JOBS):
+            recipient = f"r{replica}-{number}@example.com"
+            queue.enqueue(recipient, pdf_message(recipient))
+        for number in range(SHARED_JOBS):
+            recipient = f"shared-{number}@example.com"
+            queue.enqueue(recipient, pdf_message(recipient), fingerprint=f"shared-{number}")
+        for number in range(DIGEST_ITEMS):
+            queue.enqueue_digest(DIGEST_RECIPIENT, "가초등학교", f"item{number}.pdf", b"%PDF-1.4 digest", 5, 0.5,
+                                 fingerprint=f"digest-{number}")
+        deadline = time.monotonic() + 60
+        while queue.pending() or queue.buffered():
+            if time.monotonic() > deadline:
+                raise TimeoutError("대기열이 비지 않았습니다.")
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+
+def pdf_message(recipient):
+    return build_pdf_email(b"%PDF-1.4 " + recipient.encode(), "전입예정확인서_학교_1학년.pdf", recipient, MAIL_FROM).as_bytes()
+
+def put_artifact(db_path, payload):
+    return SqliteArtifactStore(db_path).put(payload, [b"preview"], "form.pdf", source={"pid": multiprocessing.current_process().pid})
+
+def get_artifact(db_path, handle):
+    return SqliteArtifactStore(db_path).get(handle)
+
+# 모든 프로세스가 같은 키를 번갈아 덮어쓰며 읽는 함수 (읽은 값이 다른 프로세스가 쓰던 도중의 값이면 실패)
+def hammer_cache(directory, worker):
+    cache = FileCache(directory)
+    for number in range(CACHE_ROUNDS):
+        value = cache_value(worker, number)
+        cache.put("shared", value)
+        cache.put(f"own-{worker}-{number}", value)
+        data = cache.get("shared")
+        assert data is not None and len(set(data)) == 1 and len(data) - CACHE_VALUE_BYTES in range(CACHE_ROUNDS)
+
+def cache_value(worker, number):
+    return bytes([worker]) * (CACHE_VALUE_BYTES + number)
+
+# 공유 캐시에 저장된 템플릿을 읽어 픽셀 해시를 반환하는 함수 (poppler가 없는 프로세스에서 실행)
+def cached_template_digest(directory, pdf_path):
+    form_renderer.SHARED_CACHE_DIR = directory
+    page = form_renderer.load_template_page(pdf_path)
+    return page.mode, page.size, hashlib.sha256(page.tobytes()).hexdigest()
+
+
+def digest_entries(data):
+    message = email.message_from_bytes(data)
+    [attachment] = [part for part in message.walk() if part.get_content_type() == "application/zip"]
+    with zipfile.ZipFile(io.BytesIO(attachment.get_payload(decode=True))) as archive:
+        return [name for name in archive.namelist() if name != "manifest.csv"]
+
+
+def test_replicas_share_outbox_without_duplicates(sink, tmp_path):
+    outbox_path = str(tmp_path / "outbox.sqlite3")
+    # 첫 복제본이 표를 만들기 전에 여러 프로세스가 동시에 만들지 않도록 미리 생성
+    SubmissionQueue(outbox_path, "127.0.0.1", sink.server_address[1], MAIL_FROM, None)
+    context = multiprocessing.get_context("spawn")
+    replicas = [context.Process(target=run_replica, args=(outbox_path, sink.server_address[1], replica))
+                for replica in range(PROCESSES)]
+    for process in replicas:
+        process.start()
+    for process in replicas:
+        process.join(120)
+        assert process.exitcode == 0
+
+    received = Counter()
+    digest_items = []
+    for recipients, data in sink.messages:
+        if recipients == [DIGEST_RECIPIENT]:
+            digest_items += digest_entries(data)
+        else:
+            received.update(recipients)
+    expected = [f"r{replica}-{number}@example.com" for replica in range(PROCESSES) for number in range(UNIQUE_JOBS)]
+    expected += [f"shared-{number}@example.com" for number in range(SHARED_JOBS)]
+    # 모든 제출이 정확히 한 번씩 도착 (같은 작업을 두 작업자가 가져가거나, 중복 제출이 다시 발송되지 않음)
+    assert received == Counter(expected)
+    assert len(digest_items) == DIGEST_ITEMS
+    queue = SubmissionQueue(outbox_path, "127.0.0.1", sink.server_address[1], MAIL_FROM, None)
+    assert (queue.pending(), queue.buffered(), queue.failed_jobs()) == (0, 0, [])
+
+
+def test_artifact_handle_resolves_in_other_process(tmp_path):
+    db_path = str(tmp_path / "artifacts.sqlite3")
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        # 다른 프로세스에서 넣은 결과물을 이 프로세스에서 읽음
+        handle = pool.apply(put_artifact, (db_path, b"%PDF-1.4 child"))
+        pdf_bytes, previews, filename, source = SqliteArtifactStore(db_path).get(handle)
+        assert (pdf_bytes, previews, filename) == (b"%PDF-1.4 child", (b"preview",), "form.pdf")
+        assert source["pid"] != multiprocessing.current_process().pid
+        # 이 프로세스에서 넣은 결과물을 다른 프로세스에서 읽음
+        handle = SqliteArtifactStore(db_path).put(b"%PDF-1.4 parent", [], "parent.pdf")
+        assert pool.apply(get_artifact, (db_path, handle)) == (b"%PDF-1.4 parent", (), "parent.pdf", None)
+        SqliteArtifactStore(db_path).discard(handle)
+        assert pool.apply(get_artifact, (db_path, handle)) is None
+
+
+def test_file_cache_shared_between_processes(tmp_path):
+    directory = str(tmp_path / "cache")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=hammer_cache, args=(directory, worker)) for worker in range(PROCESSES)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(120)
+        assert process.exitcode == 0
+
+    # 다른 프로세스가 쓴 값을 그대로 읽고, 쓰다 남은 임시 파일이 없음
+    cache = FileCache(directory)
+    for worker in range(PROCESSES):
+        for number in range(CACHE_ROUNDS):
+            assert cache.get(f"own-{worker}-{number}") == cache_value(worker, number)
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"), max_bytes=2500)
+    # 파일 수정시각으로 최근 사용 순서를 정하므로 시각이 구분되도록 잠시 쉼
+    for key in ("first", "second"):
+        cache.put(key, key.encode() * (1000 // len(key)))
+        time.sleep(0.05)
+    assert cache.get("first") is not None
+    time.sleep(0.05)
+    cache.put("third", bytes(1000))
+    assert cache.get("second") is None
+    assert cache.get("first") is not None and cache.get("third") == bytes(1000)
+    assert sum(entry.stat().st_size for entry in os.scandir(cache.directory)) <= cache.max_bytes
+
+
+def test_cached_template_pixels_identical_in_other_process(noisy_poppler, monkeypatch, tmp_path):
+    directory = str(tmp_path / "cache")
+    pdf_path = os.path.abspath("transfer.pdf")
+    monkeypatch.setattr(form_renderer, "SHARED_CACHE_DIR", directory)
+    form_renderer.get_shared_cache.cache_clear()
+    page = form_renderer.load_template_page(pdf_path)
+    assert len(noisy_poppler) == 1
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        # 다른 프로세스에는 가짜 poppler가 없으므로 공유 캐시에서 읽어야만 성공
+        mode, size, digest = pool.apply(cached_template_digest, (directory, pdf_path))
+    assert (mode, size) == (page.mode, page.size)
+    assert digest == hashlib.sha256(page.tobytes()).hexdigest()
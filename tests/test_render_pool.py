@@ -0,0 +1,193 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+import form_renderer
+import metrics
+import render_pool
+
+FIELD_MAP = form_renderer.build_field_map(
+    "한잎새", "한나무", "민국초등학교", "대한초등학교 1학년", "부",
+    "2017-01-01", "010-5678-5678", "2025-02-02", "행복택지 A-1블록 사랑아파트 101동 1001호", "2학년",
+)
+TEMPLATE_LOOKUPS = ("cache_lookups", (("cache", "template"),))
+FONT_MISSES = ("cache_misses", (("cache", "font"),))
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    # 작업자 프로세스의 모듈 전역 상태를 이 프로세스에서 새로 시작한 것처럼 초기화
+    monkeypatch.setattr(render_pool, "_forms", OrderedDict())
+    monkeypatch.setattr(render_pool, "_ready", False)
+    monkeypatch.setattr(render_pool, "_startup_trace", None)
+    form_renderer.load_font.cache_clear()
+    yield render_pool
+    form_renderer.load_font.cache_clear()
+
+
+def test_worker_trace_carries_cache_counters(worker, fake_poppler, font, fresh_metrics, monkeypatch):
+    worker.init_worker()
+    pdf_bytes, previews, trace = worker.render_job("form", FIELD_MAP, {}, "raster", "color", None)
+    assert pdf_bytes.startswith(b"%PDF") and len(previews) == 2
+    assert trace["counters"][TEMPLATE_LOOKUPS] == 2
+    # 작업자 시작 시 글꼴을 읽은 횟수는 첫 작업 결과에 합쳐 전달
+    assert trace["counters"][FONT_MISSES] > 0
+    assert "pdf_encode" in trace["spans"]
+
+    # 앱 프로세스에서 반영하면 Prometheus 텍스트에 나타남
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    metrics.record_trace(trace)
+    text = metrics.render_prometheus()
+    assert 'transfer_cache_lookups_total{cache="template"} 2' in text
+    assert 'transfer_cache_misses_total{cache="font"}' in text
+    assert 'transfer_span_seconds_count{span="pdf_encode"} 1' in text
+
+    # 시작 시 값은 한 번만 전달
+    _, _, trace = worker.render_job("form", FIELD_MAP, {}, "raster", "color", None)
+    assert FONT_MISSES not in trace["counters"]
+
+
+def test_missing_font_fails_each_job_with_cause(worker, tmp_path, monkeypatch):
+    missing = str(tmp_path / "missing.ttf")
+    monkeypatch.setattr(form_renderer, "FONT_PATH", missing)
+    # 작업자 시작 단계에서는 예외를 내지 않아 실행기가 BrokenProcessPool이 되지 않음
+    worker.init_worker()
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="missing.ttf"):
+            worker.render_job("form", FIELD_MAP, {}, "raster", "color", None)
+    with pytest.raises(RuntimeError, match="missing.ttf"):
+        worker.warm_worker()
+    assert worker._forms == OrderedDict()
+
+
+class BrokenExecutor(ThreadPoolExecutor):
+    # 작업자 프로세스가 비정상 종료된 실행기처럼 submit()에서 BrokenProcessPool을 냄
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+
+@pytest.fixture
+def pool_factory(monkeypatch):
+    # 작업자 프로세스 대신 스레드 하나짜리 실행기를 쓰고, 작업은 gate가 열릴 때까지 멈춰 있게 함
+    gate = threading.Event()
+    executors = []
+    executors_to_start = []
+
+    def render_job(form_id, data_map, signatures, engine, profile, target_bytes):
+        gate.wait(10)
+        if "error" in data_map:
+            raise data_map["error"]
+        return b"%PDF " + form_id.encode(), (), {"spans": {}, "counters": {}}
+
+    def start_executor(self):
+        executor = executors_to_start.pop(0)() if executors_to_start else ThreadPoolExecutor(max_workers=1)
+        executors.append(executor)
+        return executor
+
+    monkeypatch.setattr(render_pool, "render_job", render_job)
+    monkeypatch.setattr(render_pool.RenderPool, "_start_executor", start_executor)
+    pools = []
+
+    def make(**options):
+        pool = render_pool.RenderPool(**options)
+        pools.append(pool)
+        return pool
+
+    make.gate = gate
+    make.executors = executors
+    make.executors_to_start = executors_to_start
+    yield make
+    gate.set()
+    for pool in pools:
+        pool.shutdown()
+
+
+def finish(pool, *job_ids):
+    for job_id in job_ids:
+        pool._jobs[job_id][0].result(10)
+
+
+def test_submit_rejects_when_pending_limit_reached(pool_factory):
+    pool = pool_factory(workers=1, max_pending=2)
+    first = pool.submit({}, {}, "raster", "color", None)
+    second = pool.submit({}, {}, "raster", "color", None)
+    assert first and second
+    assert pool.submit({}, {}, "raster", "color", None) is None
+    pool_factory.gate.set()
+    finish(pool, first, second)
+    assert pool.submit({}, {}, "raster", "color", None) is not None
+
+
+def test_poll_states_and_results_returned_once(pool_factory):
+    pool = pool_factory(workers=1, max_pending=4)
+    first = pool.submit({}, {}, "raster", "color", None, form_id="first")
+    second = pool.submit({}, {}, "raster", "color", None, form_id="second")
+    status, progress = pool.poll(first)
+    assert status == "running" and 0 <= progress <= 0.95
+    assert pool.poll(second) == ("queued", 1)
+    pool_factory.gate.set()
+    finish(pool, first, second)
+    assert pool.poll(first) == ("done", (b"%PDF first", (), {"spans": {}, "counters": {}}))
+    assert pool.poll(first) == ("missing", None)
+    assert pool.poll(second)[0] == "done"
+    assert pool.poll("unknown") == ("missing", None)
+
+
+def test_failed_job_reported_once(pool_factory):
+    pool = pool_factory(workers=1)
+    pool_factory.gate.set()
+    job_id = pool.submit({"error": ValueError("bad field")}, {}, "raster", "color", None)
+    with pytest.raises(ValueError):
+        finish(pool, job_id)
+    status, error = pool.poll(job_id)
+    assert status == "failed" and str(error) == "bad field"
+    assert pool.poll(job_id) == ("missing", None)
+
+
+def test_worker_crash_reported_as_readable_error(pool_factory):
+    pool = pool_factory(workers=1)
+    pool_factory.gate.set()
+    job_id = pool.submit({"error": BrokenProcessPool("terminated abruptly")}, {}, "raster", "color", None)
+    with pytest.raises(BrokenProcessPool):
+        finish(pool, job_id)
+    status, error = pool.poll(job_id)
+    assert status == "failed" and isinstance(error, RuntimeError) and "비정상 종료" in str(error)
+
+
+def test_broken_executor_restarted_on_submit(pool_factory):
+    pool_factory.executors_to_start.append(lambda: BrokenExecutor(max_workers=1))
+    pool = pool_factory(workers=1)
+    pool_factory.gate.set()
+    job_id = pool.submit({}, {}, "raster", "color", None)
+    finish(pool, job_id)
+    assert pool.poll(job_id)[0] == "done"
+    assert len(pool_factory.executors) == 2 and pool._executors == [pool_factory.executors[1]]
+
+
+def test_edits_of_a_form_go_to_the_same_worker(pool_factory):
+    pool = pool_factory(workers=2, max_pending=8)
+    first = pool.submit({}, {}, "raster", "color", None, form_id="a")
+    # 다른 서식은 일이 적은 작업자에게, 같은 서식의 수정 작업은 처음 작업자에게 보냄
+    other = pool.submit({}, {}, "raster", "color", None, form_id="b")
+    edit = pool.submit({}, {}, "raster", "color", None, form_id="a")
+    slots = {job_id: pool._jobs[job_id][2] for job_id in (first, other, edit)}
+    assert slots[first] != slots[other]
+    assert slots[edit] == slots[first]
+    assert pool.poll(edit) == ("queued", 1)
+
+
+def test_cancel_and_prune_drop_jobs(pool_factory):
+    pool = pool_factory(workers=1, max_pending=4, result_ttl=0.0)
+    running = pool.submit({}, {}, "raster", "color", None)
+    queued = pool.submit({}, {}, "raster", "color", None)
+    future = pool._jobs[queued][0]
+    pool.cancel(queued)
+    assert future.cancelled()
+    assert pool.poll(queued) == ("missing", None)
+    pool_factory.gate.set()
+    finish(pool, running)
+    # 찾아가지 않은 완료 결과는 result_ttl이 지나면 다음 submit()에서 버림
+    pool.submit({}, {}, "raster", "color", None)
+    assert pool.poll(running) == ("missing", None)
@@ -0,0 +1,48 @@
+import logging
+import pytest
+import school_directory
+
+
+def write_directory(path, rows):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([school_directory.REGION_COLUMN, school_directory.SCHOOL_COLUMN,
+                  school_directory.EMAIL_COLUMN, school_directory.DELIVERY_COLUMN])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("즉시", None),
+    ("묶음", (10, 3600)),
+    ("묶음 5건", (5, 3600)),
+    ("묶음 20건 30분", (20, 1800)),
+])
+def test_parse_delivery_policy(value, expected):
+    assert school_directory.parse_delivery_policy(value, "학교") == expected
+
+
+@pytest.mark.parametrize("value", ["매일", "묶음 0건", "묶음 10건 0분"])
+def test_parse_delivery_policy_rejects_bad_values(value):
+    with pytest.raises(ValueError):
+        school_directory.parse_delivery_policy(value, "학교")
+
+
+def test_bad_delivery_cell_falls_back_to_immediate(tmp_path, caplog):
+    path = write_directory(tmp_path / "schools.xlsx", [
+        ["세종", "가초등학교", "shared@example.com", "묶음 5건"],
+        ["세종", "나초등학교", "shared@example.com", "묶음 다섯건"],
+        ["세종", "다초등학교", "da@example.com", "즉시"],
+    ])
+    with caplog.at_level(logging.WARNING, logger="school_directory"):
+        schools_by_region, email_by_school, delivery_by_school = school_directory.read_school_directory(path)
+    # 잘못된 칸 하나 때문에 파일 전체를 버리지 않고, 그 학교만 즉시 발송으로 처리
+    assert schools_by_region == {"세종": ["가초등학교", "나초등학교", "다초등학교"]}
+    assert email_by_school["나초등학교"] == "shared@example.com"
+    assert delivery_by_school == {"가초등학교": (5, 3600)}
+    [record] = caplog.records
+    assert "3행" in record.getMessage() and "나초등학교" in record.getMessage()
@@ -0,0 +1,125 @@
+import pickle
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageDraw
+import pytest
+import form_renderer
+
+SIGN_KEYS = ("{{student_sign_path}}", "{{parent_sign_path}}")
+
+
+# st_canvas의 image_data처럼 float로 된 150×300 RGBA 배열 (알파가 0인 픽셀이 절반쯤 섞임)
+def random_canvas(seed):
+    rng = np.random.default_rng(seed)
+    canvas = rng.integers(0, 256, size=(150, 300, 4)).astype(np.float64)
+    canvas[..., 3] *= rng.random((150, 300)) < 0.5
+    return canvas
+
+# 예전 3단계 방식: PNG로 저장한 뒤 페이지마다 다시 열어 312×104로 조정
+def png_round_trip(canvas, size):
+    buffer = BytesIO()
+    Image.fromarray(canvas.astype('uint8')).save(buffer, format='PNG', optimize=True)
+    return Image.open(buffer).resize(size).convert('RGBA')
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_layout_signatures_matches_png_round_trip(seed):
+    canvases = {key: random_canvas(seed * 10 + i) for i, key in enumerate(SIGN_KEYS)}
+    signatures = {key: form_renderer.signature_from_canvas(canvas) for key, canvas in canvases.items()}
+    resized = {}
+    slots = 0
+    for plan in form_renderer.load_form_layouts():
+        placed = form_renderer.layout_signatures(plan, signatures, resized)
+        for (key, x, y, size), (slot_x, slot_y, sign) in zip(plan["signatures"], placed):
+            assert (slot_x, slot_y) == (x, y)
+            assert sign.mode == 'RGBA' and sign.size == size == (312, 104)
+            assert sign.tobytes() == png_round_trip(canvases[key], size).tobytes()
+            slots += 1
+    assert slots == 4
+    # 같은 서명·크기는 두 페이지에서 한 번만 조정
+    assert len(resized) == len(SIGN_KEYS)
+
+
+def test_coverage_matches_previous_formula():
+    canvas = random_canvas(7)
+    expected = (canvas[:, :, 3] > 0).sum() / (canvas.shape[0] * canvas.shape[1])
+    assert form_renderer.calculate_signature_coverage(canvas) == expected
+
+
+def test_signature_from_canvas_keeps_pixels():
+    canvas = random_canvas(3).astype(np.uint8)
+    sign = form_renderer.signature_from_canvas(canvas)
+    assert sign.mode == 'RGBA'
+    assert np.array_equal(np.asarray(sign), canvas)
+
+
+# st_canvas 그리기 모드(freedraw)의 json_data처럼 M·Q·L 명령으로 된 획 하나
+CURVE_PATH = [["M", 20, 100], ["Q", 40, 20, 80, 60], ["Q", 120, 100, 160, 40], ["Q", 200, -10, 240, 90], ["L", 270, 110]]
+CANVAS_JSON = {"objects": [
+    {"type": "path", "stroke": "#1e3a8a", "strokeWidth": 5, "path": CURVE_PATH},
+    {"type": "rect", "left": 0, "top": 0, "width": 10, "height": 10},
+]}
+
+# 같은 획을 캔버스 해상도(300×150)의 RGBA 배열로 그린 비트맵 (캔버스의 image_data 대신)
+def stroke_canvas(path, steps=32):
+    points = []
+    for command in path:
+        if command[0] in ("M", "L"):
+            segment = [tuple(command[1:3])]
+        else:
+            (x0, y0), (cx, cy), (x1, y1) = points[-1], command[1:3], command[3:5]
+            segment = [((1 - t) ** 2 * x0 + 2 * (1 - t) * t * cx + t * t * x1, (1 - t) ** 2 * y0 + 2 * (1 - t) * t * cy + t * t * y1)
+                       for t in (step / steps for step in range(1, steps + 1))]
+        points += segment
+    image = Image.new('RGBA', (300, 150), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.line(points, fill=(30, 58, 138, 255), width=5, joint='curve')
+    for x, y in (points[0], points[-1]):
+        draw.ellipse((x - 2.5, y - 2.5, x + 2.5, y + 2.5), fill=(30, 58, 138, 255))
+    return np.asarray(image).astype(np.float64)
+
+# 그려진 픽셀 중 반투명(흐려진) 픽셀의 비율
+def blurred(alpha):
+    return ((alpha > 0) & (alpha < 255)).sum() / (alpha > 0).sum()
+
+
+def test_strokes_from_canvas_json_flatten_q_curves():
+    strokes = form_renderer.SignatureStrokes.from_canvas_json(CANVAS_JSON, 300, 150)
+    assert (strokes.width, strokes.height, strokes.stroke_width, strokes.color) == (300, 150, 5, (30, 58, 138))
+    # path가 아닌 객체는 건너뜀
+    [points] = strokes.strokes
+    xy = [(points[i] / form_renderer.STROKE_SCALE, points[i + 1] / form_renderer.STROKE_SCALE) for i in range(0, len(points), 2)]
+    assert len(xy) == 2 + 3 * form_renderer.STROKE_CURVE_STEPS
+    assert xy[0] == (20, 100) and xy[-1] == (270, 110)
+    # 첫 Q 곡선의 중간점(t=0.5)과 끝점이 들어 있음
+    assert (0.25 * 20 + 0.5 * 40 + 0.25 * 80, 0.25 * 100 + 0.5 * 20 + 0.25 * 60) in xy
+    assert (80, 60) in xy
+    assert form_renderer.SignatureStrokes.from_canvas_json(None, 300, 150).strokes == ()
+
+
+def test_strokes_coverage_matches_canvas_coverage():
+    strokes = form_renderer.SignatureStrokes.from_canvas_json(CANVAS_JSON, 300, 150)
+    expected = form_renderer.calculate_signature_coverage(stroke_canvas(CURVE_PATH))
+    assert abs(strokes.coverage() - expected) <= 0.1 * expected
+    # 점 하나만 찍은 서명도 빈 서명으로 보지 않음
+    dot = form_renderer.SignatureStrokes.from_canvas_json({"objects": [{"type": "path", "path": [["M", 150, 75]]}]}, 300, 150)
+    assert dot.coverage() > 0
+
+
+def test_strokes_use_less_memory_and_render_sharper_than_bitmap():
+    strokes = form_renderer.SignatureStrokes.from_canvas_json(CANVAS_JSON, 300, 150)
+    canvas = stroke_canvas(CURVE_PATH)
+    bitmap = form_renderer.signature_from_canvas(canvas)
+    # 세션·보관소에 두는 크기: 좌표 배열은 RGBA 비트맵의 1% 미만
+    assert form_renderer.signature_nbytes(strokes) * 100 < form_renderer.signature_nbytes(bitmap)
+    assert len(pickle.dumps(strokes)) * 100 < len(pickle.dumps(canvas))
+
+    size = (312, 104)
+    rendered = np.asarray(strokes.render(size))[..., 3].astype(int)
+    resized = np.asarray(png_round_trip(canvas, size))[..., 3].astype(int)
+    # 예전 방식(비트맵 크기 조정)과 같은 자리에 같은 굵기로 그려짐
+    drawn, previous = rendered > 127, resized > 127
+    assert (drawn & previous).sum() / (drawn | previous).sum() > 0.6
+    assert np.abs(rendered - resized).mean() < 8
+    # 서명 칸 크기로 바로 그리므로 가장자리의 반투명 픽셀 비율이 비트맵을 늘린 경우보다 적음
+    assert blurred(rendered) < blurred(resized)
@@ -0,0 +1,84 @@
+import unicodedata
+from datetime import date
+from hypothesis import given, strategies as st
+import validation
+
+HANGUL = st.characters(min_codepoint=0xAC00, max_codepoint=0xD7A3)
+HANGUL_TEXT = st.text(HANGUL, min_size=1, max_size=20)
+BLANK = st.one_of(st.none(), st.text(" \t\n　", max_size=5))
+FIELDS = st.sampled_from(list(validation.VALIDATORS))
+VALUES = st.one_of(st.none(), st.text(max_size=40), st.integers(), st.dates())
+REQUIRED_FIELDS = [field for field in validation.VALIDATORS if field not in validation.OPTIONAL_FIELDS]
+
+
+@given(FIELDS, VALUES)
+def test_validate_field_returns_value_or_error(field, value):
+    cleaned, error = validation.validate_field(field, value)
+    if error is None:
+        assert cleaned is not None
+    else:
+        assert cleaned is None and error.field == field
+        assert error.empty == validation.is_empty(value)
+
+
+@given(st.sampled_from(REQUIRED_FIELDS), BLANK)
+def test_blank_required_field_is_reported_as_empty(field, value):
+    assert validation.validate_field(field, value) == (None, validation.FieldError(field, validation.EMPTY_MESSAGE, True))
+
+
+@given(BLANK)
+def test_blank_relationship_is_allowed(value):
+    assert validation.validate_field("relationship", value) == ("", None)
+
+
+@given(st.sampled_from(["student_name", "parent_name", "relationship"]), HANGUL_TEXT)
+def test_hangul_names_accepted_even_when_decomposed(field, name):
+    assert validation.validate_field(field, name) == (name, None)
+    # macOS 등에서 자모가 분리되어 들어와도 같은 글자로 정리
+    assert validation.validate_field(field, unicodedata.normalize("NFD", name)) == (name, None)
+
+
+@given(HANGUL_TEXT, st.text(st.characters(categories=["Lu", "Ll", "Nd"]), min_size=1, max_size=3))
+def test_names_with_other_letters_rejected(name, other):
+    cleaned, error = validation.validate_field("student_name", name + other)
+    assert cleaned is None and not error.empty
+
+
+@given(st.text("0123456789", min_size=8, max_size=8), st.sampled_from(["", "-", " ", "."]))
+def test_phone_number_formatting_is_idempotent(digits, separator):
+    raw = separator.join(["010", digits[:4], digits[4:]])
+    formatted, error = validation.validate_field("parent_phone", raw)
+    assert error is None and formatted == f"010-{digits[:4]}-{digits[4:]}"
+    assert validation.validate_field("parent_phone", formatted) == (formatted, None)
+
+
+@given(st.dates())
+def test_dates_round_trip(value):
+    for field in ("student_birth_date", "move_date"):
+        assert validation.validate_field(field, value) == (value, None)
+        if value.year >= 1000:
+            assert validation.validate_field(field, value.isoformat()) == (value, None)
+
+
+@given(st.dictionaries(FIELDS, VALUES))
+def test_validate_fields_splits_every_field(values):
+    cleaned, errors = validation.validate_fields(values)
+    failed = [error.field for error in errors]
+    assert set(cleaned).isdisjoint(failed)
+    assert set(cleaned) | set(failed) == set(values)
+    for field, value in cleaned.items():
+        assert validation.validate_field(field, values[field]) == (value, None)
+
+
+@given(st.dictionaries(FIELDS, VALUES))
+def test_validate_fields_reports_missing_requested_fields(values):
+    cleaned, errors = validation.validate_fields(values, validation.VALIDATORS)
+    missing = {field for field in REQUIRED_FIELDS if field not in values}
+    assert missing <= {error.field for error in errors if error.empty}
+    assert "relationship" in cleaned or "relationship" in {error.field for error in errors}
+
+
+def test_relationship_still_checked_when_given():
+    cleaned, error = validation.validate_field("relationship", "father")
+    assert cleaned is None and error == validation.FieldError("relationship", "한글로만 작성하세요.", False)
+    assert validation.validate_field("student_birth_date", date(2017, 1, 1)) == (date(2017, 1, 1), None)
@@ -0,0 +1,155 @@
+import re
+import unicodedata
+from collections import namedtuple
+from datetime import date, datetime
+
+# 3단계 입력값 검사 모듈
+# 패턴은 모듈을 불러올 때 한 번만 컴파일하고, 항목마다 검사 함수 하나를 둡니다.
+# 검사 함수는 format_phone_number와 같은 형식인 (정리한 값, 오류 메시지)를 반환하며,
+# validate_fields()는 모든 항목을 한 번에 검사하여 FieldError 목록으로 돌려주므로 화면·일괄 생성에서 함께 사용합니다.
+
+NAME_PATTERN = re.compile(r'^[가-힣]+$')
+SCHOOL_PATTERN = re.compile(r'^[가-힣0-9\s]+$')
+DIGITS_PATTERN = re.compile(r'^\d+$')
+RELATIONSHIP_PATTERN = re.compile(r'^[가-힣\s]+$')
+ADDRESS_PATTERN = re.compile(r'^[가-힣a-zA-Z0-9\s-]+$')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+DATE_FORMAT = "%Y-%m-%d"
+GRADE_OPTIONS = ("1학년", "2학년", "3학년", "4학년", "5학년", "6학년")
+
+# 빈칸이 있을 때 화면에 한 번만 보여 주는 안내
+EMPTY_MESSAGE = "빈칸 확인 후 모든 작성칸을 예시에 따라 작성하세요."
+
+# 항목 이름(build_field_map 인자) → 입력칸 이름
+FIELD_LABELS = {
+    "student_name": "(학생) 성명",
+    "student_birth_date": "(학생) 생년월일",
+    "student_school": "(학생) 현 소속 학교 및 학년",
+    "parent_name": "(법정대리인) 성명",
+    "relationship": "(법정대리인) 학생과의 관계",
+    "parent_phone": "(법정대리인) 휴대전화 번호",
+    "move_date": "전입 예정일",
+    "address": "전입 예정 주소",
+    "school_name": "전학 예정 학교",
+    "next_grade": "전학 예정 학년",
+}
+
+# 비워 둘 수 있는 항목 (예전 화면처럼 값이 있을 때만 검사하고, 비어 있으면 빈 문자열로 둠)
+OPTIONAL_FIELDS = frozenset({"relationship"})
+
+# 검사에 실패한 항목 (field는 FIELD_LABELS의 키, empty는 값이 비어 있어 실패했는지 여부)
+FieldError = namedtuple("FieldError", "field message empty")
+
+# 성명 검사 함수
+def validate_name(value):
+    if not NAME_PATTERN.match(value):
+        return None, "한글로만 작성하세요."
+    return value, None
+
+# 현 소속 학교 및 학년 검사 함수
+def validate_school(value):
+    if "학교" not in value:
+        return None, "'학교'를 반드시 포함하여 작성하세요."
+    if not SCHOOL_PATTERN.match(value) or DIGITS_PATTERN.match(value):
+        return None, "한글과 숫자로만 작성하세요."
+    return value, None
+
+# 학생과의 관계 검사 함수
+def validate_relationship(value):
+    if not RELATIONSHIP_PATTERN.match(value):
+        return None, "한글로만 작성하세요."
+    return value, None
+
+# 전화번호 포맷팅 함수
+def format_phone_number(phone_input):
+    # 숫자만 추출
+    digits = ''.join(filter(str.isdigit, phone_input))
+    # 11자리 숫자인지 확인
+    if len(digits) != 11 or not digits.startswith('010'):
+        return None, "휴대전화 번호는 010으로 시작하며 숫자로만 작성하세요."
+    # 010-XXXX-XXXX 형식으로 변환
+    formatted = f"{digits[:3]}-{digits[3:7]}-{digits[7:]}"
+    return formatted, None
+
+# 전입 예정 주소 검사 함수
+def validate_address(value):
+    if not ADDRESS_PATTERN.match(value):
+        return None, "한글, 알파벳, 숫자, 기호로만 작성하세요."
+    return value, None
+
+# 날짜 검사 함수 (날짜 입력칸의 date 또는 명단의 'YYYY-MM-DD' 문자열)
+def validate_date(value):
+    if isinstance(value, datetime):
+        return value.date(), None
+    if isinstance(value, date):
+        return value, None
+    try:
+        return datetime.strptime(str(value), DATE_FORMAT).date(), None
+    except ValueError:
+        return None, "날짜는 YYYY-MM-DD 형식으로 작성하세요."
+
+# 전학 예정 학년 검사 함수
+def validate_grade(value):
+    if value not in GRADE_OPTIONS:
+        return None, "1학년부터 6학년 중에서 선택하세요."
+    return value, None
+
+# 학교 이메일 주소 검사 함수
+def validate_email(value):
+    if not EMAIL_PATTERN.match(value):
+        return None, f"유효하지 않은 이메일 주소입니다: {value}"
+    return value, None
+
+# 항목 이름 → 검사 함수 (전학 예정 학교는 1단계 목록에서 고른 값이므로 빈칸만 확인)
+VALIDATORS = {
+    "student_name": validate_name,
+    "student_birth_date": validate_date,
+    "student_school": validate_school,
+    "parent_name": validate_name,
+    "relationship": validate_relationship,
+    "parent_phone": format_phone_number,
+    "move_date": validate_date,
+    "address": validate_address,
+    "school_name": lambda value: (value, None),
+    "next_grade": validate_grade,
+}
+
+# 값이 비어 있는지 확인하는 함수 (None, 빈 문자열, 공백만 있는 문자열)
+def is_empty(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+# 항목 하나를 검사하여 (정리한 값, FieldError 또는 None)을 반환하는 함수
+def validate_field(field, value):
+    if is_empty(value):
+        if field in OPTIONAL_FIELDS:
+            return "", None
+        return None, FieldError(field, EMPTY_MESSAGE, True)
+    if isinstance(value, str):
+        # 자모가 분리된 입력(macOS 등)도 같은 글자로 검사·저장되도록 NFC로 정규화
+        value = unicodedata.normalize("NFC", value.strip())
+    elif not (isinstance(value, date) and VALIDATORS[field] is validate_date):
+        # 명단 XLSX의 숫자 칸이나 날짜로 읽힌 문자 칸 등은 문자열로 바꿔 검사
+        value = str(value)
+    cleaned, message = VALIDATORS[field](value)
+    if message:
+        return None, FieldError(field, message, False)
+    return cleaned, None
+
+# 여러 항목을 한 번에 검사하여 (정리한 값 사전, FieldError 목록)을 반환하는 함수
+# fields를 주지 않으면 values에 있는 항목만 검사하며, 실패한 항목은 정리한 값 사전에서 빠짐
+def validate_fields(values, fields=None):
+    cleaned = {}
+    errors = []
+    for field in fields or values:
+        value, error = validate_field(field, values.get(field))
+        if error is None:
+            cleaned[field] = value
+        else:
+            errors.append(error)
+    return cleaned, errors
+
+# 오류 목록을 화면·로그에 보여 줄 문장 목록으로 바꾸는 함수 (빈칸은 한 번만 안내)
+def describe_errors(errors):
+    messages = [EMPTY_MESSAGE] if any(error.empty for error in errors) else []
+    messages += [f"{FIELD_LABELS[error.field]}: {error.message}" for error in errors if not error.empty]
+    return messages